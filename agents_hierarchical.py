@@ -1,22 +1,27 @@
 # agents_hierarchical.py
-import os
-from crewai import Agent, Task, Crew, LLM, Process
+from crewai import Agent, Task, Crew, Process
 from dotenv import load_dotenv
 import time
 import streamlit as st
 
 from agents_sequential import notify_streamlit_agent
+from crewai_tools.tools.rate_limiter import installer_limiteur
+from crewai_tools.tools.llm_backend import creer_llm
+from crewai_tools.tools.tracing import suivi_taches
+from crewai_tools.tools.context_budget import (
+    BudgetContexte, repartir_rag, plafonner, condenser_lieux, compacter_texte, condenser_tableau,
+)
+from crewai_tools.tools.day_planner import PlanificateurJournees
 
 load_dotenv()
-api_key = os.getenv("GROQ_API_KEY")
 
-# Configuration LLM identique mais avec des limites strictes
-llm_boss = LLM(
-    model="groq/llama-3.3-70b-versatile", 
+# Configuration LLM identique mais avec des limites strictes (rôle "boss" de llm_backend.py)
+llm_boss = creer_llm(
+    "boss",
     temperature=0, 
-    api_key=api_key,
-    max_tokens=1000 # Plus petit pour éviter le Rate Limit
+    max_tokens=1000, # Plus petit pour éviter le Rate Limit
 )
+installer_limiteur()
 
 def task_completion_callback(task_output):
     """
@@ -25,9 +30,14 @@ def task_completion_callback(task_output):
     """
     # Récupération de l'agent via task_output
     agent_role = getattr(task_output, 'agent', None)
-    if agent_role:
-        if agent_role not in st.session_state.WORKFLOW_STEPS:
-            st.session_state.WORKFLOW_STEPS.append(agent_role)
+    try:
+        etapes = st.session_state.WORKFLOW_STEPS
+    except (AttributeError, KeyError, RuntimeError):
+        # Hors de l'application Streamlit (batch_eval.py) : pas de suivi des étapes à l'écran
+        etapes = None
+    if agent_role and etapes is not None:
+        if agent_role not in etapes:
+            etapes.append(agent_role)
             # On force un petit print console pour debug
             print(f"DEBUG: Tâche terminée par {agent_role}")
 
@@ -54,7 +64,7 @@ def create_hierarchical_crew(ville, profil, duree, budget, rythme, interets, adu
                 ),
                 backstory=(
                     f"Tu vis à {ville}. Tu connais très bien la ville et ses quartiers. "
-                    f"Tu analyses les données RAG fournies : {informations_rag}. "
+                    "Tu analyses les données RAG fournies dans ta tâche. "
                     f"Tu identifies uniquement les lieux qui correspondent réellement aux intérêts ({interets}) "
                     f"et qui sont adaptés à un groupe de {groupe_str}. "
                     "Tu es exigeant : tu privilégies les lieux authentiques, pertinents et réalistes."
@@ -125,11 +135,18 @@ def create_hierarchical_crew(ville, profil, duree, budget, rythme, interets, adu
             step_callback=lambda step: notify_streamlit_agent(step, "Rédateur de Guide de Voyage"),
         )
 
+        # Le RAG n'est envoyé qu'une fois par phrase : descriptif pour t1, pratique pour t4
+        rag_lieux, rag_pratique = repartir_rag(informations_rag)
+        budget_contexte = BudgetContexte()
+        planificateur = PlanificateurJournees(ville, duree, rythme)
+        # Le task_callback de la crew ne vaut pas pour les tâches qui ont leur propre callback : on chaîne ici
+        rappel_tache = suivi_taches(planificateur.apres(budget_contexte.apres(task_completion_callback)))
+
         # --- TÂCHES PRÉCISES ET STRUCTURÉES ---
 
         t1 = Task(
             description=(
-                f"Analyse les sources (PDF, données RAG, etc.) concernant {ville} : {informations_rag}. "
+                f"Analyse les sources (PDF, données RAG, etc.) concernant {ville} : {plafonner(rag_lieux)}. "
                 f"Sélectionne exactement 3 lieux par jour à {ville} pour {duree} jours. "
                 f"Sélectionne uniquement des lieux adéquats pour le profil {profil} et les intérêts {interets}, "
                 f"et adaptés à la composition du groupe : {groupe_str}. "
@@ -142,7 +159,7 @@ def create_hierarchical_crew(ville, profil, duree, budget, rythme, interets, adu
                 "Nom du lieu + phrase courte de description + justification par rapport au profil."
             ),
             agent=expert_local,
-            callback=task_completion_callback,
+            callback=rappel_tache,
         )
 
         t2 = Task(
@@ -151,7 +168,8 @@ def create_hierarchical_crew(ville, profil, duree, budget, rythme, interets, adu
                 f"crée un planning jour par jour sur {duree} jours. "
                 f"Respecte strictement le rythme {rythme}. "
                 f"Inclus des temps de pause adaptés pour les {enfants} enfant(s). "
-                "Regroupe les lieux par proximité géographique : l'itinéraire doit être logique et ne doit surtout pas contenir d' aller-retours inutiles. "
+                "Si un SQUELETTE IMPOSÉ est fourni, reprends exactement ses jours et l'ordre de ses lieux. "
+                "Sinon, regroupe les lieux par proximité géographique : l'itinéraire doit être logique et ne doit surtout pas contenir d' aller-retours inutiles. "
                 "INTERDICTION de faire une introduction ou une conclusion. "
                 "Réponds UNIQUEMENT par un itinéraire structuré par jour."
             ),
@@ -160,7 +178,7 @@ def create_hierarchical_crew(ville, profil, duree, budget, rythme, interets, adu
                 "Matin, Midi, Après-midi, Soir, chacune contenant les lieux/activités prévus."
             ),
             agent=designer,
-            callback=task_completion_callback,
+            callback=rappel_tache,
         )
 
         t3 = Task(
@@ -178,7 +196,7 @@ def create_hierarchical_crew(ville, profil, duree, budget, rythme, interets, adu
                 "avec conversion en EUR."
             ),
             agent=comptable,
-            callback=task_completion_callback,
+            callback=rappel_tache,
         )
 
         t4 = Task(
@@ -189,7 +207,7 @@ def create_hierarchical_crew(ville, profil, duree, budget, rythme, interets, adu
                 f"2) Le programme jour par jour (matin, midi, après-midi, soir) sur {duree} jours, "
                 "présenté de façon claire, avec éventuellement des justifications brèves.\n"
                 f"3) Une section 'Conseils de l'expert' basée sur le rythme {rythme} et inspirée, si utile, "
-                f"par les bonnes pratiques présentes dans le guide / les données : {informations_rag}."
+                f"par les bonnes pratiques présentes dans le guide / les données : {plafonner(rag_pratique)}."
                 f"Cette section ne doit pas dépasser 5 phrases.\n"
                 "4) Le tableau budgétaire complet fourni par l'Auditeur Budgétaire.\n\n"
                 "Interdictions :\n"
@@ -203,8 +221,15 @@ def create_hierarchical_crew(ville, profil, duree, budget, rythme, interets, adu
                 "une section 'Conseils de l'expert', puis le tableau budgétaire."
             ),
             agent=redacteur,
-            callback=task_completion_callback,
+            callback=rappel_tache,
         )
+
+        # En hiérarchique, chaque tâche reçoit les sorties de toutes les précédentes : on les condense
+        budget_contexte.relayer(t1, "lieux", condenser_lieux, [t2, t3, t4])
+        budget_contexte.relayer(t2, "itineraire", compacter_texte, [t3, t4])
+        budget_contexte.relayer(t3, "budget", condenser_tableau, [t4])
+        budget_contexte.mesurer({"lieux": t1, "itineraire": t2, "budget": t3, "guide": t4})
+        planificateur.suivre(t1, budget_contexte)
     
 
     # 3. La Crew Hiérarchique
@@ -0,0 +1,221 @@
+# agents_parallel.py
+from crewai import Agent, Task, Crew, Process
+
+from agents_sequential import create_travel_crew, llm_synthese, llm_planification, notify_streamlit_agent
+from crewai_tools.tools.tracing import suivi_taches
+from crewai_tools.tools.context_budget import (
+    BudgetContexte, repartir_rag, plafonner, condenser_lieux, compacter_texte, condenser_tableau,
+)
+from crewai_tools.tools.day_planner import PlanificateurJournees
+
+
+def create_parallel_crew(ville, profil, duree, budget, rythme, interets, adultes, enfants, informations_rag, agents_active, callback_flux=None):
+    """
+    Variante de create_travel_crew où les tâches forment un graphe de dépendances :
+
+        t1 lieux ──┬── t2 itinéraire ──┐
+                   ├── t3 budget ──────┼── t4 guide final
+                   └── t5 conseils ────┘
+
+    t2, t3 et t5 ne dépendent que de la liste de lieux : elles tournent en parallèle (async_execution)
+    et le rédacteur attend les trois. La latence suit le chemin critique (t1 -> la plus longue -> t4).
+    Sans agents, renvoie le résultat du LLM seul (identique au mode séquentiel).
+    """
+    if not agents_active:
+        return create_travel_crew(
+            ville, profil, duree, budget, rythme, interets, adultes, enfants, informations_rag, False, callback_flux
+        )
+
+    total_personnes = adultes + enfants
+    groupe_str = f"{adultes} adulte(s) et {enfants} enfant(s)"
+
+    if budget == "Élevé":
+        style_voyage = "luxueux, avec des restaurants étoilés, des guides privés et des hôtels 5 étoiles. Les prix doivent refléter le haut de gamme."
+    elif budget == "Économique":
+        style_voyage = "très abordable, type 'backpacking', avec des repas bon marché et des activités gratuites."
+    else:
+        style_voyage = "confortable mais raisonnable, mélangeant activités payantes et moments de détente."
+
+    # Un agent par tâche : deux tâches parallèles ne doivent pas partager le même agent
+    expert_local = Agent(
+        role="Spécialiste de Destination",
+        goal=(
+            f"Sélectionner 5-6 lieux à {ville} pour profil {profil}, intérêts: {interets}, groupe: {groupe_str}, style de voyage: {style_voyage}"
+        ),
+        backstory=(
+            f"Expert local à {ville}. Sélectionne des lieux authentiques adaptés au profil et aux intérêts demandés."
+        ),
+        llm=llm_synthese,
+        step_callback=lambda step: notify_streamlit_agent(step, "Spécialiste de Destination")
+    )
+
+    designer = Agent(
+        role="Concepteur d'Itinéraire personnalisé",
+        goal=(
+            f"Créer itinéraire {duree}j, rythme {rythme}, {enfants} enfant(s)"
+        ),
+        backstory=(
+            f"Tu es expert en logistique de voyage dans la ville {ville}. "
+            "Ta priorité absolue est de minimiser la distance totale parcourue. "
+            "Tu regroupes les lieux par proximité géographique (un quartier différent par jour) "
+            "et tu adaptes les horaires et les temps de pause au nombre d'enfants."
+        ),
+        llm=llm_planification,
+        step_callback=lambda step: notify_streamlit_agent(step, "Concepteur d'Itinéraire personnalisé")
+    )
+
+    comptable = Agent(
+        role="Auditeur Budgétaire",
+        goal=(
+            f"Calculer coût total pour {total_personnes} personnes, budget {budget}, style {style_voyage}"
+        ),
+        backstory=(
+            f"Expert financier. Vérifie coûts réalistes style {style_voyage}, multiplie par {total_personnes}."
+        ),
+        llm=llm_synthese,
+        step_callback=lambda step: notify_streamlit_agent(step, "Auditeur Budgétaire")
+    )
+
+    conseiller = Agent(
+        role="Conseiller Pratique",
+        goal=(
+            f"Donner des conseils pratiques pour visiter les lieux choisis à {ville} avec {groupe_str}"
+        ),
+        backstory=(
+            "Habitué des lieux. Connaît les horaires, les réservations et l'accessibilité avec des enfants."
+        ),
+        llm=llm_synthese,
+        step_callback=lambda step: notify_streamlit_agent(step, "Conseiller Pratique")
+    )
+
+    redacteur = Agent(
+        role="Rédacteur de Guide de Voyage",
+        goal=(
+            "Compiler itinéraire, conseils et budget en guide structuré"
+        ),
+        backstory=(
+            "Éditeur voyage. Transforme données brutes en guide engageant adapté au profil."
+        ),
+        llm=llm_synthese,
+        step_callback=lambda step: notify_streamlit_agent(step, "Rédacteur Final")
+    )
+
+    rag_lieux, rag_pratique = repartir_rag(informations_rag)
+
+    # --- GRAPHE DE TÂCHES ---
+
+    t1 = Task(
+        description=(
+            f"Contexte: {plafonner(rag_lieux)}\n"
+            f"Sélectionne 5-6 lieux à {ville} pour {duree}j. Profil: {profil}, intérêts: {interets}, groupe: {groupe_str}.\n"
+            "Liste: Nom + description courte."
+        ),
+        expected_output=(
+            "Liste puces: Nom lieu + description courte."
+        ),
+        agent=expert_local
+    )
+
+    t2 = Task(
+        description=(
+            f"À partir de la liste de lieux fournie par le Spécialiste de Destination, sélectionne les 3 meilleurs par jour, "
+            f"crée un planning jour par jour sur {duree} jours. "
+            f"Respecte strictement le rythme {rythme}. "
+            f"Inclus des temps de pause adaptés pour les {enfants} enfant(s). "
+            "Si un SQUELETTE IMPOSÉ est fourni, reprends exactement ses jours et l'ordre de ses lieux : "
+            "ne complète que les créneaux restants (repas, pauses). Sinon : "
+            "CONSIGNE STRICTE : Pour chaque journée, les lieux choisis DOIVENT se situer dans un rayon "
+            "géographique restreint. L'itinéraire doit être une boucle logique ou une ligne droite continue, jamais un va-et-vient. "
+            "INTERDICTION de faire une introduction ou une conclusion. "
+            "Réponds UNIQUEMENT par un itinéraire structuré par jour."
+        ),
+        expected_output=(
+            "Itinéraire jour par jour: Jour X : Matin: [Nom] | Midi: [Nom] | Après-midi: [Nom] | Soir: [Nom]"
+        ),
+        agent=designer,
+        context=[t1],
+        async_execution=True
+    )
+
+    t3 = Task(
+        description=(
+            f"À partir de la liste de lieux, estime le budget d'un séjour de {duree} jours pour {groupe_str}. "
+            f"1) Crée un tableau Markdown avec les colonnes : Poste (Repas/Activités/Transport) | Prix unitaire | Total pour {total_personnes}. "
+            f"2) Compte les entrées des lieux listés, {duree * 2} repas par personne et les transports sur {duree} jours. "
+            f"3) Assure-toi que le niveau de prix correspond bien à un style de voyage {style_voyage}. "
+            "4) Calcule le total final et ajoute une conversion en EUR (donne le total en devise locale puis en EUR). "
+            "INTERDICTION de faire des introductions ou des explications en dehors du tableau. "
+            "Donne UNIQUEMENT le tableau du budget."
+        ),
+        expected_output=(
+            "Tableau: Poste | Prix unitaire | Total groupe + ligne total EUR."
+        ),
+        agent=comptable,
+        context=[t1],
+        async_execution=True
+    )
+
+    t5 = Task(
+        description=(
+            f"Pour chaque lieu de la liste, donne en une ligne : une astuce pratique (ex: 'Réserver 2 jours avant'), "
+            f"l'accessibilité avec {enfants} enfant(s) et l'horaire idéal de visite, en tenant compte du rythme {rythme}. "
+            f"Appuie-toi si utile sur les informations du guide : {plafonner(rag_pratique)}\n"
+            "Si ces infos manquent, utilise tes connaissances de manière réaliste. "
+            "Ne pas inventer de nouveaux lieux. Réponds UNIQUEMENT par la liste des conseils."
+        ),
+        expected_output=(
+            "Liste: Nom du lieu : astuce | accessibilité enfants | horaire idéal."
+        ),
+        agent=conseiller,
+        context=[t1],
+        async_execution=True
+    )
+
+    t4 = Task(
+        description=(
+            f"IMPORTANT: Ne montre JAMAIS ton raisonnement interne (Thought:, Action:, etc.). Donne DIRECTEMENT le guide final.\n\n"
+            f"Tu reçois l'itinéraire structuré, les conseils pratiques par lieu et l'analyse budgétaire. "
+            f"Ta mission est de produire le document final en respectant cet ordre :\n"
+            f"1) Une phrase d'introduction chaleureuse personnalisée pour le profil {profil}.\n"
+            f"2) Le programme jour par jour (matin, midi, après-midi, soir) sur {duree} jours, "
+            "présenté de façon claire, avec éventuellement des justifications brèves.\n"
+            f"3) Une section 'Conseils de l'expert' reprenant les conseils pratiques fournis, adaptée au rythme {rythme}.\n"
+            "4) Le tableau budgétaire complet fourni par l'Auditeur Budgétaire.\n\n"
+            "INTERDICTIONS STRICTES :\n"
+            "- NE JAMAIS afficher 'Thought:', 'Action:', ou tout raisonnement interne\n"
+            "- Ne pas inventer de nouveaux lieux : utilise uniquement les lieux fournis\n"
+            "- Ne pas ajouter d'autres introductions ou conclusions inutiles\n"
+            "Réponds UNIQUEMENT par le guide final Markdown, sans aucun commentaire de raisonnement."
+        ),
+        expected_output=(
+            "Guide Markdown complet (intro + programme jour/jour + conseils de l'expert + tableau budgétaire) SANS aucun raisonnement interne visible."
+        ),
+        agent=redacteur,
+        # Tâche synchrone : crewai attend la fin des tâches asynchrones qui la précèdent
+        context=[t2, t3, t5]
+    )
+
+    graphe = [(t1, []), (t2, [t1]), (t3, [t1]), (t5, [t1]), (t4, [t2, t3, t5])]
+
+    budget_contexte = BudgetContexte()
+    budget_contexte.relayer(t1, "lieux", condenser_lieux, [t2, t3, t5])
+    budget_contexte.relayer(t2, "itineraire", compacter_texte, [t4])
+    budget_contexte.relayer(t3, "budget", condenser_tableau, [t4])
+    budget_contexte.relayer(t5, "conseils", compacter_texte, [t4])
+    budget_contexte.mesurer({"lieux": t1, "itineraire": t2, "budget": t3, "conseils": t5, "guide": t4})
+
+    planificateur = PlanificateurJournees(ville, duree, rythme)
+    planificateur.suivre(t1, budget_contexte)
+
+    return Crew(
+        agents=[expert_local, designer, comptable, conseiller, redacteur],
+        # Les tâches asynchrones consécutives (t2, t3, t5) sont lancées ensemble
+        tasks=[t1, t2, t3, t5, t4],
+        process=Process.sequential,
+        verbose=False,
+        cache=False,
+        # Les callbacks des tâches parallèles arrivent depuis leurs threads (le flux passe par une file)
+        task_callback=suivi_taches(planificateur.apres(budget_contexte.apres(
+            (lambda sortie: callback_flux(f"\n\n#### ✅ {sortie.agent}\n\n{sortie.raw}")) if callback_flux else None
+        )), dependances=graphe)
+    )
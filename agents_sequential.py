@@ -1,35 +1,45 @@
 import os
-from crewai import Agent, Task, Crew, LLM, Process
+from crewai import Agent, Task, Crew, Process
 from dotenv import load_dotenv
 import streamlit as st
 import time
 import litellm
+from crewai_tools.tools.rate_limiter import completion_limitee, installer_limiteur
+from crewai_tools.tools.llm_backend import ROLES, config_role, creer_llm, parametres_litellm
+from crewai_tools.tools.tracing import suivi_taches
+from crewai_tools.tools.context_budget import (
+    BudgetContexte, repartir_rag, plafonner, condenser_lieux, compacter_texte, condenser_tableau,
+)
+from crewai_tools.tools.day_planner import PlanificateurJournees
 
 load_dotenv()
 api_key = os.getenv("GROQ_API_KEY")
-print(f"DEBUG: API Key loaded: {api_key[:10]}...")  # Affiche les 10 premiers caractères
-if not api_key:
+if api_key:
+    print(f"DEBUG: API Key loaded: {api_key[:10]}...")  # Affiche les 10 premiers caractères
+elif any(config_role(role)["backend"] == "groq" for role in ROLES):
     print("ERROR: GROQ_API_KEY not found in .env!")
 
 # --- CONFIGURATION DES LLM ---
 
-llm_synthese = LLM(
-    model="groq/llama-3.1-8b-instant", 
+# Backend (Groq, Ollama ou llama.cpp) et modèle choisis par rôle : voir crewai_tools/tools/llm_backend.py.
+# Chaque appel prend un créneau dans le limiteur partagé (quota distant ou slot du serveur local).
+llm_synthese = creer_llm(
+    "synthese",
     temperature=0, 
-    api_key=api_key,
     max_tokens=2000, # Limite pour forcer la synthèse
     max_retries=3,          
     timeout=60,
 )
 
-llm_planification = LLM(
-    model="groq/llama-3.1-8b-instant", 
+llm_planification = creer_llm(
+    "planification",
     temperature=0, 
-    api_key=api_key,
     max_retries=3,          
-    timeout=60
+    timeout=60,
 )
 
+installer_limiteur()
+
 def notify_streamlit_agent(step, agent_role):
     try:            
         st.toast(f"🤖 **{agent_role}** a terminé une étape", icon="✅")
@@ -37,7 +47,11 @@ def notify_streamlit_agent(step, agent_role):
     except:
         pass
 
-def create_travel_crew(ville, profil, duree, budget, rythme, interets, adultes, enfants, informations_rag, agents_active):
+def create_travel_crew(ville, profil, duree, budget, rythme, interets, adultes, enfants, informations_rag, agents_active, callback_flux=None):
+    """
+    callback_flux (optionnel) reçoit le texte au fil de l'eau : les tokens du LLM seul,
+    ou la sortie de chaque tâche de la crew dès qu'elle se termine.
+    """
     
     #interpretation des paramètres
     total_personnes = adultes + enfants
@@ -109,11 +123,15 @@ def create_travel_crew(ville, profil, duree, budget, rythme, interets, adultes,
             step_callback=lambda step: notify_streamlit_agent(step, "Rédacteur Final")
         )
 
+        # Le RAG est réparti sans doublon : le descriptif pour la sélection des lieux,
+        # le pratique (prix, horaires, réservations) pour les conseils de la rédaction finale
+        rag_lieux, rag_pratique = repartir_rag(informations_rag)
+
         # --- TÂCHES PRÉCISES ET STRUCTURÉES ---
 
         t1 = Task(
             description=(
-                f"Contexte: {informations_rag}\n"
+                f"Contexte: {plafonner(rag_lieux)}\n"
                 f"Sélectionne 5-6 lieux à {ville} pour {duree}j. Profil: {profil}, intérêts: {interets}, groupe: {groupe_str}.\n"
                 "Liste: Nom + description courte."
             ),
@@ -129,6 +147,8 @@ def create_travel_crew(ville, profil, duree, budget, rythme, interets, adultes,
                 f"crée un planning jour par jour sur {duree} jours. "
                 f"Respecte strictement le rythme {rythme}. "
                 f"Inclus des temps de pause adaptés pour les {enfants} enfant(s). "
+                "Si un SQUELETTE IMPOSÉ est fourni, reprends exactement ses jours et l'ordre de ses lieux : "
+                "ne complète que les créneaux restants (repas, pauses). Sinon : "
                 "CONSIGNE STRICTE : Pour chaque journée, les lieux choisis DOIVENT se situer dans un rayon "
                 "géographique restreint. Tu dois minimiser le kilométrage entre le lieu du matin et celui du soir. "
                 "Élimine les lieux qui créent des 'pics' de distance inutiles. "
@@ -167,7 +187,7 @@ def create_travel_crew(ville, profil, duree, budget, rythme, interets, adultes,
                 f"1) Une phrase d'introduction chaleureuse personnalisée pour le profil {profil}.\n"
                 f"2) Le programme jour par jour (matin, midi, après-midi, soir) sur {duree} jours, "
                 "présenté de façon claire, avec éventuellement des justifications brèves.\n"
-                f"3) Une section 'Conseils de l'expert' basée sur le rythme {rythme} et si utile, les informations présente dans le guide: {informations_rag}\n"
+                f"3) Une section 'Conseils de l'expert' basée sur le rythme {rythme} et si utile, les informations présente dans le guide: {plafonner(rag_pratique)}\n"
                 "Pour CHAQUE lieu mentionné, inclure :\n"
                     "- Une astuce pratique (ex: 'Réserver 2 jours avant')\n"
                     "- Une mention sur l'accessibilité avec des enfants\n"
@@ -184,15 +204,31 @@ def create_travel_crew(ville, profil, duree, budget, rythme, interets, adultes,
                 "Guide Markdown complet (intro + programme jour/jour + conseils de l'expert + tableau budgétaire) SANS aucun raisonnement interne visible."
             ),
             agent=redacteur,
-            context=[t3]
+            # Le rédacteur reçoit l'itinéraire et le budget (relais condensés, voir BudgetContexte)
+            context=[t2, t3]
         )
 
+        # Chaque sortie intermédiaire est condensée avant d'être transmise aux tâches suivantes
+        budget_contexte = BudgetContexte()
+        budget_contexte.relayer(t1, "lieux", condenser_lieux, [t2])
+        budget_contexte.relayer(t2, "itineraire", compacter_texte, [t3, t4])
+        budget_contexte.relayer(t3, "budget", condenser_tableau, [t4])
+        budget_contexte.mesurer({"lieux": t1, "itineraire": t2, "budget": t3, "guide": t4})
+
+        # Les lieux de t1 sont géocodés, répartis par jour et ordonnés avant d'arriver au designer
+        planificateur = PlanificateurJournees(ville, duree, rythme)
+        planificateur.suivre(t1, budget_contexte)
+
         return Crew(
             agents=[expert_local, designer, comptable, redacteur],
             tasks=[t1, t2, t3, t4],
             process=Process.sequential,
             verbose=False,
-            cache=False
+            cache=False,
+            # Chaque tâche terminée est tracée, planifiée (t1), transmise au fil de l'eau si demandé, puis condensée
+            task_callback=suivi_taches(planificateur.apres(budget_contexte.apres(
+                (lambda sortie: callback_flux(f"\n\n#### ✅ {sortie.agent}\n\n{sortie.raw}")) if callback_flux else None
+            )))
         )
 
     else:
@@ -222,13 +258,28 @@ def create_travel_crew(ville, profil, duree, budget, rythme, interets, adultes,
         RÉPONDS UNIQUEMENT AVEC LE GUIDE FINAL EN MARKDOWN.
         """
 
-        # Appel direct via LiteLLM
-        response = litellm.completion(
-            model="groq/llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": super_prompt}],
-            temperature=0,
-            api_key=api_key
-        )
+        # Appel direct via LiteLLM (derrière le limiteur partagé)
+        messages = [{"role": "user", "content": super_prompt}]
+        if callback_flux:
+            # Mode streaming : on transmet chaque token dès sa réception
+            chunks = []
+            for chunk in completion_limitee(
+                **parametres_litellm("direct"),
+                messages=messages,
+                temperature=0,
+                stream=True
+            ):
+                chunks.append(chunk)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    callback_flux(delta)
+            response = litellm.stream_chunk_builder(chunks, messages=messages)
+        else:
+            response = completion_limitee(
+                **parametres_litellm("direct"),
+                messages=messages,
+                temperature=0
+            )
         
         # On extrait le texte
         resultat_texte = response.choices[0].message.content
@@ -1,15 +1,29 @@
-from crewai import Crew
 import streamlit as st
 from agents_hierarchical import create_hierarchical_crew
-from crewai_tools.tools.geocoder_tool import extraire_points_gps
-from agents_sequential import create_travel_crew
-from crewai_tools.tools.database import get_vectorstore
-from utils import afficher_resultat_mode
+from scheduler import lancer_comparatif, configs_comparatif, gabarit_crew, ROLES_MODES, PROFILS, BUDGETS, RYTHMES, INTERETS, DUREE_MAX
+from crewai_tools.tools.database import get_vectorstore, filtre_destination
+from crewai_tools.tools.catalogue import get_catalogue
+from crewai_tools.tools.indexation import lancer_indexation_arriere_plan, etat_indexation
+from utils import afficher_resultat_mode, afficher_flux_mode, afficher_carte
+from crewai_tools.tools.rate_limiter import limiteur
+from crewai_tools.tools.llm_backend import signature_roles
+from crewai_tools.tools.tracing import Trace
+from crewai_tools.tools.usage_ledger import etiquettes
+from crewai_tools.tools.result_cache import (
+    CACHE_ACTIF, cle_resultat, get_cache_resultats
+)
 import time
 from evaluation import afficher_dashboard_evaluation
 
 st.set_page_config(page_title="Travel Planner Pro - Comparatif", page_icon="🌍", layout="wide")
 
+@st.cache_resource
+def demarrer_indexation():
+    """Construit / met à jour les index RAG en tâche de fond, une seule fois par processus."""
+    return lancer_indexation_arriere_plan()
+
+demarrer_indexation()
+
 if "page" not in st.session_state:
     st.session_state.page = "generation"
 
@@ -19,13 +33,21 @@ st.markdown("Comparez l'impact du RAG et du Multi-Agent sur votre itinéraire.")
 if "comparatif" not in st.session_state:
     st.session_state.comparatif = {}
 
+if "trace" not in st.session_state:
+    st.session_state.trace = None
+
+# Identifiant du dernier comparatif : regroupe ses appels LLM dans le registre d'usage
+if "run_id" not in st.session_state:
+    st.session_state.run_id = None
+
 # if 'WORKFLOW_STEPS' not in st.session_state:
 #     st.session_state.WORKFLOW_STEPS = []
 
 with st.sidebar:
     st.header("⚙️ Configuration")
-    ville = st.selectbox("Destination", ["New_York", "Rome", "Japon"])
-    profil = st.selectbox("Votre profil", ["Luxe", "Etudiant", "Aventure", "Famille"])
+    catalogue = get_catalogue()
+    ville = st.selectbox("Destination", catalogue.noms(), format_func=catalogue.libelle)
+    profil = st.selectbox("Votre profil", PROFILS)
     
     col_a, col_e = st.columns(2)
     with col_a:
@@ -33,12 +55,24 @@ with st.sidebar:
     with col_e:
         enfants = st.number_input("Enfants", min_value=0, max_value=10, value=0)
         
-    budget = st.select_slider("Budget total estimé (€)", options=["Économique", "Modéré", "Élevé"], value="Modéré")
-    rythme = st.radio("Rythme du séjour", ["Détendu (1-2 lieux/jour)", "Équilibré (3 lieux/jour)", "Intense (Marathon)"], index=1)
-    interets = st.multiselect( "Centres d'intérêt", ["Gastronomie", "Culture & Histoire", "Shopping", "Nature", "Vie nocturne"], default=["Gastronomie"])
-    duree = st.slider("Nombre de jours", 1, 7, 3)
+    budget = st.select_slider("Budget total estimé (€)", options=BUDGETS, value="Modéré")
+    rythme = st.radio("Rythme du séjour", RYTHMES, index=1)
+    interets = st.multiselect( "Centres d'intérêt", INTERETS, default=["Gastronomie"])
+    duree = st.slider("Nombre de jours", 1, DUREE_MAX, 3)
+
+    if etat_indexation["en_cours"]:
+        st.caption("📚 Mise à jour des index RAG en arrière-plan...")
 
     st.write("---")
+    utiliser_cache = st.checkbox(
+        "♻️ Réutiliser les itinéraires déjà générés", value=CACHE_ACTIF,
+        help="Décocher pour forcer une nouvelle génération (contourne le cache de résultats)."
+    )
+    taches_paralleles = st.checkbox(
+        "⚡ Paralléliser les tâches indépendantes des agents", value=False,
+        help="Itinéraire, budget et conseils sont produits en parallèle à partir de la liste de lieux, "
+             "puis assemblés par le rédacteur (modes Multi-Agents)."
+    )
     btn_lancer = st.button("🚀 Lancer le comparatif complet", use_container_width=True, type="primary")
 
     st.write("---")
@@ -51,56 +85,71 @@ with st.sidebar:
 # --- LOGIQUE DE GÉNÉRATION ---
 if st.session_state.page == "generation":
     if btn_lancer:
-        configs = [
-            {"id": "mode_1", "name": "👥​ Multi-Agents + 📚 RAG", "rag": True, "agents": True},
-            {"id": "mode_2", "name": "👤 LLM Single + 📚 RAG", "rag": True, "agents": False},
-            {"id": "mode_3", "name": "👥​ Multi-Agents Only", "rag": False, "agents": True},
-            {"id": "mode_4", "name": "👤 LLM Single Only", "rag": False, "agents": False},
-        ]
+        configs = configs_comparatif(taches_paralleles)
         
         st.session_state.comparatif = {}
+        params = {
+            "ville": ville, "profil": profil, "duree": duree, "budget": budget, "rythme": rythme,
+            "interets": interets, "adultes": adultes, "enfants": enfants
+        }
 
         with st.status("🛠️ Génération des scénarios...", expanded=True) as status:
-            for conf in configs:
-                try:
-                    mode_label = conf["name"]
-                    st.write(f"⏳ Traitement de : **{mode_label}**...")
-                    
-                    start_time = time.time()
-                    
-                    # 1. Gestion du RAG
-                    infos_contextuelles = ""
-                    if conf["rag"]:
-                        vectorstore = get_vectorstore(ville)
-                        docs = vectorstore.similarity_search(f"activités et bonnes pratiques à {ville}", k=2)
-                        infos_contextuelles = "\n\n".join([d.page_content for d in docs])
-
-                    # 2. Exécution
-                    instance = create_travel_crew(ville, profil, duree, budget, rythme, interets, adultes, enfants, infos_contextuelles, conf["agents"])
-                    if isinstance(instance, Crew):
-                        resultat_brut = instance.kickoff()
-                    else:
-                        resultat_brut = instance
-                    # 3. Extraction GPS
-                    points = extraire_points_gps(resultat_brut.raw, ville)
-                    
-                    st.session_state.comparatif[conf["id"]] = {
-                        "label": mode_label,
-                        "texte": resultat_brut.raw,
-                        "points": points,
-                        "sources": infos_contextuelles,
-                        "temps": round(time.time() - start_time, 2)
-                    }
-                    
-                    if conf != configs[-1]:
-                        st.write("Wait for API cooldown...")
-                        time.sleep(25) 
-
-                except Exception as e:
-                    st.error(f"Erreur sur {conf['name']} : {e}")
-                    time.sleep(15)
-                    continue
-                    
+            st.write(f"⏳ Lancement en parallèle de {len(configs)} modes...")
+            # Un onglet par mode, rempli au fil de l'eau pendant la génération
+            onglets_flux = st.tabs([conf["name"] for conf in configs])
+            zones = {conf["id"]: onglet.empty() for conf, onglet in zip(configs, onglets_flux)}
+            # La carte d'un mode s'affiche sous son texte dès que ses points GPS sont prêts
+            zones_carte = {conf["id"]: onglet.empty() for conf, onglet in zip(configs, onglets_flux)}
+            textes = {conf["id"]: "" for conf in configs}
+            dernier_rendu = {conf["id"]: 0.0 for conf in configs}
+
+            # Trace du comparatif (RAG, modes, tâches, appels LLM, géocodage), affichée dans l'analyse
+            trace = Trace("comparatif", ville=ville, modes=len(configs))
+            st.session_state.run_id = trace.trace_id
+            for type_evenement, conf, contenu in lancer_comparatif(
+                configs, params, utiliser_cache, trace=trace, run_id=st.session_state.run_id
+            ):
+                if type_evenement == "partiel":
+                    textes[conf["id"]] += contenu
+                    # On limite le rafraîchissement (~6 images/s par mode)
+                    if time.time() - dernier_rendu[conf["id"]] > 0.15:
+                        afficher_flux_mode(zones[conf["id"]], textes[conf["id"]])
+                        dernier_rendu[conf["id"]] = time.time()
+                elif type_evenement == "erreur":
+                    st.error(f"Erreur sur {conf['name']} : {contenu}")
+                elif type_evenement == "fini":
+                    afficher_flux_mode(zones[conf["id"]], contenu["texte"], termine=True)
+                    st.session_state.comparatif[conf["id"]] = contenu
+                    source = " (depuis le cache)" if contenu["cache"] else ""
+                    st.write(
+                        f"✅ **{conf['name']}** généré en {contenu['temps']}s "
+                        f"(premier token à {contenu['temps_premier_token']}s){source}"
+                    )
+                    if contenu["points"] is None:
+                        zones_carte[conf["id"]].info("📍 Géolocalisation des lieux en cours...")
+                else:
+                    st.session_state.comparatif[conf["id"]] = contenu
+                    with zones_carte[conf["id"]].container():
+                        afficher_carte(contenu["points"], f"carte_flux_{conf['id']}")
+                    st.write(
+                        f"📍 **{conf['name']}** : {len(contenu['points'])} lieux géolocalisés "
+                        f"en {contenu['temps_enrichissement']}s"
+                    )
+
+            trace.terminer()
+            trace.sauvegarder()
+            st.session_state.trace = trace
+
+            # Les modes finissent dans le désordre : on rétablit l'ordre des onglets
+            st.session_state.comparatif = {
+                conf["id"]: st.session_state.comparatif[conf["id"]]
+                for conf in configs if conf["id"] in st.session_state.comparatif
+            }
+            for modele, stats in limiteur.stats().items():
+                st.caption(
+                    f"⏱️ {modele} : {stats['appels']} appels, attente moyenne {stats['attente_moyenne_s']}s "
+                    f"(max {stats['attente_max_s']}s), {stats['retry_after']} Retry-After reçus"
+                )
             status.update(label="✅ Traitement terminé !", state="complete", expanded=False)
             
     
@@ -127,20 +176,30 @@ if st.session_state.page == "generation":
             # On réduit le RAG pour ce test
                 vectorstore = get_vectorstore(ville)
                 # k=1 est suffisant pour prouver le fonctionnement
-                docs = vectorstore.similarity_search(f"noms de lieux à {ville}", k=1)
+                docs = vectorstore.similarity_search(f"noms de lieux à {ville}", k=1, filter=filtre_destination(ville))
                 
                 # Limite EXTRÊME à 300 caractères (environ 50 mots)
                 info_test = f"New York est divisée en 5 boroughs : Manhattan, Brooklyn, Queens, Bronx, Staten Island."
                 
-                # Ajoutez une pause forcée AVANT de lancer pour vider le quota Groq
-                st.warning("Vidage du quota API (15s)...")
-                time.sleep(10) 
-                
+                # Plus de pause forcée : le limiteur partagé espace les appels du manager
                 start_h = time.time()
-                crew_h = create_hierarchical_crew(ville, profil, duree, budget, rythme, interets, adultes, enfants, info_test, True)
-                result_h = crew_h.kickoff()
+                params_h = {
+                    "ville": ville, "profil": profil, "duree": duree, "budget": budget, "rythme": rythme,
+                    "interets": interets, "adultes": adultes, "enfants": enfants
+                }
+                cle_h = cle_resultat(
+                    params_h, "hierarchique", signature_roles(*ROLES_MODES["hierarchique"]),
+                    gabarit_crew(create_hierarchical_crew), info_test
+                )
+                stocke_h = get_cache_resultats().lire(cle_h) if utiliser_cache else None
+                if stocke_h is None:
+                    crew_h = create_hierarchical_crew(ville, profil, duree, budget, rythme, interets, adultes, enfants, info_test, True)
+                    with etiquettes(run=st.session_state.run_id, mode="👑 Hiérarchique", etape="generation"):
+                        stocke_h = {"texte": crew_h.kickoff().raw}
+                    if utiliser_cache:
+                        get_cache_resultats().ecrire(cle_h, stocke_h)
                 st.success(f"✅ Terminé en {round(time.time() - start_h, 2)}s !")
-                st.markdown(result_h.raw)
+                st.markdown(stocke_h["texte"])
 
             except Exception as e:
                 st.error(f"Erreur: {e}")
@@ -156,4 +215,6 @@ if st.session_state.page == "evaluation":
         "enfants": enfants,
         "interets": ", ".join(interets)
     }
-    afficher_dashboard_evaluation(st, st.session_state.comparatif, config_voyage)
\ No newline at end of file
+    afficher_dashboard_evaluation(
+        st, st.session_state.comparatif, config_voyage, st.session_state.trace, st.session_state.run_id
+    )
\ No newline at end of file
@@ -0,0 +1,300 @@
+"""
+Évaluation en lot, sans Streamlit : parcourt la grille ville x profil x budget x rythme x durée
+pour les quatre modes du comparatif et la crew hiérarchique, puis écrit les métriques en Parquet.
+
+Les jobs sont répartis sur plusieurs processus. Chaque lot de résultats terminés est écrit dans
+<sortie>/lots/ (point de reprise) : relancer la même commande saute les jobs déjà réussis et
+retente ceux en erreur. Le fichier consolidé <sortie>/resultats.parquet est réécrit en fin de lot.
+
+    python batch_eval.py --sortie batch/ --processus 4
+    python batch_eval.py --villes Rome --durees 2 3 --modes mode_1 hierarchique
+    python batch_eval.py --faux-serveurs --limite 50      # LLM et Nominatim factices (benchmarks/)
+
+Avec le vrai fournisseur, les quotas RPM/TPM du limiteur sont partagés entre les processus.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+# La grille par défaut reprend les options de la barre latérale (scheduler.py). Le projet n'est importé
+# qu'après la configuration de l'environnement : les faux serveurs doivent être en place avant.
+MODE_HIERARCHIQUE = "hierarchique"
+CONF_HIERARCHIQUE = {"id": MODE_HIERARCHIQUE, "name": "👑 Hiérarchique", "rag": True, "agents": True}
+
+# Résultats écrits sur disque tous les LOT jobs terminés
+LOT = int(os.getenv("BATCH_LOT", 20))
+
+COLONNES_JOB = ["job", "ville", "profil", "budget", "rythme", "duree", "mode"]
+
+
+def creer_jobs(villes, profils, budgets, rythmes, durees, modes, adultes, enfants, interets):
+    """Un job par combinaison ; groupés par ville pour profiter du contexte RAG déjà chargé par chaque processus."""
+    from crewai_tools.tools.result_cache import empreinte
+
+    jobs = []
+    for ville, profil, budget, rythme, duree, mode in itertools.product(villes, profils, budgets, rythmes, durees, modes):
+        job = {"ville": ville, "profil": profil, "budget": budget, "rythme": rythme, "duree": duree, "mode": mode,
+               "adultes": adultes, "enfants": enfants, "interets": interets}
+        jobs.append({"job": empreinte(json.dumps(job, sort_keys=True, ensure_ascii=False))[:16], **job})
+    return jobs
+
+
+def lire_lots(dossier):
+    """Résultats déjà écrits (toutes tentatives confondues), DataFrame vide s'il n'y en a pas."""
+    lots = sorted(f for f in os.listdir(dossier) if f.endswith(".parquet")) if os.path.isdir(dossier) else []
+    if not lots:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(os.path.join(dossier, f)) for f in lots], ignore_index=True)
+
+
+def jobs_reussis(resultats):
+    if resultats.empty:
+        return set()
+    return set(resultats.loc[resultats["erreur"].isna(), "job"])
+
+
+def ecrire_lot(dossier, lignes):
+    """Écrit un lot de résultats (fichier temporaire puis renommage : un lot est complet ou absent)."""
+    os.makedirs(dossier, exist_ok=True)
+    df = pd.DataFrame(lignes)
+    # Colonnes mixtes ("N/A" et nombres) : Parquet exige un type par colonne
+    if "Fidélité RAG (%)" in df:
+        df["Fidélité RAG (%)"] = pd.to_numeric(df["Fidélité RAG (%)"], errors="coerce")
+    chemin = os.path.join(dossier, f"lot-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{len(os.listdir(dossier)):05d}.parquet")
+    df.to_parquet(chemin + ".tmp", index=False)
+    os.replace(chemin + ".tmp", chemin)
+
+
+def consolider(sortie):
+    """resultats.parquet : dernière tentative de chaque job."""
+    resultats = lire_lots(os.path.join(sortie, "lots"))
+    if resultats.empty:
+        return resultats
+    resultats = resultats.sort_values("termine_le").drop_duplicates("job", keep="last")
+    resultats.to_parquet(os.path.join(sortie, "resultats.parquet"), index=False)
+    return resultats
+
+
+# --- CÔTÉ PROCESSUS DE TRAVAIL ---
+
+_contextes_rag = {}
+
+
+def partager_quotas(nb_processus):
+    """
+    Chaque processus a son propre limiteur : les quotas RPM/TPM de chaque modèle (table du limiteur
+    et modèles distants des rôles, y compris ceux choisis par LLM_MODELE_*) et les slots des serveurs
+    locaux (Ollama, llama.cpp) sont divisés entre eux.
+    """
+    from crewai_tools.tools.rate_limiter import LIMITES_MODELES, limites_modele, nom_modele
+    from crewai_tools.tools.llm_backend import ROLES, SLOTS_LOCAUX, config_role
+
+    modeles = set(LIMITES_MODELES)
+    for role in ROLES:
+        config = config_role(role)
+        if config["backend"] not in SLOTS_LOCAUX:
+            modeles.add(nom_modele(config["model"]))
+    for modele in sorted(modeles):
+        suffixe = re.sub(r"[^A-Z0-9]", "_", modele.upper())
+        for cle, valeur in limites_modele(modele).items():
+            os.environ[f"LIMITE_{cle.upper()}_{suffixe}"] = str(max(1, valeur // nb_processus))
+    for backend, slots in SLOTS_LOCAUX.items():
+        SLOTS_LOCAUX[backend] = max(1, slots // nb_processus)
+
+
+def initialiser_processus(nb_processus):
+    partager_quotas(nb_processus)
+
+
+def contexte_rag(ville):
+    """Contexte RAG d'une ville, recherché une seule fois par processus."""
+    from scheduler import recuperer_contexte_rag
+
+    if ville not in _contextes_rag:
+        _contextes_rag[ville] = recuperer_contexte_rag(ville)
+    return _contextes_rag[ville]
+
+
+def generer_hierarchique(params, infos_contextuelles, utiliser_cache):
+    """Même forme de résultat que scheduler.generer_mode, pour la crew hiérarchique."""
+    from crewai_tools.tools.result_cache import cle_resultat, get_cache_resultats, usage_en_dict
+    from crewai_tools.tools.usage_ledger import etiquettes
+    from crewai_tools.tools.llm_backend import signature_roles
+    from agents_hierarchical import create_hierarchical_crew
+    from scheduler import gabarit_crew, ROLES_MODES
+
+    debut = time.time()
+    cle = cle_resultat(params, MODE_HIERARCHIQUE, signature_roles(*ROLES_MODES[MODE_HIERARCHIQUE]),
+                       gabarit_crew(create_hierarchical_crew), infos_contextuelles)
+    stocke = get_cache_resultats().lire(cle) if utiliser_cache else None
+    depuis_cache = stocke is not None
+    if stocke is None:
+        crew = create_hierarchical_crew(
+            params["ville"], params["profil"], params["duree"], params["budget"], params["rythme"],
+            params["interets"], params["adultes"], params["enfants"], infos_contextuelles, True
+        )
+        with etiquettes(mode=CONF_HIERARCHIQUE["name"], etape="generation"):
+            resultat_brut = crew.kickoff()
+        stocke = {"texte": resultat_brut.raw, "points": None, "token_usage": usage_en_dict(resultat_brut.token_usage)}
+    return {
+        "label": CONF_HIERARCHIQUE["name"],
+        "texte": stocke["texte"],
+        "points": stocke.get("points"),
+        "sources": infos_contextuelles,
+        "token_usage": stocke.get("token_usage") or {},
+        "cache": depuis_cache,
+        "cle_cache": cle,
+        "temps": round(time.time() - debut, 2),
+        "temps_premier_token": None,
+        "temps_enrichissement": 0.0 if depuis_cache and stocke.get("points") is not None else None,
+    }
+
+
+def executer_job(job, parallele, utiliser_cache):
+    """Génère, géocode et évalue un job ; renvoie une ligne de résultats (erreur renseignée en cas d'échec)."""
+    from scheduler import configs_comparatif, generer_mode, enrichir_mode
+    from evaluation import calculer_metriques
+    from crewai_tools.tools.usage_ledger import etiquettes
+
+    debut = time.time()
+    ligne = {colonne: job[colonne] for colonne in COLONNES_JOB}
+    params = {cle: job[cle] for cle in ("ville", "profil", "duree", "budget", "rythme", "interets", "adultes", "enfants")}
+    run_id = f"batch-{job['job']}"
+    try:
+        confs = {conf["id"]: conf for conf in configs_comparatif(parallele) + [CONF_HIERARCHIQUE]}
+        conf = confs[job["mode"]]
+        infos = contexte_rag(job["ville"]) if conf["rag"] else ""
+        with etiquettes(run=run_id):
+            if conf is CONF_HIERARCHIQUE:
+                resultat = generer_hierarchique(params, infos, utiliser_cache)
+            else:
+                resultat = generer_mode(conf, params, infos, utiliser_cache)
+            resultat = enrichir_mode(conf, params, resultat, utiliser_cache)
+        config_voyage = {**params, "interets": ", ".join(params["interets"])}
+        metriques = calculer_metriques({conf["id"]: resultat}, config_voyage, run_id).iloc[0].to_dict()
+        ligne.update(metriques)
+        ligne.update({"Texte": resultat["texte"], "Depuis le cache": resultat["cache"], "erreur": None})
+    except Exception as e:
+        ligne["erreur"] = f"{type(e).__name__}: {e}"
+    ligne.update({"duree_job_s": round(time.time() - debut, 2), "termine_le": time.time()})
+    return ligne
+
+
+# --- CÔTÉ PROCESSUS PRINCIPAL ---
+
+def configurer_faux_serveurs(pile, sortie, args):
+    """Démarre le faux LLM et le faux Nominatim des benchmarks et y redirige le projet (caches dans la sortie)."""
+    from benchmarks.faux_serveurs import FauxLLM, FauxNominatim
+    from benchmarks.run_benchmarks import configurer_environnement
+
+    faux_llm = pile.enter_context(FauxLLM(args.latence, args.latence_token, args.tokens))
+    faux_nominatim = pile.enter_context(FauxNominatim())
+    dossier = os.path.join(sortie, "faux_serveurs")
+    os.makedirs(dossier, exist_ok=True)
+    configurer_environnement(dossier, faux_llm, faux_nominatim)
+
+
+def lancer(args):
+    from contextlib import ExitStack
+
+    with ExitStack() as pile:
+        if args.faux_serveurs:
+            configurer_faux_serveurs(pile, args.sortie, args)
+        # Imports du projet après la configuration de l'environnement (hérité par les processus)
+        from scheduler import PROFILS, BUDGETS, RYTHMES, DUREE_MAX, configs_comparatif
+        from crewai_tools.tools.catalogue import get_catalogue
+        from crewai_tools.tools.indexation import construire_tous_les_index
+
+        jobs = creer_jobs(
+            args.villes or get_catalogue().noms(), args.profils or PROFILS, args.budgets or BUDGETS,
+            args.rythmes or RYTHMES, args.durees or list(range(1, DUREE_MAX + 1)), args.modes,
+            args.adultes, args.enfants, args.interets,
+        )
+        dossier_lots = os.path.join(args.sortie, "lots")
+        deja_faits = jobs_reussis(lire_lots(dossier_lots))
+        a_faire = [job for job in jobs if job["job"] not in deja_faits]
+        if args.limite:
+            a_faire = a_faire[:args.limite]
+        print(f"📋 {len(jobs)} jobs dans la grille, {len(deja_faits & {j['job'] for j in jobs})} déjà réussis, "
+              f"{len(a_faire)} à exécuter sur {args.processus} processus")
+        if not a_faire:
+            return consolider(args.sortie)
+
+        # Index construits ici, avant le pool : des processus indexant la même ville en parallèle
+        # se disputeraient le dossier Chroma et le fichier de progression
+        confs = {conf["id"]: conf for conf in configs_comparatif(args.parallele) + [CONF_HIERARCHIQUE]}
+        villes_rag = list(dict.fromkeys(job["ville"] for job in a_faire if confs[job["mode"]]["rag"]))
+        if villes_rag:
+            print(f"📚 Indexation de {', '.join(villes_rag)} avant le lancement des processus")
+            construire_tous_les_index(villes_rag)
+
+        lignes, termines, erreurs = [], 0, 0
+        # spawn : chaque processus part d'un interpréteur neuf (pas de threads ni de connexions SQLite hérités)
+        contexte = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=args.processus, mp_context=contexte,
+                                 initializer=initialiser_processus, initargs=(args.processus,)) as pool:
+            futurs = [pool.submit(executer_job, job, args.parallele, not args.sans_cache) for job in a_faire]
+            try:
+                for futur in as_completed(futurs):
+                    ligne = futur.result()
+                    lignes.append(ligne)
+                    termines += 1
+                    if ligne["erreur"]:
+                        erreurs += 1
+                        print(f"⚠️ {ligne['job']} ({ligne['ville']}, {ligne['mode']}) : {ligne['erreur']}")
+                    if len(lignes) >= LOT:
+                        ecrire_lot(dossier_lots, lignes)
+                        lignes = []
+                        print(f"💾 {termines}/{len(a_faire)} jobs terminés ({erreurs} en erreur)")
+            except KeyboardInterrupt:
+                print("⏹️ Interruption : écriture des résultats terminés, reprise possible en relançant la commande")
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            finally:
+                if lignes:
+                    ecrire_lot(dossier_lots, lignes)
+        print(f"✅ {termines} jobs terminés ({erreurs} en erreur)")
+        return consolider(args.sortie)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Évaluation en lot de la grille de paramètres (sans Streamlit).")
+    parser.add_argument("--sortie", default="batch_eval", help="dossier des lots et de resultats.parquet")
+    parser.add_argument("--processus", type=int, default=max(1, min(4, os.cpu_count() or 1)))
+    parser.add_argument("--villes", nargs="+", help="destinations du catalogue (toutes par défaut)")
+    parser.add_argument("--profils", nargs="+")
+    parser.add_argument("--budgets", nargs="+")
+    parser.add_argument("--rythmes", nargs="+")
+    parser.add_argument("--durees", nargs="+", type=int)
+    parser.add_argument("--modes", nargs="+", default=["mode_1", "mode_2", "mode_3", "mode_4", MODE_HIERARCHIQUE],
+                        choices=["mode_1", "mode_2", "mode_3", "mode_4", MODE_HIERARCHIQUE])
+    parser.add_argument("--adultes", type=int, default=2)
+    parser.add_argument("--enfants", type=int, default=0)
+    parser.add_argument("--interets", nargs="+", default=["Gastronomie"])
+    parser.add_argument("--parallele", action="store_true", help="graphe de tâches parallèles pour les modes multi-agents")
+    parser.add_argument("--sans-cache", action="store_true", help="ignore le cache de résultats (régénère tout)")
+    parser.add_argument("--limite", type=int, help="nombre maximal de jobs à exécuter dans cette session")
+    parser.add_argument("--faux-serveurs", action="store_true", help="LLM et Nominatim factices (benchmarks/faux_serveurs.py)")
+    parser.add_argument("--latence", type=float, default=0.05, help="faux LLM : latence fixe par appel (s)")
+    parser.add_argument("--latence-token", type=float, default=0.0005, help="faux LLM : latence par token (s)")
+    parser.add_argument("--tokens", type=int, default=600, help="faux LLM : tokens générés par réponse")
+    args = parser.parse_args()
+
+    try:
+        resultats = lancer(args)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    if not resultats.empty:
+        print(f"📊 {len(resultats)} jobs dans {os.path.join(args.sortie, 'resultats.parquet')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Faux serveurs locaux pour les benchmarks (aucun accès réseau) :
+- FauxLLM : API compatible OpenAI (chat/completions, streaming SSE compris), utilisée via GROQ_API_BASE,
+  et API d'embedding Ollama (/api/embed), utilisée via OLLAMA_HOST ;
+- FauxNominatim : /search au format JSON de Nominatim, utilisé via NOMINATIM_DOMAINE.
+Les réponses sont déterministes et la latence est configurable.
+"""
+import csv
+import json
+import math
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+GAZETTEER_CSV = "crewai_tools/knowledge/gazetteer.csv"
+DIMENSION_EMBEDDING = 64
+
+
+def _hash(texte):
+    return int(hashlib.sha256(texte.encode("utf-8")).hexdigest(), 16)
+
+
+def lieux_par_destination(fichier=GAZETTEER_CSV):
+    lieux = {}
+    with open(fichier, encoding="utf-8", newline="") as f:
+        for ligne in csv.DictReader(f):
+            lieux.setdefault(ligne["destination"], []).append(ligne["nom"])
+    return lieux
+
+
+class Compteurs:
+    """Compteurs partagés par les threads du serveur (appels, tokens)."""
+
+    def __init__(self):
+        self.verrou = threading.Lock()
+        self.valeurs = {}
+
+    def ajouter(self, **increments):
+        with self.verrou:
+            for cle, valeur in increments.items():
+                self.valeurs[cle] = self.valeurs.get(cle, 0) + valeur
+
+    def instantane(self):
+        with self.verrou:
+            return dict(self.valeurs)
+
+
+class _HTTPServeur(ThreadingHTTPServer):
+    # File d'attente de 5 connexions par défaut : au-delà, les connexions simultanées des clients
+    # asynchrones sont refusées puis re-tentées par TCP une seconde plus tard
+    request_queue_size = 128
+
+
+class _Serveur:
+    """Serveur HTTP local lancé dans un thread ; utilisable comme gestionnaire de contexte."""
+
+    def __init__(self, gestionnaire):
+        self.compteurs = Compteurs()
+        self.httpd = _HTTPServeur(("127.0.0.1", 0), gestionnaire)
+        self.httpd.daemon_threads = True
+        self.httpd.serveur = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def adresse(self):
+        hote, port = self.httpd.server_address[:2]
+        return f"{hote}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _GestionnaireJSON(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _lire_json(self):
+        longueur = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(longueur) or b"{}")
+
+    def _repondre_json(self, donnees, statut=200):
+        corps = json.dumps(donnees, ensure_ascii=False).encode("utf-8")
+        self.send_response(statut)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+
+# --- Faux LLM ---
+
+def itineraire_factice(prompt, lieux, nb_tokens):
+    """Itinéraire déterministe citant des lieux du gazetteer, d'environ nb_tokens tokens."""
+    lignes = []
+    graine = _hash(prompt)
+    jour = 1
+    while sum(len(l) for l in lignes) // 4 < nb_tokens:
+        lignes.append(f"### Jour {jour}")
+        for creneau in ("Matin", "Midi", "Après-midi", "Soir"):
+            nom = lieux[(graine + len(lignes)) % len(lieux)] if lieux else "Centre historique"
+            lignes.append(f"- **{creneau}** : {nom} — visite conseillée, prévoir 2h et un billet coupe-file.")
+        jour += 1
+    return "\n".join(lignes)
+
+
+class _GestionnaireLLM(_GestionnaireJSON):
+
+    def do_POST(self):
+        serveur = self.server.serveur
+        requete = self._lire_json()
+        if self.path.rstrip("/").endswith("/api/embed"):
+            return self._embed(serveur, requete)
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            return self._chat(serveur, requete)
+        self._repondre_json({"error": f"chemin inconnu : {self.path}"}, 404)
+
+    def _embed(self, serveur, requete):
+        textes = requete.get("input") or []
+        textes = [textes] if isinstance(textes, str) else textes
+        time.sleep(serveur.latence_embedding)
+        serveur.compteurs.ajouter(appels_embedding=1, textes_embeddes=len(textes))
+        self._repondre_json({"model": requete.get("model"), "embeddings": [serveur.vecteur(t) for t in textes]})
+
+    def _chat(self, serveur, requete):
+        messages = requete.get("messages") or []
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        contenu = serveur.reponse(prompt)
+        tokens_prompt = len(prompt) // 4
+        tokens_reponse = max(len(contenu) // 4, 1)
+        serveur.compteurs.ajouter(appels_llm=1, tokens_prompt=tokens_prompt, tokens_reponse=tokens_reponse)
+        usage = {"prompt_tokens": tokens_prompt, "completion_tokens": tokens_reponse,
+                 "total_tokens": tokens_prompt + tokens_reponse}
+        identifiant = f"chatcmpl-{_hash(prompt) % 10 ** 12}"
+        modele = requete.get("model", "faux")
+
+        time.sleep(serveur.latence_premier_token)
+        if not requete.get("stream"):
+            time.sleep(serveur.latence_par_token * tokens_reponse)
+            return self._repondre_json({
+                "id": identifiant, "object": "chat.completion", "created": int(time.time()), "model": modele,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": contenu},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        morceaux = [contenu[i:i + 16] for i in range(0, len(contenu), 16)]
+        for i, morceau in enumerate(morceaux):
+            time.sleep(serveur.latence_par_token * 4)
+            evenement = {
+                "id": identifiant, "object": "chat.completion.chunk", "created": int(time.time()), "model": modele,
+                "choices": [{"index": 0, "delta": {"content": morceau},
+                             "finish_reason": "stop" if i == len(morceaux) - 1 else None}],
+            }
+            if i == len(morceaux) - 1:
+                evenement["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(evenement, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FauxLLM(_Serveur):
+    """
+    Remplaçant local de Groq (chat/completions) et d'Ollama (embeddings).
+    latence_premier_token : délai fixe par appel ; latence_par_token : délai par token généré.
+    """
+
+    def __init__(self, latence_premier_token=0.05, latence_par_token=0.0005, tokens_reponse=600,
+                 latence_embedding=0.005):
+        super().__init__(_GestionnaireLLM)
+        self.latence_premier_token = latence_premier_token
+        self.latence_par_token = latence_par_token
+        self.tokens_reponse = tokens_reponse
+        self.latence_embedding = latence_embedding
+        self.lieux = lieux_par_destination()
+
+    def vecteur(self, texte):
+        """Embedding déterministe (sac de mots haché, normalisé) : des textes proches restent proches."""
+        vecteur = [0.0] * DIMENSION_EMBEDDING
+        for mot in texte.lower().split():
+            vecteur[_hash(mot) % DIMENSION_EMBEDDING] += 1.0
+        norme = math.sqrt(sum(v * v for v in vecteur)) or 1.0
+        return [v / norme for v in vecteur]
+
+    def reponse(self, prompt):
+        destination = next((d for d in self.lieux if d in prompt or d.replace("_", " ") in prompt), None)
+        lieux = self.lieux.get(destination, [])
+        if "Note:" in prompt and "Justification:" in prompt:
+            # Juge LLM (evaluation.noter_modes)
+            return f"Note: {5 + _hash(prompt) % 4}/10\nJustification: Itinéraire factice du benchmark."
+        if "liste JSON" in prompt:
+            # Extraction des lieux par le LLM (solution de secours du géocodage)
+            return json.dumps(lieux[:15], ensure_ascii=False)
+        texte = itineraire_factice(prompt, lieux, self.tokens_reponse)
+        if "Final Answer" in prompt:
+            # Agents crewai : format ReAct attendu par l'analyseur de réponses
+            return f"Thought: I now can give a great answer\nFinal Answer: {texte}"
+        return texte
+
+
+# --- Faux Nominatim ---
+
+class _GestionnaireNominatim(_GestionnaireJSON):
+
+    def do_GET(self):
+        serveur = self.server.serveur
+        url = urlparse(self.path)
+        if not url.path.rstrip("/").endswith("/search"):
+            return self._repondre_json({"error": f"chemin inconnu : {self.path}"}, 404)
+        requete = (parse_qs(url.query).get("q") or [""])[0]
+        time.sleep(serveur.latence)
+        serveur.compteurs.ajouter(appels_nominatim=1)
+        graine = _hash(requete)
+        if graine % 10 == 0:
+            # Une requête sur dix reste introuvable, comme en conditions réelles
+            return self._repondre_json([])
+        lat = 41.9 + (graine % 1000) / 10000
+        lon = 12.5 + (graine // 1000 % 1000) / 10000
+        self._repondre_json([{"lat": str(lat), "lon": str(lon), "display_name": requete,
+                              "place_id": graine % 10 ** 9, "importance": 0.5}])
+
+
+class FauxNominatim(_Serveur):
+    def __init__(self, latence=0.02):
+        super().__init__(_GestionnaireNominatim)
+        self.latence = latence
@@ -0,0 +1,314 @@
+"""
+Benchmark de bout en bout de la génération d'itinéraires, sans réseau :
+le LLM (Groq), les embeddings (Ollama) et Nominatim sont remplacés par les faux serveurs locaux
+de benchmarks/faux_serveurs.py, avec une latence configurable.
+
+Étapes mesurées : indexation (get_vectorstore), rag, sequentiel_llm_seul, sequentiel_agents,
+parallele_agents (graphe de tâches), hierarchique, geocodage (extraire_points_gps) et metriques (calculer_metriques).
+Pour chacune : latence p50/p95, appels (LLM, embedding, Nominatim) et tokens par itération,
+pic mémoire Python (tracemalloc, mesuré sur une itération supplémentaire).
+
+Les caches (embeddings, géocodage) vivent dans un dossier temporaire : la première itération
+est à froid, les suivantes profitent des caches comme dans l'application.
+
+    python -m benchmarks.run_benchmarks                  # rapport
+    python -m benchmarks.run_benchmarks --enregistrer    # met à jour les références
+    python -m benchmarks.run_benchmarks --comparer       # code de sortie 1 en cas de régression (CI)
+
+Deux références : benchmarks/reference.json (versionnée) fixe les appels et tokens par étape, déterministes
+face aux faux serveurs, et sert toujours à la comparaison ; benchmarks/reference_locale.json (non versionnée)
+fixe latences et mémoire, qui dépendent de la machine, et n'est comparée que si elle existe.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+from benchmarks.faux_serveurs import FauxLLM, FauxNominatim
+
+REFERENCE = os.path.join(os.path.dirname(__file__), "reference.json")
+REFERENCE_LOCALE = os.path.join(os.path.dirname(__file__), "reference_locale.json")
+
+ETAPES = ["indexation", "rag", "sequentiel_llm_seul", "sequentiel_agents", "parallele_agents", "hierarchique",
+          "geocodage", "metriques"]
+
+# Tolérance par défaut avant de signaler une régression (latence, tokens, mémoire)
+TOLERANCE = 0.3
+
+# Compteurs déterministes (référence versionnée) et mesures propres à la machine (référence locale)
+COMPTEURS = ["appels_llm", "tokens_prompt", "tokens_reponse", "appels_embedding", "appels_nominatim"]
+MESURES_MACHINE = ["p50_s", "p95_s", "memoire_pic_ko"]
+
+# Valeurs proposées par la barre latérale (scheduler.PROFILS, BUDGETS, RYTHMES, INTERETS) : les prompts
+# mesurés sont ceux que l'application envoie. Le projet n'est pas importé ici (faux serveurs d'abord).
+PARAMS_VOYAGE = {
+    "profil": "Famille", "duree": 3, "budget": "Modéré", "rythme": "Équilibré (3 lieux/jour)",
+    "interets": ["Culture & Histoire", "Gastronomie"], "adultes": 2, "enfants": 1,
+}
+
+
+def percentile(valeurs, p):
+    valeurs = sorted(valeurs)
+    if not valeurs:
+        return 0.0
+    rang = (len(valeurs) - 1) * p / 100
+    bas = int(rang)
+    haut = min(bas + 1, len(valeurs) - 1)
+    return valeurs[bas] + (valeurs[haut] - valeurs[bas]) * (rang - bas)
+
+
+def configurer_environnement(dossier, faux_llm, faux_nominatim):
+    """Redirige toutes les dépendances externes vers les faux serveurs, avant tout import du projet."""
+    os.environ.update({
+        "GROQ_API_BASE": f"http://{faux_llm.adresse}/openai/v1",
+        "GROQ_API_KEY": "cle-benchmark",
+        "OLLAMA_HOST": f"http://{faux_llm.adresse}",
+        "NOMINATIM_DOMAINE": faux_nominatim.adresse,
+        "NOMINATIM_SCHEME": "http",
+        "NOMINATIM_DELAI": "0",
+        "NOMINATIM_CONCURRENCE": "8",
+        "CHROMA_PATH": os.path.join(dossier, "chroma"),
+        "GEOCACHE_PATH": os.path.join(dossier, "geocache.sqlite"),
+        "EMBEDDINGS_CACHE_PATH": os.path.join(dossier, "embeddings_cache.sqlite"),
+        "RESULT_CACHE_PATH": os.path.join(dossier, "result_cache.sqlite"),
+        "USAGE_PATH": os.path.join(dossier, "usage.sqlite"),
+        "SCORE_CACHE_PATH": os.path.join(dossier, "score_cache.sqlite"),
+        "TRACES_PATH": os.path.join(dossier, "traces"),
+        "CACHE_RESULTATS": "0",
+        "CACHE_NOTES": "0",
+        # Le limiteur de débit ne doit pas mesurer les quotas Groq
+        "LIMITE_RPM_LLAMA_3_1_8B_INSTANT": "1000000",
+        "LIMITE_TPM_LLAMA_3_1_8B_INSTANT": "1000000000",
+        "LIMITE_RPM_LLAMA_3_3_70B_VERSATILE": "1000000",
+        "LIMITE_TPM_LLAMA_3_3_70B_VERSATILE": "1000000000",
+        # litellm ne doit pas télécharger de tokenizer
+        "HF_HUB_OFFLINE": "1",
+    })
+
+
+def executer_crew(resultat):
+    """create_*_crew renvoie une Crew (à lancer) ou directement le résultat du mode LLM seul."""
+    return resultat.kickoff() if hasattr(resultat, "kickoff") else resultat
+
+
+def definir_etapes(ville):
+    """Fonctions à mesurer ; chacune reçoit et complète un dict d'état partagé entre étapes."""
+    from agents_sequential import create_travel_crew
+    from agents_parallel import create_parallel_crew
+    from agents_hierarchical import create_hierarchical_crew
+    from evaluation import calculer_metriques
+    from crewai_tools.tools.database import get_vectorstore
+    from crewai_tools.tools.retrieval import recuperer_contexte
+    from crewai_tools.tools.geocoder_tool import extraire_points_gps
+
+    p = PARAMS_VOYAGE
+    arguments = (ville, p["profil"], p["duree"], p["budget"], p["rythme"], p["interets"], p["adultes"], p["enfants"])
+
+    def indexation(etat):
+        get_vectorstore(ville)
+
+    def rag(etat):
+        etat["rag"] = recuperer_contexte(ville, f"activités et bonnes pratiques à {ville}")
+
+    def sequentiel_llm_seul(etat):
+        etat["texte_llm"] = executer_crew(create_travel_crew(*arguments, etat.get("rag", ""), False)).raw
+
+    def sequentiel_agents(etat):
+        etat["texte_agents"] = executer_crew(create_travel_crew(*arguments, etat.get("rag", ""), True)).raw
+
+    def parallele_agents(etat):
+        executer_crew(create_parallel_crew(*arguments, etat.get("rag", ""), True))
+
+    def hierarchique(etat):
+        executer_crew(create_hierarchical_crew(*arguments, etat.get("rag", ""), True))
+
+    def geocodage(etat):
+        etat["points"] = extraire_points_gps(etat.get("texte_agents") or etat.get("texte_llm", ""), ville)
+
+    def metriques(etat):
+        comparatif = {"agents": {
+            "label": "Agents", "texte": etat.get("texte_agents", ""), "points": etat.get("points", []),
+            "sources": etat.get("rag", ""), "temps": 0,
+        }}
+        calculer_metriques(comparatif, {"ville": ville, **p})
+
+    return {
+        "indexation": indexation, "rag": rag, "sequentiel_llm_seul": sequentiel_llm_seul,
+        "sequentiel_agents": sequentiel_agents, "parallele_agents": parallele_agents, "hierarchique": hierarchique,
+        "geocodage": geocodage, "metriques": metriques,
+    }
+
+
+def difference(apres, avant):
+    return {cle: apres.get(cle, 0) - avant.get(cle, 0) for cle in set(apres) | set(avant)}
+
+
+def mesurer_etape(fonction, etat, iterations, compteurs):
+    """Latences sur `iterations` exécutions, compteurs moyens par itération, puis pic mémoire."""
+    latences = []
+    avant = compteurs()
+    for _ in range(iterations):
+        debut = time.perf_counter()
+        fonction(etat)
+        latences.append(time.perf_counter() - debut)
+    consommation = difference(compteurs(), avant)
+
+    tracemalloc.start()
+    try:
+        fonction(etat)
+        _, pic = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_s": round(percentile(latences, 50), 4),
+        "p95_s": round(percentile(latences, 95), 4),
+        "appels_llm": round(consommation.get("appels_llm", 0) / iterations, 2),
+        "tokens_prompt": round(consommation.get("tokens_prompt", 0) / iterations, 1),
+        "tokens_reponse": round(consommation.get("tokens_reponse", 0) / iterations, 1),
+        "appels_embedding": round(consommation.get("appels_embedding", 0) / iterations, 2),
+        "appels_nominatim": round(consommation.get("appels_nominatim", 0) / iterations, 2),
+        "memoire_pic_ko": round(pic / 1024, 1),
+    }
+
+
+def lancer(args):
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as dossier, \
+            FauxLLM(args.latence, args.latence_token, args.tokens, args.latence_embedding) as faux_llm, \
+            FauxNominatim(args.latence_nominatim) as faux_nominatim:
+        configurer_environnement(dossier, faux_llm, faux_nominatim)
+        etapes = definir_etapes(args.ville)
+
+        def compteurs():
+            return {**faux_llm.compteurs.instantane(), **faux_nominatim.compteurs.instantane()}
+
+        etat = {}
+        resultats = {}
+        for nom in args.etapes:
+            print(f"⏱️  {nom}...", file=sys.stderr)
+            # L'indexation est une construction unique : une seule itération a un sens
+            iterations = 1 if nom == "indexation" else args.iterations
+            resultats[nom] = mesurer_etape(etapes[nom], etat, iterations, compteurs)
+        return resultats
+
+
+def parametres_compteurs(args):
+    """Paramètres dont dépendent les compteurs (les caches rendent les moyennes dépendantes des itérations)."""
+    return {"ville": args.ville, "iterations": args.iterations, "tokens": args.tokens}
+
+
+def parametres_rapport(args):
+    return {**parametres_compteurs(args), "latence": args.latence, "latence_token": args.latence_token,
+            "latence_embedding": args.latence_embedding, "latence_nominatim": args.latence_nominatim}
+
+
+def reference_compteurs(rapport, args):
+    return {"parametres": parametres_compteurs(args),
+            "etapes": {nom: {cle: mesures[cle] for cle in COMPTEURS} for nom, mesures in rapport["etapes"].items()}}
+
+
+def ecrire_json(fichier, donnees):
+    with open(fichier, "w", encoding="utf-8") as f:
+        json.dump(donnees, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def lire_json(fichier):
+    with open(fichier, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def afficher(resultats):
+    colonnes = ["p50_s", "p95_s", "appels_llm", "tokens_prompt", "tokens_reponse",
+                "appels_embedding", "appels_nominatim", "memoire_pic_ko"]
+    print(f"{'étape':<22}" + "".join(f"{c:>18}" for c in colonnes))
+    for nom, mesures in resultats.items():
+        print(f"{nom:<22}" + "".join(f"{mesures[c]:>18}" for c in colonnes))
+
+
+def comparer(resultats, reference, tolerance, reference_locale=None):
+    """
+    Liste des régressions (vide si tout va bien) : appels et tokens face à la référence versionnée,
+    latence et mémoire face à la référence locale si elle est fournie.
+    """
+    regressions = []
+    for nom, ref in reference["etapes"].items():
+        mesures = resultats.get(nom)
+        if mesures is None:
+            continue
+        for cle in ("tokens_prompt", "tokens_reponse"):
+            if mesures[cle] > ref[cle] * (1 + tolerance):
+                regressions.append(f"{nom}.{cle} : {mesures[cle]} > {ref[cle]} (+{int(tolerance * 100)}%)")
+        # Les nombres d'appels sont déterministes : aucune tolérance
+        for cle in ("appels_llm", "appels_embedding", "appels_nominatim"):
+            if mesures[cle] > ref[cle]:
+                regressions.append(f"{nom}.{cle} : {mesures[cle]} > {ref[cle]}")
+    for nom, ref in (reference_locale or {}).get("etapes", {}).items():
+        mesures = resultats.get(nom)
+        if mesures is None:
+            continue
+        for cle in ("p95_s", "memoire_pic_ko"):
+            if mesures[cle] > ref[cle] * (1 + tolerance):
+                regressions.append(f"{nom}.{cle} : {mesures[cle]} > {ref[cle]} (+{int(tolerance * 100)}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout avec LLM et Nominatim factices.")
+    parser.add_argument("--ville", default="Rome")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--etapes", nargs="+", choices=ETAPES, default=ETAPES)
+    parser.add_argument("--latence", type=float, default=0.05, help="latence fixe par appel LLM (s)")
+    parser.add_argument("--latence-token", type=float, default=0.0005, help="latence par token généré (s)")
+    parser.add_argument("--tokens", type=int, default=600, help="tokens générés par réponse du LLM")
+    parser.add_argument("--latence-embedding", type=float, default=0.005)
+    parser.add_argument("--latence-nominatim", type=float, default=0.02)
+    parser.add_argument("--enregistrer", action="store_true", help="enregistre le résultat comme référence")
+    parser.add_argument("--comparer", action="store_true", help="compare à la référence (code 1 si régression)")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--reference", default=REFERENCE, help="référence versionnée des appels et tokens")
+    parser.add_argument("--reference-locale", default=REFERENCE_LOCALE,
+                        help="référence de latence et mémoire propre à la machine (facultative)")
+    parser.add_argument("--sortie", help="fichier JSON où écrire le rapport")
+    args = parser.parse_args()
+
+    # La référence des compteurs est versionnée : son absence est une erreur, détectée avant de mesurer
+    if args.comparer and not os.path.exists(args.reference):
+        print(f"❌ Aucune référence dans {args.reference} : lancez d'abord le benchmark avec --enregistrer "
+              "(ou indiquez un fichier avec --reference).")
+        sys.exit(2)
+
+    rapport = {"parametres": parametres_rapport(args), "etapes": lancer(args)}
+    afficher(rapport["etapes"])
+
+    if args.sortie:
+        ecrire_json(args.sortie, rapport)
+    if args.enregistrer:
+        ecrire_json(args.reference, reference_compteurs(rapport, args))
+        ecrire_json(args.reference_locale, rapport)
+        print(f"Références enregistrées dans {args.reference} (appels, tokens) "
+              f"et {args.reference_locale} (latence, mémoire)")
+    if args.comparer:
+        reference = lire_json(args.reference)
+        if reference["parametres"] != parametres_compteurs(args):
+            print("⚠️  Paramètres différents de la référence des compteurs : comparaison indicative.")
+        reference_locale = None
+        if os.path.exists(args.reference_locale):
+            reference_locale = lire_json(args.reference_locale)
+            if reference_locale["parametres"] != rapport["parametres"]:
+                print("⚠️  Paramètres différents de la référence locale : comparaison indicative.")
+        else:
+            print(f"ℹ️  Pas de référence locale ({args.reference_locale}) : latence et mémoire non comparées.")
+        regressions = comparer(rapport["etapes"], reference, args.tolerance, reference_locale)
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if regressions:
+            sys.exit(1)
+        print("✅ Aucune régression par rapport à la référence.")
+
+
+if __name__ == "__main__":
+    main()
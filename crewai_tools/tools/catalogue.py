@@ -0,0 +1,90 @@
+import os
+import csv
+import glob
+import threading
+
+# Catalogue des destinations : toute destination disposant d'un guide PDF dans le dossier knowledge
+# est proposée ; catalogue.csv complète ses métadonnées (pays, langue, emprise géographique)
+KNOWLEDGE_PATH = "crewai_tools/knowledge"
+CATALOGUE_CSV = os.path.join(KNOWLEDGE_PATH, "catalogue.csv")
+
+LANGUE_PAR_DEFAUT = "fr"
+
+
+class Destination:
+    """Une destination du catalogue. bbox = (sud, ouest, nord, est) ou None si inconnue."""
+
+    def __init__(self, nom, pdf, libelle=None, code_pays=None, langue=LANGUE_PAR_DEFAUT, bbox=None):
+        self.nom = nom
+        self.pdf = pdf
+        self.libelle = libelle or nom.replace("_", " ")
+        self.code_pays = code_pays or None
+        self.langue = langue or LANGUE_PAR_DEFAUT
+        self.bbox = bbox
+
+    def viewbox(self):
+        """Emprise de la destination pour Nominatim (coins nord-ouest et sud-est) : [(nord, ouest), (sud, est)]."""
+        if self.bbox is None:
+            return None
+        sud, ouest, nord, est = self.bbox
+        return [(nord, ouest), (sud, est)]
+
+    def __repr__(self):
+        return f"Destination({self.nom!r}, code_pays={self.code_pays!r}, langue={self.langue!r})"
+
+
+def lire_metadonnees(fichier=CATALOGUE_CSV):
+    metadonnees = {}
+    if not os.path.exists(fichier):
+        return metadonnees
+    with open(fichier, encoding="utf-8", newline="") as f:
+        for ligne in csv.DictReader(f):
+            bbox = None
+            if all(ligne.get(c) for c in ("sud", "ouest", "nord", "est")):
+                bbox = tuple(float(ligne[c]) for c in ("sud", "ouest", "nord", "est"))
+            metadonnees[ligne["nom"]] = {
+                "libelle": ligne.get("libelle"),
+                "code_pays": ligne.get("code_pays"),
+                "langue": ligne.get("langue"),
+                "bbox": bbox,
+            }
+    return metadonnees
+
+
+class Catalogue:
+    """Destinations découvertes à partir des PDF du dossier knowledge, dans l'ordre de catalogue.csv."""
+
+    def __init__(self, dossier=KNOWLEDGE_PATH, fichier=CATALOGUE_CSV):
+        metadonnees = lire_metadonnees(fichier)
+        pdfs = {os.path.splitext(os.path.basename(pdf))[0]: pdf
+                for pdf in sorted(glob.glob(os.path.join(dossier, "*.pdf")))}
+        # Ordre d'affichage : celui des lignes de catalogue.csv, puis les guides ajoutés sans métadonnées
+        ordre = [nom for nom in metadonnees if nom in pdfs] + [nom for nom in pdfs if nom not in metadonnees]
+        self.destinations = {nom: Destination(nom, pdfs[nom], **metadonnees.get(nom, {})) for nom in ordre}
+
+    def noms(self):
+        return list(self.destinations)
+
+    def get(self, nom):
+        return self.destinations.get(nom)
+
+    def code_pays(self, nom):
+        destination = self.get(nom)
+        return destination.code_pays if destination else None
+
+    def libelle(self, nom):
+        destination = self.get(nom)
+        return destination.libelle if destination else nom
+
+
+_catalogue = None
+_catalogue_verrou = threading.Lock()
+
+
+def get_catalogue(recharger=False):
+    """Catalogue partagé ; recharger=True relit le dossier knowledge (nouveau guide ajouté)."""
+    global _catalogue
+    with _catalogue_verrou:
+        if _catalogue is None or recharger:
+            _catalogue = Catalogue()
+        return _catalogue
@@ -0,0 +1,191 @@
+import os
+import re
+import json
+
+from crewai_tools.tools.retrieval import estimer_tokens
+
+# Plafond de tokens en entrée par tâche (description + relais des tâches précédentes).
+# Les quotas TPM de Groq se consomment surtout en entrée : on borne chaque prompt.
+PLAFOND_TOKENS_TACHE = int(os.getenv("PLAFOND_TOKENS_TACHE", 3000))
+# Part du plafond réservée aux extraits du guide (RAG) dans la description d'une tâche
+PLAFOND_TOKENS_RAG = int(os.getenv("PLAFOND_TOKENS_RAG", 800))
+
+# Phrases "pratiques" du guide (prix, horaires, réservations...) : utiles à la rédaction finale,
+# pas à la sélection des lieux. Chaque phrase du RAG n'est envoyée qu'à une seule tâche.
+INDICES_PRATIQUES = re.compile(
+    r"\d+\s?(€|eur|euros?|\$|usd|¥|yens?)|\bprix\b|\btarifs?\b|\bgratuit|\bhoraires?\b|\bouvert|\bfermé|"
+    r"\d{1,2}\s?h\s?\d{0,2}\b|\bréserv|\bbillets?\b|\btickets?\b|\bconseil|\bastuce|\béviter\b|\bpass\b",
+    re.IGNORECASE,
+)
+
+MARQUEUR_COUPE = "[…]"
+
+
+def phrases(texte):
+    return [p.strip() for p in re.split(r"(?<=[.!?])\s+|\n+", texte or "") if p.strip()]
+
+
+def repartir_rag(informations_rag):
+    """
+    Sépare le contexte RAG en deux parts disjointes (sans doublon) :
+    (descriptif -> sélection des lieux, pratique -> conseils de la rédaction finale).
+    """
+    descriptif, pratique, vues = [], [], set()
+    for phrase in phrases(informations_rag):
+        cle = phrase.lower()
+        if cle in vues:
+            continue
+        vues.add(cle)
+        (pratique if INDICES_PRATIQUES.search(phrase) else descriptif).append(phrase)
+    return "\n".join(descriptif), "\n".join(pratique)
+
+
+def nettoyer_markdown(ligne):
+    ligne = re.sub(r"[*_`#>]+", "", ligne)
+    return re.sub(r"\s+", " ", ligne).strip(" -•:|")
+
+
+def lister_lieux(texte):
+    """Lieux d'une liste (puces, numérotée ou noms en gras) : [{"nom", "note"}], texte d'introduction ignoré."""
+    lieux = []
+    for ligne in texte.splitlines():
+        if not re.match(r"\s*([-*•]\s+|\d+[.)]\s+|\*\*)", ligne):
+            # Ligne de suite (description sur plusieurs lignes) : rattachée au lieu précédent
+            suite = nettoyer_markdown(ligne)
+            if lieux and suite:
+                lieux[-1]["note"] = f"{lieux[-1]['note']} {suite}".strip()
+            continue
+        ligne = re.sub(r"^\s*([-*•]|\d+[.)])\s+", "", ligne)
+        match = re.match(r"\*\*(.+?)\*\*\s*[:\-–—]?\s*(.*)", ligne) or re.match(r"([^:\-–—]+?)\s*[:\-–—]\s*(.*)", ligne)
+        nom, description = (match.group(1), match.group(2)) if match else (ligne, "")
+        nom = nettoyer_markdown(nom)
+        if nom:
+            lieux.append({"nom": nom, "note": nettoyer_markdown(description)})
+    return lieux
+
+
+def condenser_lieux(texte):
+    """
+    Liste de lieux -> JSON compact [{"nom", "note"}], sans la mise en forme ni le texte
+    d'introduction. Sans liste reconnue, on compacte le texte.
+    """
+    lieux = lister_lieux(texte)
+    if not lieux:
+        return compacter_texte(texte)
+    # Un lieu par ligne : un éventuel plafonnement coupe entre deux lieux
+    return "[\n" + ",\n".join(json.dumps(l, ensure_ascii=False, separators=(",", ":")) for l in lieux) + "\n]"
+
+
+def compacter_texte(texte):
+    """Supprime la mise en forme Markdown, les lignes vides et décoratives (contenu inchangé)."""
+    lignes = []
+    for ligne in texte.splitlines():
+        if re.fullmatch(r"\s*[-=*_|:\s]*", ligne):
+            continue
+        ligne = nettoyer_markdown(ligne)
+        if ligne:
+            lignes.append(ligne)
+    return "\n".join(lignes)
+
+
+def condenser_tableau(texte):
+    """Tableau Markdown -> une ligne "a; b; c" par rangée (séparateurs et bordures retirés)."""
+    lignes = []
+    for ligne in texte.splitlines():
+        if "|" in ligne:
+            cellules = [nettoyer_markdown(c) for c in ligne.strip().strip("|").split("|")]
+            if any(cellules) and not all(re.fullmatch(r"[-:\s]*", c) for c in cellules):
+                lignes.append("; ".join(cellules))
+        else:
+            ligne = nettoyer_markdown(ligne)
+            if ligne:
+                lignes.append(ligne)
+    return "\n".join(lignes)
+
+
+def plafonner(texte, tokens_max=PLAFOND_TOKENS_RAG):
+    """Coupe le texte à une frontière de ligne pour tenir dans tokens_max (signalé par un marqueur)."""
+    if estimer_tokens(texte) <= tokens_max:
+        return texte
+    retenu, total = [], 0
+    for ligne in texte.splitlines():
+        cout = estimer_tokens(ligne) + 1
+        if total + cout > tokens_max:
+            break
+        retenu.append(ligne)
+        total += cout
+    if not retenu:
+        return texte[:max(tokens_max, 0) * 4] + MARQUEUR_COUPE
+    return "\n".join(retenu) + "\n" + MARQUEUR_COUPE
+
+
+class BudgetContexte:
+    """
+    Gère le contexte transmis d'une tâche crewai à l'autre :
+    - chaque sortie intermédiaire est condensée en un relais compact, directement dans task_output.raw
+      (c'est ce texte que crewai injecte dans le contexte des tâches suivantes) ;
+    - le relais est plafonné pour que chaque destinataire reste sous PLAFOND_TOKENS_TACHE en entrée ;
+    - les tokens de chaque tâche sont mesurés (mesures).
+    """
+
+    def __init__(self, plafond_tache=PLAFOND_TOKENS_TACHE):
+        self.plafond_tache = plafond_tache
+        self.relais = {}    # description de la tâche source -> (nom, condenseur, destinataires)
+        self.entrants = {}  # description du destinataire -> nombre de relais reçus
+        self.entetes = {}   # description de la tâche source -> texte placé en tête de son relais
+        self.mesures = {}
+
+    def relayer(self, tache, nom, condenseur, destinataires):
+        self.relais[tache.description] = (nom, condenseur, destinataires)
+        for destinataire in destinataires:
+            self.entrants[destinataire.description] = self.entrants.get(destinataire.description, 0) + 1
+
+    def entete(self, tache_description, texte):
+        """Texte ajouté en tête du prochain relais de la tâche, compté dans le même plafond que lui."""
+        self.entetes[tache_description] = texte
+
+    def _part(self, destinataire):
+        """Tokens disponibles pour un relais : plafond moins la description, partagé entre relais entrants."""
+        libre = self.plafond_tache - estimer_tokens(destinataire.description)
+        return max(libre // self.entrants[destinataire.description], 100)
+
+    def condenser(self, sortie):
+        """Remplace la sortie d'une tâche relayée par son relais (avant que la tâche suivante ne démarre)."""
+        description = getattr(sortie, "description", None)
+        relais = self.relais.get(description)
+        entete = self.entetes.pop(description, None)
+        if relais is None:
+            if entete:
+                sortie.raw = f"{entete}\n\n{sortie.raw}"
+            return
+        nom, condenseur, destinataires = relais
+        brut = sortie.raw or ""
+        condense = condenseur(brut)
+        if len(condense) > len(brut):
+            # Sortie déjà très courte : le format structuré coûterait plus que le texte compacté
+            condense = compacter_texte(brut)
+        if entete:
+            # Le plafonnement coupe par la fin : l'en-tête passe avant la liste condensée
+            condense = f"{entete}\n\n{condense}"
+        condense = plafonner(condense, min(self._part(d) for d in destinataires))
+        sortie.raw = condense
+        self.mesures.setdefault(nom, {}).update(
+            sortie_tokens=estimer_tokens(brut), relais_tokens=estimer_tokens(condense))
+        print(f"📉 Relais {nom} : {estimer_tokens(brut)} -> {estimer_tokens(condense)} tokens")
+
+    def apres(self, callback=None):
+        """task_callback crewai : callback voit la sortie complète (affichage), puis elle est condensée."""
+
+        def task_callback(sortie):
+            if callback:
+                callback(sortie)
+            self.condenser(sortie)
+
+        return task_callback
+
+    def mesurer(self, taches):
+        """Tokens de description par tâche ({nom: Task}), à appeler une fois les relais déclarés."""
+        for nom, tache in taches.items():
+            self.mesures.setdefault(nom, {})["description_tokens"] = estimer_tokens(tache.description)
+        print("📏 Tokens par tâche : " + ", ".join(
+            f"{nom}={mesure['description_tokens']}" for nom, mesure in self.mesures.items()))
@@ -1,32 +1,93 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter
+import threading
 from langchain_chroma import Chroma
 from langchain_ollama import OllamaEmbeddings
+from crewai_tools.tools.embeddings_cache import EmbeddingsEnCache
+
+BASE_CHROMA_PATH = os.getenv("CHROMA_PATH", "chroma_db_storage")
+KNOWLEDGE_PATH = "crewai_tools/knowledge"
+
+# Paramètres d'indexation : toute modification déclenche une reconstruction complète (cf. manifest)
+EMBEDDING_MODEL = "nomic-embed-text"
+CHUNK_SIZE = 400
+CHUNK_OVERLAP = 50
+
+# Une seule collection Chroma partagée par toutes les destinations : chaque chunk porte une
+# métadonnée "destination" et les recherches filtrent dessus. Ouvrir une destination de plus
+# ne coûte donc ni client ni dossier supplémentaire.
+CHEMIN_COLLECTION = os.path.join(BASE_CHROMA_PATH, "_partage")
+COLLECTION = "destinations"
+
+_embeddings = None
+_collection = None
+_pretes = set()  # destinations dont l'index a été vérifié dans ce processus
+_registre_verrou = threading.RLock()
+
+
+def chemin_pdf(nom_destination):
+    return f"{KNOWLEDGE_PATH}/{nom_destination}.pdf"
+
+
+def chemin_index(nom_destination):
+    """Dossier des fichiers propres à une destination (manifest, index BM25, progression)."""
+    return os.path.join(BASE_CHROMA_PATH, nom_destination)
+
+
+def filtre_destination(nom_destination, **autres):
+    """Filtre Chroma sur la destination, éventuellement combiné à d'autres métadonnées (ex: page=3)."""
+    conditions = [{"destination": nom_destination}] + [{cle: valeur} for cle, valeur in autres.items()]
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def get_embeddings():
+    """Client d'embedding partagé par toutes les destinations, derrière le cache d'embeddings."""
+    global _embeddings
+    with _registre_verrou:
+        if _embeddings is None:
+            _embeddings = EmbeddingsEnCache(OllamaEmbeddings(model=EMBEDDING_MODEL), EMBEDDING_MODEL)
+        return _embeddings
+
+
+def get_collection():
+    """La collection partagée, ouverte une seule fois par processus (indexation et service)."""
+    global _collection
+    with _registre_verrou:
+        if _collection is None:
+            _collection = Chroma(
+                collection_name=COLLECTION,
+                persist_directory=CHEMIN_COLLECTION,
+                embedding_function=get_embeddings(),
+            )
+        return _collection
+
+
+def invalider_vectorstore(nom_destination=None):
+    """Force une nouvelle vérification de l'index (toutes les destinations si None), ex: après une reconstruction."""
+    with _registre_verrou:
+        if nom_destination is None:
+            _pretes.clear()
+        else:
+            _pretes.discard(nom_destination)
 
-BASE_CHROMA_PATH = "chroma_db_storage"
 
 def get_vectorstore(nom_destination):
-    embeddings = OllamaEmbeddings(model="nomic-embed-text")
-    
-    persist_directory = os.path.join(BASE_CHROMA_PATH, nom_destination)
-    pdf_path = f"crewai_tools/knowledge/{nom_destination}.pdf"
-    
-    if os.path.exists(persist_directory):
-        return Chroma(persist_directory=persist_directory, embedding_function=embeddings)
-    
-    if not os.path.exists(pdf_path):
-        raise FileNotFoundError(f"Le guide PDF pour {nom_destination} est introuvable à l'endroit : {pdf_path}")
-
-    print(f"Création de la base de données pour {nom_destination}...")
-    loader = PyPDFLoader(pdf_path)
-    docs = loader.load()
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=50)
-    splits = text_splitter.split_documents(docs)
-    
-    vectorstore = Chroma.from_documents(
-        documents=splits, 
-        embedding=embeddings, 
-        persist_directory=persist_directory
-    )
-    return vectorstore
\ No newline at end of file
+    """
+    Renvoie la collection partagée, après s'être assuré que la destination y est indexée.
+    Les index sont normalement construits à l'avance (python -m crewai_tools.tools.indexation,
+    ou tâche de fond au démarrage de l'app) ; à défaut, on le construit ici une fois.
+    Les recherches doivent filtrer avec filtre_destination(nom_destination).
+    """
+    with _registre_verrou:
+        if nom_destination in _pretes:
+            return get_collection()
+
+    from crewai_tools.tools.indexation import index_pret, construire_index
+
+    if not index_pret(nom_destination):
+        if not os.path.exists(chemin_pdf(nom_destination)):
+            raise FileNotFoundError(f"Le guide PDF pour {nom_destination} est introuvable à l'endroit : {chemin_pdf(nom_destination)}")
+        construire_index(nom_destination)
+
+    with _registre_verrou:
+        _pretes.add(nom_destination)
+    return get_collection()
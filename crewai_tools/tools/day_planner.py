@@ -0,0 +1,139 @@
+import os
+
+from crewai_tools.tools.catalogue import get_catalogue
+from crewai_tools.tools.context_budget import lister_lieux
+from crewai_tools.tools.geocodage_async import get_service_geocodage
+from crewai_tools.tools.geometry import matrice_distances, longueur_parcours, optimiser_parcours
+from crewai_tools.tools.place_extractor import extraire_noms_lieux, MAX_LIEUX
+from crewai_tools.tools.tracing import span
+
+# PLANIFICATION_JOURNEES=0 : le Concepteur d'Itinéraire regroupe et ordonne seul les lieux (prompt uniquement)
+PLANIFICATION_ACTIVE = os.getenv("PLANIFICATION_JOURNEES", "1") == "1"
+# Attente maximale du géocodage (s) : la crew est suspendue pendant la planification. Les lieux encore
+# en file (Nominatim public : 1 requête/s) sont "non localisés" et leur résultat alimente le cache
+DELAI_PLANIFICATION = float(os.getenv("PLANIFICATION_DELAI", 5))
+
+# Lieux par jour selon le rythme choisi dans l'interface (premier mot du libellé)
+CAPACITE_PAR_RYTHME = {"détendu": 2, "équilibré": 3, "intense": 5}
+CAPACITE_PAR_DEFAUT = 3
+
+
+def capacite_rythme(rythme):
+    mot = (rythme or "").split(" ")[0].lower()
+    return CAPACITE_PAR_RYTHME.get(mot, CAPACITE_PAR_DEFAUT)
+
+
+def planifier_journees(texte_lieux, ville, duree, rythme, delai_max=DELAI_PLANIFICATION):
+    """
+    Squelette déterministe du séjour à partir de la liste de lieux du Spécialiste de Destination :
+    géocodage (gazetteer, cache, puis backend, au plus delai_max secondes), regroupement par jour
+    (k-moyennes, capacité fixée par le rythme) et ordre de visite de chaque journée.
+    Renvoie {"jours": [[{"nom", "lat", "lon"}, ...], ...], "distances_km", "non_localises", "ecartes"}
+    ou None si aucun lieu n'est localisé.
+    """
+    noms = [lieu["nom"] for lieu in lister_lieux(texte_lieux)] or extraire_noms_lieux(texte_lieux, ville)
+    noms = list(dict.fromkeys(noms))[:MAX_LIEUX]
+    if not noms:
+        return None
+
+    destination = get_catalogue().get(ville)
+    coords = get_service_geocodage().geocoder(
+        noms, ville, destination.code_pays if destination else None, destination.viewbox() if destination else None,
+        delai_max=delai_max,
+    )
+    localises = [{"nom": nom, "lat": c[0], "lon": c[1]} for nom, c in zip(noms, coords) if c]
+    non_localises = [nom for nom, c in zip(noms, coords) if not c]
+    if not localises:
+        return None
+
+    # Au-delà de la capacité du séjour, on garde les lieux dans l'ordre de la sélection
+    capacite = capacite_rythme(rythme)
+    places = max(duree, 1) * capacite
+    localises, ecartes = localises[:places], [lieu["nom"] for lieu in localises[places:]]
+
+    parcours = optimiser_parcours([(l["lat"], l["lon"]) for l in localises], nb_jours=duree, capacite=capacite)
+    jours, precedent = [], None
+    for indice, jour in zip(parcours["ordre"], parcours["jours"]):
+        if jour != precedent:
+            jours.append([])
+            precedent = jour
+        jours[-1].append(localises[indice])
+    distances = [
+        round(longueur_parcours(matrice_distances([(l["lat"], l["lon"]) for l in jour]), range(len(jour))), 1)
+        for jour in jours
+    ]
+    return {"jours": jours, "distances_km": distances, "non_localises": non_localises, "ecartes": ecartes}
+
+
+def squelette_en_texte(plan, duree):
+    """Squelette transmis au Concepteur d'Itinéraire : une ligne par jour, lieux dans l'ordre de visite."""
+    lignes = ["SQUELETTE IMPOSÉ (jours et ordre de visite calculés sur les coordonnées, ne pas réordonner) :"]
+    for numero in range(duree):
+        if numero < len(plan["jours"]):
+            etapes = " -> ".join(lieu["nom"] for lieu in plan["jours"][numero])
+            lignes.append(f"Jour {numero + 1} : {etapes} ({plan['distances_km'][numero]} km)")
+        else:
+            lignes.append(f"Jour {numero + 1} : libre (aucun lieu)")
+    if plan["non_localises"]:
+        lignes.append("Non localisés (à placer au mieux) : " + ", ".join(plan["non_localises"]))
+    if plan["ecartes"]:
+        lignes.append("Écartés (rythme) : " + ", ".join(plan["ecartes"]))
+    return "\n".join(lignes)
+
+
+class PlanificateurJournees:
+    """
+    Étape de planification entre la sélection des lieux (t1) et le Concepteur d'Itinéraire :
+    le squelette est placé en tête de la sortie de t1, c'est-à-dire du contexte que reçoit le designer.
+    Si t1 est relayée par un BudgetContexte, le squelette est compté dans le plafond de son relais.
+    """
+
+    def __init__(self, ville, duree, rythme, actif=PLANIFICATION_ACTIVE):
+        self.ville = ville
+        self.duree = duree
+        self.rythme = rythme
+        self.actif = actif
+        self.description = None
+        self.budget = None
+        self.plan = None
+
+    def suivre(self, tache, budget=None):
+        """Tâche dont la sortie (liste de lieux) est planifiée, et BudgetContexte qui relaie cette sortie."""
+        self.description = tache.description
+        self.budget = budget
+
+    def planifier(self, texte):
+        with span("planification", ville=self.ville, duree=self.duree) as span_planification:
+            try:
+                self.plan = planifier_journees(texte, self.ville, self.duree, self.rythme)
+            except Exception as e:
+                # Sans squelette, le designer planifie seul comme auparavant
+                print(f"⚠️ Planification des journées impossible : {e}")
+                self.plan = None
+            span_planification.ajouter(planifie=self.plan is not None)
+        if self.plan is None:
+            return None
+        squelette = squelette_en_texte(self.plan, self.duree)
+        print(f"🗺️ {squelette}")
+        return squelette
+
+    def apres(self, callback=None):
+        """
+        task_callback crewai : planifie à partir de la sortie complète de la tâche suivie, puis appelle
+        callback (affichage, condensation du relais...). Le squelette est placé en tête du relais par
+        le BudgetContexte suivi (plafond compris), sinon en tête de la sortie une fois callback passé.
+        """
+
+        def task_callback(sortie):
+            squelette = None
+            if self.actif and self.description and getattr(sortie, "description", None) == self.description:
+                squelette = self.planifier(sortie.raw or "")
+            if squelette and self.budget is not None:
+                self.budget.entete(self.description, squelette)
+                squelette = None
+            if callback:
+                callback(sortie)
+            if squelette:
+                sortie.raw = f"{squelette}\n\n{sortie.raw}"
+
+        return task_callback
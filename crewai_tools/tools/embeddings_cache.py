@@ -0,0 +1,154 @@
+import os
+import time
+import array
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+EMBEDDINGS_CACHE_PATH = os.getenv("EMBEDDINGS_CACHE_PATH", "embeddings_cache.sqlite")
+
+MAX_MEMOIRE = int(os.getenv("CACHE_EMBEDDINGS_MAX_MEMOIRE", 5000))
+MAX_DISQUE = int(os.getenv("CACHE_EMBEDDINGS_MAX_DISQUE", 100000))
+
+# Délai pendant lequel les requêtes concurrentes sont regroupées en un seul appel embed_documents
+FENETRE_LOT = float(os.getenv("CACHE_EMBEDDINGS_FENETRE_LOT", 0.01))
+
+
+class EmbeddingsEnCache(Embeddings):
+    """
+    Enveloppe d'un modèle d'embedding (ex: OllamaEmbeddings) :
+    - cache clé (modèle, hash du texte) en mémoire (LRU) puis sur disque (SQLite, LRU borné) ;
+    - les embed_query concurrents non cachés partent ensemble dans un seul embed_documents.
+    """
+
+    def __init__(self, base, modele, chemin=EMBEDDINGS_CACHE_PATH,
+                 max_memoire=MAX_MEMOIRE, max_disque=MAX_DISQUE, fenetre_lot=FENETRE_LOT):
+        self.base = base
+        self.modele = modele
+        self.max_memoire = max_memoire
+        self.max_disque = max_disque
+        self.fenetre_lot = fenetre_lot
+
+        self.memoire = OrderedDict()
+        self.verrou = threading.Lock()
+        self.connexion = sqlite3.connect(chemin, check_same_thread=False)
+        self.connexion.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                cle TEXT PRIMARY KEY,
+                vecteur BLOB NOT NULL,
+                dernier_acces REAL NOT NULL
+            )"""
+        )
+        self.connexion.commit()
+
+        self.verrou_lot = threading.Lock()
+        self.en_attente = []  # (texte, Future)
+        self.lot_en_cours = False
+
+        self.hits = 0
+        self.misses = 0
+        self.appels_modele = 0
+
+    def _cle(self, texte):
+        return f"{self.modele}:{hashlib.sha256(texte.encode('utf-8')).hexdigest()}"
+
+    # --- Cache ---
+
+    def _lire(self, cle):
+        with self.verrou:
+            if cle in self.memoire:
+                self.memoire.move_to_end(cle)
+                self.hits += 1
+                return self.memoire[cle]
+            ligne = self.connexion.execute("SELECT vecteur FROM embeddings WHERE cle = ?", (cle,)).fetchone()
+            if ligne is None:
+                self.misses += 1
+                return None
+            self.connexion.execute("UPDATE embeddings SET dernier_acces = ? WHERE cle = ?", (time.time(), cle))
+            self.connexion.commit()
+            vecteur = array.array("f", ligne[0]).tolist()
+            self._memoriser(cle, vecteur)
+            self.hits += 1
+            return vecteur
+
+    def _memoriser(self, cle, vecteur):
+        self.memoire[cle] = vecteur
+        self.memoire.move_to_end(cle)
+        while len(self.memoire) > self.max_memoire:
+            self.memoire.popitem(last=False)
+
+    def _ecrire(self, paires):
+        maintenant = time.time()
+        with self.verrou:
+            for cle, vecteur in paires:
+                self._memoriser(cle, vecteur)
+            self.connexion.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(cle, array.array("f", vecteur).tobytes(), maintenant) for cle, vecteur in paires],
+            )
+            nb = self.connexion.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if nb > self.max_disque:
+                self.connexion.execute(
+                    "DELETE FROM embeddings WHERE cle IN "
+                    "(SELECT cle FROM embeddings ORDER BY dernier_acces ASC LIMIT ?)",
+                    (nb - self.max_disque,),
+                )
+            self.connexion.commit()
+
+    def _calculer(self, textes):
+        """Un seul appel au modèle pour tous les textes distincts, puis mise en cache."""
+        uniques = list(dict.fromkeys(textes))
+        self.appels_modele += 1
+        vecteurs = self.base.embed_documents(uniques)
+        self._ecrire([(self._cle(t), v) for t, v in zip(uniques, vecteurs)])
+        return dict(zip(uniques, vecteurs))
+
+    # --- Interface Embeddings ---
+
+    def embed_documents(self, texts):
+        resultats = {}
+        manquants = []
+        for texte in texts:
+            vecteur = self._lire(self._cle(texte))
+            if vecteur is None:
+                manquants.append(texte)
+            else:
+                resultats[texte] = vecteur
+        if manquants:
+            resultats.update(self._calculer(manquants))
+        return [resultats[texte] for texte in texts]
+
+    def embed_query(self, text):
+        vecteur = self._lire(self._cle(text))
+        if vecteur is not None:
+            return vecteur
+
+        # Regroupement : le premier thread arrivé attend la fenêtre puis calcule pour tout le lot
+        futur = Future()
+        with self.verrou_lot:
+            self.en_attente.append((text, futur))
+            meneur = not self.lot_en_cours
+            self.lot_en_cours = True
+
+        if meneur:
+            time.sleep(self.fenetre_lot)
+            with self.verrou_lot:
+                lot, self.en_attente = self.en_attente, []
+                self.lot_en_cours = False
+            try:
+                vecteurs = self._calculer([texte for texte, _ in lot])
+                for texte, f in lot:
+                    f.set_result(vecteurs[texte])
+            except Exception as e:
+                for _, f in lot:
+                    f.set_exception(e)
+
+        return futur.result()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "appels_modele": self.appels_modele,
+                "en_memoire": len(self.memoire)}
@@ -0,0 +1,163 @@
+import os
+import csv
+import glob
+import bisect
+import threading
+from collections import defaultdict
+
+from crewai_tools.tools.geocache import normaliser_requete
+
+# Index local : un CSV fourni avec le projet + tout fichier gazetteer_*.csv ajouté
+# dans le dossier knowledge (ex: export OSM), colonnes destination,nom,alias,lat,lon,type
+KNOWLEDGE_PATH = "crewai_tools/knowledge"
+GAZETTEER_CSV = os.path.join(KNOWLEDGE_PATH, "gazetteer.csv")
+
+# Similarité minimale (coefficient de Dice sur les trigrammes) pour une correspondance floue
+SEUIL_FLOU = 0.55
+
+# Correspondances approchées : une requête ou un préfixe trop court ou fait uniquement de mots
+# génériques ("Saint", "Villa", "Basilique Saint"...) désignerait un lieu au hasard
+LONGUEUR_MIN_PREFIXE = 4
+MOTS_GENERIQUES = {
+    "saint", "sainte", "san", "santa", "santo", "st", "ste", "villa", "piazza", "place", "plaza", "square",
+    "palais", "palazzo", "palace", "musee", "museo", "museum", "eglise", "chiesa", "church", "basilique",
+    "basilica", "cathedrale", "duomo", "parc", "park", "jardin", "jardins", "garden", "gardens", "tour", "tower",
+    "pont", "ponte", "bridge", "fontaine", "fontana", "porte", "porta", "via", "rue", "street", "avenue",
+    "mont", "monte", "chateau", "castello", "castel", "temple", "sanctuaire", "shrine", "marche", "mercato",
+    "market", "quartier", "le", "la", "les", "l", "de", "du", "des", "d", "et", "the", "of", "and",
+    "di", "del", "della", "dei", "degli",
+}
+
+
+def trigrammes(texte):
+    texte = f"  {texte} "
+    return {texte[i:i + 3] for i in range(len(texte) - 2)}
+
+
+def generique(cle):
+    return all(mot in MOTS_GENERIQUES for mot in cle.split(" "))
+
+
+def prefixe_significatif(cle):
+    """Un préfixe n'est retenu que s'il contient un mot non générique et n'est pas un simple fragment."""
+    return not generique(cle) and (" " in cle or len(cle) >= LONGUEUR_MIN_PREFIXE)
+
+
+class IndexDestination:
+    """Index des noms d'une destination : exact (dict), préfixe (liste triée) et flou (trigrammes)."""
+
+    def __init__(self, destination):
+        self.destination = destination
+        self.lieux = []        # (nom canonique, lat, lon, type)
+        self.exact = {}        # clé normalisée -> indice du lieu
+        self.cles_triees = []  # clés normalisées triées, pour la recherche par préfixe
+        self.trigrammes = defaultdict(set)  # trigramme -> clés qui le contiennent
+        self.nb_trigrammes = {}             # clé -> nombre de trigrammes distincts
+
+    def ajouter(self, nom, alias, lat, lon, type_lieu):
+        indice = len(self.lieux)
+        self.lieux.append((nom, lat, lon, type_lieu))
+        for variante in [nom] + alias:
+            cle = normaliser_requete(variante, self.destination)
+            if cle and cle not in self.exact:
+                self.exact[cle] = indice
+                bisect.insort(self.cles_triees, cle)
+                tris = trigrammes(cle)
+                self.nb_trigrammes[cle] = len(tris)
+                for tri in tris:
+                    self.trigrammes[tri].add(cle)
+
+    def _resultat(self, cle, methode, nom_recherche):
+        indice = self.exact[cle]
+        nom, lat, lon, type_lieu = self.lieux[indice]
+        return {"name": nom_recherche, "nom_canonique": nom, "lat": lat, "lon": lon,
+                "type": type_lieu, "methode": methode, "indice": indice}
+
+    def chercher(self, nom, ville=None):
+        cle = normaliser_requete(nom, ville or self.destination)
+        if not cle:
+            return None
+
+        # 1. Correspondance exacte (nom ou alias)
+        if cle in self.exact:
+            return self._resultat(cle, "exact", nom)
+        # Requête faite uniquement de mots génériques : ni préfixe ni flou
+        if generique(cle):
+            return None
+
+        # 2. Préfixe : "Colisée et Forum" commence par une clé connue, ou "Fushimi" débute une clé
+        candidats = list(self._cles_prefixes_de(cle))
+        if candidats:
+            return self._resultat(max(candidats, key=len), "prefixe", nom)
+        position = bisect.bisect_left(self.cles_triees, cle)
+        if (position < len(self.cles_triees) and self.cles_triees[position].startswith(cle + " ")
+                and prefixe_significatif(cle)):
+            return self._resultat(self.cles_triees[position], "prefixe", nom)
+
+        # 3. Flou : coefficient de Dice sur les trigrammes
+        tris = trigrammes(cle)
+        scores = defaultdict(int)
+        for tri in tris:
+            for candidat in self.trigrammes.get(tri, ()):
+                scores[candidat] += 1
+        meilleur, score = None, 0.0
+        for candidat, communs in scores.items():
+            dice = 2 * communs / (len(tris) + self.nb_trigrammes[candidat])
+            if dice > score:
+                meilleur, score = candidat, dice
+        if meilleur and score >= SEUIL_FLOU:
+            return self._resultat(meilleur, "flou", nom)
+        return None
+
+    def _cles_prefixes_de(self, cle):
+        """Clés connues qui sont un préfixe (au mot près) de la requête."""
+        mots = cle.split(" ")
+        for i in range(len(mots) - 1, 0, -1):
+            prefixe = " ".join(mots[:i])
+            if prefixe in self.exact and prefixe_significatif(prefixe):
+                yield prefixe
+
+
+class Gazetteer:
+    """Géocodage hors ligne des lieux connus de chaque destination."""
+
+    def __init__(self, fichiers=None):
+        self.index = {}
+        fichiers = fichiers or [GAZETTEER_CSV] + sorted(
+            glob.glob(os.path.join(KNOWLEDGE_PATH, "gazetteer_*.csv"))
+        )
+        for fichier in fichiers:
+            if os.path.exists(fichier):
+                self.charger_csv(fichier)
+
+    def charger_csv(self, fichier):
+        with open(fichier, encoding="utf-8", newline="") as f:
+            for ligne in csv.DictReader(f):
+                destination = ligne["destination"]
+                if destination not in self.index:
+                    self.index[destination] = IndexDestination(destination)
+                alias = [a.strip() for a in (ligne.get("alias") or "").split("|") if a.strip()]
+                self.index[destination].ajouter(
+                    ligne["nom"], alias, float(ligne["lat"]), float(ligne["lon"]), ligne.get("type", "")
+                )
+
+    def chercher(self, nom, destination):
+        """Point {name, lat, lon, ...} du lieu s'il est connu localement, sinon None."""
+        index = self.index.get(destination)
+        return index.chercher(nom) if index else None
+
+    def lieux(self, destination):
+        index = self.index.get(destination)
+        return [lieu[0] for lieu in index.lieux] if index else []
+
+
+_gazetteer = None
+_gazetteer_verrou = threading.Lock()
+
+
+def get_gazetteer():
+    global _gazetteer
+    with _gazetteer_verrou:
+        if _gazetteer is None:
+            _gazetteer = Gazetteer()
+        return _gazetteer
@@ -0,0 +1,169 @@
+import os
+import re
+import sys
+import time
+import sqlite3
+import threading
+import unicodedata
+
+GEOCACHE_PATH = os.getenv("GEOCACHE_PATH", "geocache.sqlite")
+
+# Un lieu introuvable est re-tenté après 7 jours (Nominatim évolue)
+TTL_NEGATIF = 7 * 24 * 3600
+
+# Préchauffage : noms propres cités au moins PRECHAUFFAGE_OCCURRENCES fois dans le guide PDF,
+# les PRECHAUFFAGE_MAX_LIEUX plus cités (au-delà, Nominatim public coûte 1 s par lieu)
+PRECHAUFFAGE_OCCURRENCES = 2
+PRECHAUFFAGE_MAX_LIEUX = int(os.getenv("PRECHAUFFAGE_MAX_LIEUX", 40))
+
+
+def sans_accents(texte):
+    return unicodedata.normalize("NFKD", texte).encode("ascii", "ignore").decode("ascii")
+
+
+def normaliser_requete(nom, ville=None):
+    """
+    Clé de cache d'un nom de lieu : minuscules, sans accents ni parenthèses,
+    ponctuation écrasée et suffixe de ville retiré.
+    Ex: "Colisée (Colosseo), Rome" -> "colisee"
+    """
+    texte = re.sub(r"\(.*?\)", " ", nom)
+    texte = sans_accents(texte).lower()
+    texte = re.sub(r"[^a-z0-9]+", " ", texte).strip()
+    if ville:
+        suffixe = re.sub(r"[^a-z0-9]+", " ", sans_accents(ville).lower()).strip()
+        if texte.endswith(" " + suffixe):
+            texte = texte[: -len(suffixe)].strip()
+    return texte
+
+
+class CacheGeocodage:
+    """
+    Cache disque (SQLite) des résultats de géocodage, doublé d'un dictionnaire en mémoire :
+    une lecture en cache ne touche ni le réseau ni le disque.
+    """
+
+    def __init__(self, chemin=GEOCACHE_PATH, ttl_negatif=TTL_NEGATIF):
+        self.ttl_negatif = ttl_negatif
+        self.verrou = threading.Lock()
+        self.connexion = sqlite3.connect(chemin, check_same_thread=False)
+        self.connexion.execute(
+            """CREATE TABLE IF NOT EXISTS geocache (
+                cle TEXT NOT NULL,
+                code_pays TEXT NOT NULL,
+                requete TEXT,
+                lat REAL,
+                lon REAL,
+                date REAL NOT NULL,
+                PRIMARY KEY (cle, code_pays)
+            )"""
+        )
+        self.connexion.commit()
+        self.memoire = {
+            (cle, code_pays): (lat, lon, date)
+            for cle, code_pays, lat, lon, date in self.connexion.execute(
+                "SELECT cle, code_pays, lat, lon, date FROM geocache"
+            )
+        }
+        self.hits = 0
+        self.misses = 0
+        self.negatifs = 0
+
+    def lire(self, nom, ville=None, code_pays=None):
+        """Renvoie (en_cache, coordonnées) ; coordonnées = None pour un résultat négatif encore valide."""
+        entree = self.memoire.get((normaliser_requete(nom, ville), code_pays or ""))
+        if entree is not None:
+            lat, lon, date = entree
+            if lat is not None:
+                self.hits += 1
+                return True, (lat, lon)
+            if time.time() - date < self.ttl_negatif:
+                self.hits += 1
+                self.negatifs += 1
+                return True, None
+        self.misses += 1
+        return False, None
+
+    def ecrire(self, nom, ville=None, code_pays=None, coords=None):
+        """Enregistre un résultat ; coords=None mémorise un échec (soumis au TTL)."""
+        cle = (normaliser_requete(nom, ville), code_pays or "")
+        lat, lon = coords if coords else (None, None)
+        date = time.time()
+        with self.verrou:
+            self.memoire[cle] = (lat, lon, date)
+            self.connexion.execute(
+                "INSERT OR REPLACE INTO geocache VALUES (?, ?, ?, ?, ?, ?)",
+                (cle[0], cle[1], nom, lat, lon, date),
+            )
+            self.connexion.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entrees": len(self.memoire),
+            "hits": self.hits,
+            "misses": self.misses,
+            "negatifs": self.negatifs,
+            "taux_hit": round(self.hits / total * 100, 1) if total else 0.0,
+        }
+
+
+_geocache = None
+_geocache_verrou = threading.Lock()
+
+
+def get_geocache():
+    global _geocache
+    with _geocache_verrou:
+        if _geocache is None:
+            _geocache = CacheGeocodage()
+        return _geocache
+
+
+def texte_guide(destination):
+    """Texte du guide PDF d'une destination du catalogue."""
+    from pypdf import PdfReader
+
+    return "\n".join(page.extract_text() or "" for page in PdfReader(destination.pdf).pages)
+
+
+def lieux_a_prechauffer(destination):
+    """Lieux cités dans le guide de la destination que le gazetteer ne résout pas (seuls ceux-là passent par le cache)."""
+    from crewai_tools.tools.gazetteer import get_gazetteer
+    from crewai_tools.tools.place_extractor import noms_cites
+
+    gazetteer = get_gazetteer()
+    lieux = []
+    for nom in noms_cites(texte_guide(destination), destination.nom, PRECHAUFFAGE_OCCURRENCES):
+        if gazetteer.chercher(nom, destination.nom) is None:
+            lieux.append(nom)
+            if len(lieux) >= PRECHAUFFAGE_MAX_LIEUX:
+                break
+    return lieux
+
+
+def prechauffer(destinations=None):
+    """Géocode à l'avance les lieux cités dans le guide PDF de chaque destination et inconnus du gazetteer."""
+    from crewai_tools.tools.catalogue import get_catalogue
+    from crewai_tools.tools.geocodage_async import get_service_geocodage
+
+    catalogue = get_catalogue()
+    destinations = destinations or catalogue.noms()
+
+    service = get_service_geocodage()
+    for nom_destination in destinations:
+        destination = catalogue.get(nom_destination)
+        if destination is None:
+            print(f"❌ {nom_destination} : aucun guide PDF dans le catalogue")
+            continue
+        lieux = lieux_a_prechauffer(destination)
+        print(f"Préchauffage de {nom_destination} ({len(lieux)} lieux hors gazetteer)...")
+        coordonnees = service.geocoder(lieux, nom_destination, destination.code_pays, destination.viewbox())
+        for nom, coords in zip(lieux, coordonnees):
+            print(f"{'✅' if coords else '❌'} {nom}")
+    print(f"Statistiques du cache : {get_geocache().stats()}")
+
+
+if __name__ == "__main__":
+    # python -m crewai_tools.tools.geocache [Rome New_York ...]
+    prechauffer(sys.argv[1:])
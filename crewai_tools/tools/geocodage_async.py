@@ -0,0 +1,217 @@
+import os
+import re
+import time
+import asyncio
+import threading
+
+import httpx
+
+from crewai_tools.tools.geocache import get_geocache, normaliser_requete
+from crewai_tools.tools.gazetteer import get_gazetteer
+from crewai_tools.tools.tracing import contexte_actif, enregistrer_span
+
+# Backend distant : "nominatim" (public ou instance auto-hébergée), "local" (serveur compatible
+# sans limite de débit) ou "hors_ligne" (gazetteer et cache uniquement, aucune requête)
+GEOCODAGE_BACKEND = os.getenv("GEOCODAGE_BACKEND", "nominatim")
+
+# GEOCODAGE_HORS_LIGNE=1 : uniquement le gazetteer local et le cache, jamais Nominatim
+HORS_LIGNE = os.getenv("GEOCODAGE_HORS_LIGNE", "0") == "1" or GEOCODAGE_BACKEND == "hors_ligne"
+
+# Serveur Nominatim (surchargeable pour une instance locale ou le faux serveur des benchmarks).
+# Politique d'usage du serveur public : 1 requête/s, une seule connexion, User-Agent identifiant l'application.
+NOMINATIM_DOMAINE = os.getenv("NOMINATIM_DOMAINE", "nominatim.openstreetmap.org")
+NOMINATIM_SCHEME = os.getenv("NOMINATIM_SCHEME", "https")
+NOMINATIM_DELAI = float(os.getenv("NOMINATIM_DELAI", 1))
+NOMINATIM_CONCURRENCE = int(os.getenv("NOMINATIM_CONCURRENCE", 1))
+NOMINATIM_TIMEOUT = float(os.getenv("NOMINATIM_TIMEOUT", 10))
+USER_AGENT = "my_travel_planner_app_v1"
+
+# Serveur local compatible Nominatim (ex: conteneur mediagis/nominatim), sans limite de débit
+GEOCODAGE_LOCAL_URL = os.getenv("GEOCODAGE_LOCAL_URL", "http://localhost:8080")
+GEOCODAGE_LOCAL_CONCURRENCE = int(os.getenv("GEOCODAGE_LOCAL_CONCURRENCE", 8))
+
+# Nouvelles tentatives sur 429 / 503 (le serveur demande de ralentir)
+TENTATIVES = 3
+
+
+class LimiteurDebit:
+    """
+    Limite un backend : intervalle minimal entre deux départs de requêtes et nombre de requêtes
+    simultanées. Les créneaux sont réservés à l'avance (pas de sleep fixe après chaque requête).
+    Utilisé uniquement depuis la boucle du service : pas de verrou nécessaire.
+    """
+
+    def __init__(self, intervalle, concurrence):
+        self.intervalle = intervalle
+        self.concurrence = concurrence
+        self.prochain_depart = 0.0
+        self.semaphore = None
+
+    async def __aenter__(self):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrence)
+        await self.semaphore.acquire()
+        maintenant = time.monotonic()
+        depart = max(maintenant, self.prochain_depart)
+        self.prochain_depart = depart + self.intervalle
+        if depart > maintenant:
+            await asyncio.sleep(depart - maintenant)
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+
+class BackendNominatim:
+    """API /search de Nominatim (serveur public, instance auto-hébergée ou serveur local compatible)."""
+
+    def __init__(self, url_base, intervalle=NOMINATIM_DELAI, concurrence=NOMINATIM_CONCURRENCE,
+                 timeout=NOMINATIM_TIMEOUT, nom="nominatim"):
+        self.nom = nom
+        self.url_base = url_base.rstrip("/")
+        self.limiteur = LimiteurDebit(intervalle, concurrence)
+        self.timeout = timeout
+        self.client = None
+
+    def _client(self):
+        # Session HTTP persistante (connexions réutilisées), créée dans la boucle du service
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.url_base, timeout=self.timeout, headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=self.limiteur.concurrence),
+            )
+        return self.client
+
+    async def chercher(self, requete, code_iso=None, viewbox=None):
+        """(lat, lon) ou None si introuvable ; lève une exception en cas d'erreur réseau ou HTTP."""
+        params = {"q": requete, "format": "json", "limit": 1}
+        if code_iso:
+            params["countrycodes"] = code_iso
+        if viewbox:
+            (nord, ouest), (sud, est) = viewbox
+            params["viewbox"] = f"{ouest},{nord},{est},{sud}"
+        for tentative in range(TENTATIVES):
+            async with self.limiteur:
+                reponse = await self._client().get("/search", params=params)
+            if reponse.status_code in (429, 503) and tentative < TENTATIVES - 1:
+                attente = float(reponse.headers.get("Retry-After") or 2 ** tentative)
+                print(f"⏳ {self.nom} demande de ralentir : nouvelle tentative dans {attente}s")
+                await asyncio.sleep(attente)
+                continue
+            reponse.raise_for_status()
+            resultats = reponse.json()
+            return (float(resultats[0]["lat"]), float(resultats[0]["lon"])) if resultats else None
+
+    async def fermer(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+
+def creer_backend(nom=GEOCODAGE_BACKEND):
+    """Backend distant du service, ou None en hors ligne (gazetteer et cache uniquement)."""
+    if HORS_LIGNE:
+        return None
+    if nom == "local":
+        return BackendNominatim(GEOCODAGE_LOCAL_URL, intervalle=0, concurrence=GEOCODAGE_LOCAL_CONCURRENCE, nom="local")
+    if nom == "nominatim":
+        return BackendNominatim(f"{NOMINATIM_SCHEME}://{NOMINATIM_DOMAINE}")
+    raise ValueError(f"Backend de géocodage inconnu : {nom}")
+
+
+class ServiceGeocodage:
+    """
+    Géocodage asynchrone sur une boucle d'événements persistante (thread dédié), appelable depuis
+    n'importe quel thread. Ordre de résolution : gazetteer local, cache disque, puis backend distant.
+    Les requêtes identiques en cours (même lieu normalisé, même pays) sont fusionnées.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.boucle = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.boucle.run_forever, name="geocodage", daemon=True)
+        self.thread.start()
+        self.en_cours = {}  # clé normalisée -> tâche asyncio (coalescence)
+        self.fusionnees = 0
+        self.erreurs = 0
+
+    async def _resoudre(self, nom, ville, code_iso, viewbox, contexte):
+        debut = time.time()
+        source, coords, erreur = None, None, None
+        try:
+            point = get_gazetteer().chercher(nom, ville)
+            if point:
+                source, coords = "gazetteer", (point["lat"], point["lon"])
+                return coords
+
+            cache = get_geocache()
+            en_cache, coords = cache.lire(nom, ville, code_iso)
+            if en_cache or self.backend is None:
+                source = "cache" if en_cache else "hors_ligne"
+                return coords
+
+            source = self.backend.nom
+            # Nettoyage rapide pour Nominatim (retrait des parenthèses)
+            requete = re.sub(r"\(.*?\)", "", nom).strip()
+            coords = await self.backend.chercher(requete, code_iso, viewbox)
+            await asyncio.to_thread(cache.ecrire, nom, ville, code_iso, coords)
+            return coords
+        except Exception as e:
+            # Erreur réseau / HTTP : signalée mais jamais mise en cache (le lieu sera re-tenté)
+            self.erreurs += 1
+            erreur = f"{type(e).__name__}: {e}"
+            print(f"⚠️ Géocodage impossible pour {nom} ({source}) : {erreur}")
+            return None
+        finally:
+            enregistrer_span("geocodage.lieu", debut, time.time(), contexte, erreur,
+                             lieu=nom, source=source, trouve=coords is not None)
+
+    async def _geocoder(self, nom, ville, code_iso, viewbox, contexte):
+        cle = (normaliser_requete(nom, ville), code_iso or "")
+        tache = self.en_cours.get(cle)
+        if tache is None:
+            tache = asyncio.ensure_future(self._resoudre(nom, ville, code_iso, viewbox, contexte))
+            self.en_cours[cle] = tache
+            tache.add_done_callback(lambda _: self.en_cours.pop(cle, None))
+        else:
+            self.fusionnees += 1
+        # shield : l'annulation d'un demandeur n'annule pas la requête partagée
+        return await asyncio.shield(tache)
+
+    async def _geocoder_tous(self, noms, ville, code_iso, viewbox, contexte, delai_max=None):
+        taches = [asyncio.ensure_future(self._geocoder(nom, ville, code_iso, viewbox, contexte)) for nom in noms]
+        if delai_max is None or not taches:
+            return await asyncio.gather(*taches)
+        # Les lieux non résolus à temps valent None ; leurs requêtes continuent et alimentent le cache
+        await asyncio.wait(taches, timeout=delai_max)
+        return [tache.result() if tache.done() else None for tache in taches]
+
+    def geocoder(self, noms, ville, code_iso=None, viewbox=None, delai_max=None):
+        """
+        Coordonnées (lat, lon) ou None pour chaque nom, dans l'ordre des noms (appel bloquant).
+        delai_max (secondes) borne l'attente : les lieux encore en cours de résolution valent None.
+        """
+        futur = asyncio.run_coroutine_threadsafe(
+            self._geocoder_tous(list(noms), ville, code_iso, viewbox, contexte_actif(), delai_max), self.boucle
+        )
+        return futur.result()
+
+    def stats(self):
+        return {"backend": self.backend.nom if self.backend else "hors_ligne",
+                "fusionnees": self.fusionnees, "erreurs": self.erreurs}
+
+    def fermer(self):
+        if self.backend is not None:
+            asyncio.run_coroutine_threadsafe(self.backend.fermer(), self.boucle).result()
+        self.boucle.call_soon_threadsafe(self.boucle.stop)
+        self.thread.join()
+
+
+_service = None
+_service_verrou = threading.Lock()
+
+
+def get_service_geocodage():
+    global _service
+    with _service_verrou:
+        if _service is None:
+            _service = ServiceGeocodage(creer_backend())
+        return _service
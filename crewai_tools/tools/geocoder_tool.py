@@ -1,88 +1,88 @@
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
-import time
+import os
 import json
 import re
-from litellm import completion
 import streamlit as st
+from crewai_tools.tools.rate_limiter import completion_limitee
+from crewai_tools.tools.llm_backend import parametres_litellm
+from crewai_tools.tools.geocache import get_geocache
+from crewai_tools.tools.geocodage_async import HORS_LIGNE, get_service_geocodage
+from crewai_tools.tools.place_extractor import extraire_noms_lieux, MAX_LIEUX
+from crewai_tools.tools.catalogue import get_catalogue
+from crewai_tools.tools.tracing import span
+from crewai_tools.tools.usage_ledger import etiquettes
 
-import time
-from litellm import completion
-# ... autres imports
+# EXTRACTION_LLM_SECOURS=0 : ne jamais demander les noms de lieux au LLM
+FALLBACK_LLM = os.getenv("EXTRACTION_LLM_SECOURS", "1") == "1" and not HORS_LIGNE
 
-def call_llm_with_retry(prompt, model="groq/llama-3.1-8b-instant", retries=3):
-    """Tente l'appel API plusieurs fois en cas d'erreur 429"""
-    for i in range(retries):
-        try:
-            return completion(
-                model=model, 
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0
-            )
-        except Exception as e:
-            if "429" in str(e) and i < retries - 1:
-                wait_time = (2 ** i) * 5  # Attente exponentielle : 5s, 10s...
-                print(f"Rate limit atteint. Attente de {wait_time}s...")
-                time.sleep(wait_time)
-                continue
-            raise e
 
+def call_llm_with_retry(prompt, role="extraction", retries=3):
+    """Appel LLM via le limiteur partagé (attend le Retry-After en cas d'erreur 429)"""
+    return completion_limitee(
+        **parametres_litellm(role),
+        messages=[{"role": "user", "content": prompt}],
+        retries=retries,
+        temperature=0
+    )
 
-def extraire_points_gps(texte_itineraire, ville_destination):
-    """
-    1. Utilise le LLM pour extraire uniquement les NOMS des lieux.
-    2. Utilise Geopy (OpenStreetMap) pour trouver les vraies coordonnées.
-    """
-    # Étape 1 : Demander au LLM une liste de noms simples
-    time.sleep(3)
+
+def extraire_noms_llm(texte_itineraire, ville_destination):
+    """Extraction des noms de lieux par le LLM (solution de secours)."""
     prompt_noms = f"""Analyse cet itinéraire pour la ville de {ville_destination}.
                     Liste les noms officiels des monuments, parcs ou quartiers mentionnés (maximum 15).
                     Réponds uniquement avec une liste JSON de chaînes de caractères.
                     Format : ["Nom du lieu 1, {ville_destination}", "Nom du lieu 2, {ville_destination}"]
                     Itinéraire : {texte_itineraire}"""
-    
-    codes_pays = {"Japon": "jp", "Rome": "it", "New_York": "us"}
-    code_iso = codes_pays.get(ville_destination)
-    try:
+    with etiquettes(etape="extraction_lieux"):
         response = call_llm_with_retry(prompt_noms)
-        res_content = response.choices[0].message.content
-        # Nettoyage pour extraire le JSON
-        match = re.search(r'\[.*\]', res_content, re.DOTALL)
-        if not match:
-            return []
-        noms_lieux = json.loads(re.search(r'\[.*\]', response.choices[0].message.content, re.DOTALL).group())
-        print(f"🔍 DEBUG LLM : Lieux extraits par l'IA ({len(noms_lieux)}) : {noms_lieux}")
+    # Nettoyage pour extraire le JSON
+    match = re.search(r'\[.*\]', response.choices[0].message.content, re.DOTALL)
+    if not match:
+        return []
+    noms_lieux = json.loads(match.group())
+    return [nom[0] if isinstance(nom, list) else nom for nom in noms_lieux]
+
+
+def extraire_points_gps(texte_itineraire, ville_destination, fallback_llm=FALLBACK_LLM):
+    """
+    1. Extrait les NOMS des lieux localement (gazetteer + créneaux du planning), le LLM en secours.
+    2. Trouve les vraies coordonnées (gazetteer, cache, puis Nominatim / OpenStreetMap).
+    """
+    with span("geocodage", ville=ville_destination) as span_geocodage:
+        points_gps = _extraire_points_gps(texte_itineraire, ville_destination, fallback_llm)
+        span_geocodage.ajouter(points=len(points_gps))
+        return points_gps
+
+
+def _extraire_points_gps(texte_itineraire, ville_destination, fallback_llm):
+    destination = get_catalogue().get(ville_destination)
+    code_iso = destination.code_pays if destination else None
+    viewbox = destination.viewbox() if destination else None
+    try:
+        # Étape 1 : Noms des lieux
+        with span("geocodage.extraction") as span_extraction:
+            noms_lieux = extraire_noms_lieux(texte_itineraire, ville_destination)
+            span_extraction.ajouter(lieux=len(noms_lieux))
+        print(f"🔍 DEBUG : Lieux extraits localement ({len(noms_lieux)}) : {noms_lieux}")
+        if not noms_lieux and fallback_llm:
+            noms_lieux = extraire_noms_llm(texte_itineraire, ville_destination)
+            print(f"🔍 DEBUG LLM : Lieux extraits par l'IA ({len(noms_lieux)}) : {noms_lieux}")
 
-        # Étape 2 : Géocodage via Nominatim (API Gratuite)
-        geolocator = Nominatim(user_agent="my_travel_planner_app_v1")
+        # Étape 2 : Géocodage asynchrone (gazetteer, cache, puis backend distant), dans l'ordre des noms
+        noms_lieux = noms_lieux[:MAX_LIEUX]
+        coordonnees = get_service_geocodage().geocoder(noms_lieux, ville_destination, code_iso, viewbox)
         points_gps = []
-        
-        # On limite à 5 lieux pour ne pas être trop lent (Nominatim = 1 req/sec)
-        for nom in noms_lieux[:10]:
-            try:
-                nom = nom[0] if isinstance(nom, list) else nom
-                # Nettoyage rapide pour Nominatim (retrait des parenthèses)
-                query = re.sub(r'\(.*?\)', '', nom).strip()
-                # On force la recherche dans le pays spécifique si on le connaît
-                location = geolocator.geocode(
-                    query, 
-                    timeout=10, 
-                    country_codes=code_iso if code_iso else None
-                )
-                
-                if location:
-                    points_gps.append({
-                        "name": nom,
-                        "lat": location.latitude,
-                        "lon": location.longitude
-                    })
-                    print(f"✅Trouvé -> {nom}")
-                else:
-                    print(f"❌Non trouvé -> {nom}")
-                time.sleep(1) 
-            except Exception:
-                continue
-        print(f"Points GPS extraits : {points_gps}")   
+        for nom, coords in zip(noms_lieux, coordonnees):
+            if coords:
+                points_gps.append({
+                    "name": nom,
+                    "lat": coords[0],
+                    "lon": coords[1]
+                })
+                print(f"✅Trouvé -> {nom}")
+            else:
+                print(f"❌Non trouvé -> {nom}")
+        print(f"Points GPS extraits : {points_gps}")
+        print(f"Cache géocodage : {get_geocache().stats()} | Service : {get_service_geocodage().stats()}")
         return points_gps
     except Exception as e:
         st.error(f"Erreur extraction : {e}")
@@ -0,0 +1,390 @@
+import os
+
+import numpy as np
+
+# Distances et optimisation de parcours vectorisées (NumPy), pour évaluer la logistique des itinéraires.
+# Coordonnées : tableaux (n, 2) de (lat, lon) en degrés ; distances en km.
+
+RAYON_TERRE_KM = 6371.0088
+# Ellipsoïde WGS84 (Vincenty)
+DEMI_GRAND_AXE_KM = 6378.137
+APLATISSEMENT = 1 / 298.257223563
+DEMI_PETIT_AXE_KM = DEMI_GRAND_AXE_KM * (1 - APLATISSEMENT)
+
+ITERATIONS_VINCENTY = 200
+# Passes maximales d'amélioration locale (2-opt / Or-opt) : borne de sécurité, rarement atteinte
+PASSES_MAX = 10_000
+# Départs du plus proche voisin essayés par meilleur_parcours (la recherche locale dépend du départ)
+DEPARTS = 4
+POINTS_MULTI_DEPARTS = 100
+# Voisins considérés par point pour les mouvements 2-opt / Or-opt (listes de candidats)
+VOISINS = 10
+# Jusqu'à ce nombre de points, le parcours est exact (programmation dynamique de Held-Karp, 2^n x n états) :
+# la recherche locale peut y rester bloquée à quelques % de l'optimum
+POINTS_EXACT = int(os.getenv("PARCOURS_POINTS_EXACT", 10))
+
+
+def coordonnees(points):
+    """[{"lat", "lon", ...}, ...] -> tableau (n, 2)."""
+    return np.array([[p["lat"], p["lon"]] for p in points], dtype=float).reshape(-1, 2)
+
+
+def distances_haversine(a, b):
+    """Distances du grand cercle entre a et b (tableaux (..., 2) compatibles par broadcasting)."""
+    lat1, lon1 = np.radians(a[..., 0]), np.radians(a[..., 1])
+    lat2, lon2 = np.radians(b[..., 0]), np.radians(b[..., 1])
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAYON_TERRE_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def distances_vincenty(a, b, iterations=ITERATIONS_VINCENTY, tolerance=1e-12):
+    """
+    Distances sur l'ellipsoïde WGS84 (formule inverse de Vincenty), élément par élément et par broadcasting.
+    Les rares paires quasi antipodales qui ne convergent pas retombent sur la distance haversine.
+    """
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+    f = APLATISSEMENT
+    u1 = np.arctan((1 - f) * np.tan(np.radians(a[..., 0])))
+    u2 = np.arctan((1 - f) * np.tan(np.radians(b[..., 0])))
+    l = np.radians(b[..., 1] - a[..., 1])
+    sin_u1, cos_u1, sin_u2, cos_u2 = np.sin(u1), np.cos(u1), np.sin(u2), np.cos(u2)
+
+    lam = l.copy()
+    actif = np.ones(lam.shape, dtype=bool)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(iterations):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Lignes équatoriales : cos2_alpha = 0
+            cos_2sm = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            precedent = lam
+            lam = l + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sm + c * cos_sigma * (-1 + 2 * cos_2sm ** 2)))
+            actif = np.abs(lam - precedent) > tolerance
+            if not actif.any():
+                break
+
+        u2_carre = cos2_alpha * (DEMI_GRAND_AXE_KM ** 2 - DEMI_PETIT_AXE_KM ** 2) / DEMI_PETIT_AXE_KM ** 2
+        grand_a = 1 + u2_carre / 16384 * (4096 + u2_carre * (-768 + u2_carre * (320 - 175 * u2_carre)))
+        grand_b = u2_carre / 1024 * (256 + u2_carre * (-128 + u2_carre * (74 - 47 * u2_carre)))
+        delta_sigma = grand_b * sin_sigma * (cos_2sm + grand_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sm ** 2)
+            - grand_b / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)))
+        distances = DEMI_PETIT_AXE_KM * grand_a * (sigma - delta_sigma)
+
+    invalides = actif | ~np.isfinite(distances)
+    if invalides.any():
+        distances = np.where(invalides, distances_haversine(a, b), distances)
+    return distances
+
+
+def matrice_distances(coords, methode="haversine"):
+    """Matrice (n, n) des distances entre tous les points ("haversine" ou "vincenty")."""
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    fonction = distances_vincenty if methode == "vincenty" else distances_haversine
+    return fonction(coords[:, None, :], coords[None, :, :])
+
+
+def longueur_parcours(matrice, ordre):
+    """Longueur d'un parcours ouvert (sans retour au départ) dans l'ordre donné."""
+    ordre = np.asarray(ordre)
+    if len(ordre) < 2:
+        return 0.0
+    return float(matrice[ordre[:-1], ordre[1:]].sum())
+
+
+def plus_proche_voisin(matrice, depart=0):
+    """Parcours glouton : toujours vers le point non visité le plus proche."""
+    n = len(matrice)
+    visite = np.zeros(n, dtype=bool)
+    ordre = [depart]
+    visite[depart] = True
+    for _ in range(n - 1):
+        distances = np.where(visite, np.inf, matrice[ordre[-1]])
+        suivant = int(np.argmin(distances))
+        ordre.append(suivant)
+        visite[suivant] = True
+    return ordre
+
+
+def parcours_exact(matrice):
+    """Parcours ouvert le plus court (Held-Karp) : cout[masque, j] = plus court chemin couvrant masque, fini en j."""
+    n = len(matrice)
+    if n < 3:
+        return list(range(n))
+    points = np.arange(n)
+    cout = np.full((1 << n, n), np.inf)
+    precedent = np.full((1 << n, n), -1, dtype=int)
+    cout[1 << points, points] = 0.0
+    for masque in range(1, 1 << n):
+        dehors = points[(masque >> points) & 1 == 0]
+        if not len(dehors):
+            continue
+        # Meilleur dernier point j du masque pour rejoindre chaque point k hors du masque
+        totaux = cout[masque][:, None] + matrice[:, dehors]
+        meilleurs_j = totaux.argmin(axis=0)
+        meilleurs = totaux[meilleurs_j, np.arange(len(dehors))]
+        suivants = masque | (1 << dehors)
+        gagne = meilleurs < cout[suivants, dehors]
+        cout[suivants[gagne], dehors[gagne]] = meilleurs[gagne]
+        precedent[suivants[gagne], dehors[gagne]] = meilleurs_j[gagne]
+    masque, dernier = (1 << n) - 1, int(np.argmin(cout[-1]))
+    ordre = []
+    while dernier >= 0:
+        ordre.append(dernier)
+        masque, dernier = masque ^ (1 << dernier), int(precedent[masque, dernier])
+    return ordre[::-1]
+
+
+def _avec_noeud_fictif(matrice):
+    """
+    Ajoute un nœud à distance nulle de tous les autres : un parcours ouvert (extrémités libres)
+    devient une tournée fermée passant par ce nœud, que 2-opt et Or-opt savent améliorer.
+    """
+    n = len(matrice)
+    etendue = np.zeros((n + 1, n + 1))
+    etendue[:n, :n] = matrice
+    return etendue
+
+
+def plus_proches_voisins(matrice, k=VOISINS):
+    """Indices des k plus proches voisins de chaque point (hors lui-même), tableau (n, k)."""
+    n = len(matrice)
+    k = min(k, n - 1)
+    distances = matrice + np.diag(np.full(n, np.inf))
+    voisins = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    return voisins
+
+
+def _positions(tournee):
+    positions = np.empty(len(tournee), dtype=int)
+    positions[tournee] = np.arange(len(tournee))
+    return positions
+
+
+def _mouvements_deux_opt(matrice, tournee, voisins, tolerance):
+    """
+    Mouvements 2-opt améliorants (inversion de tournee[i..j]) parmi ceux qui créent une arête vers un proche
+    voisin (plus tous ceux qui touchent le nœud fictif, en position 0), puis ceux qui ne se chevauchent pas.
+    Des segments disjoints ne touchent pas les mêmes arêtes : leurs gains restent exacts dans la même passe.
+    """
+    m = len(tournee)
+    positions = _positions(tournee)
+    # Nouvelle arête (tournee[p], tournee[q]) avec tournee[q] voisin de tournee[p]
+    p = np.repeat(np.arange(1, m), voisins.shape[1])
+    q = positions[voisins[tournee[1:]].ravel()]
+    debuts = np.where(q > p, p + 1, q + 1)
+    fins = np.where(q > p, q, p)
+    # Extrémités du parcours : arêtes vers le nœud fictif
+    tous = np.arange(1, m)
+    debuts = np.concatenate([debuts, np.ones(m - 1, dtype=int), tous])
+    fins = np.concatenate([fins, tous, np.full(m - 1, m - 1)])
+    valides = debuts < fins
+    debuts, fins = debuts[valides], fins[valides]
+
+    precedents, premiers = tournee[debuts - 1], tournee[debuts]
+    derniers, suivants = tournee[fins], tournee[(fins + 1) % m]
+    gains = (matrice[precedents, premiers] + matrice[derniers, suivants]
+             - matrice[precedents, derniers] - matrice[premiers, suivants])
+
+    mouvements, occupes = [], np.zeros(m + 1, dtype=bool)
+    for indice in np.argsort(-gains):
+        if gains[indice] <= tolerance:
+            break
+        i, j = debuts[indice], fins[indice]
+        # Marge d'une position : deux segments contigus partageraient une arête
+        if not occupes[i - 1:j + 2].any():
+            occupes[i - 1:j + 2] = True
+            mouvements.append((i, j))
+    return mouvements
+
+
+def _meilleur_or_opt(matrice, tournee, voisins, longueur):
+    """
+    Meilleur déplacement d'un segment de `longueur` points (éventuellement inversé) à côté d'un proche
+    voisin de l'une de ses extrémités : (gain, début du segment, arête d'insertion, inversé).
+    """
+    m = len(tournee)
+    if m < longueur + 3:
+        return 0.0, 0, 0, False
+    positions = _positions(tournee)
+    debuts = np.arange(1, m - longueur + 1)
+    premiers = tournee[debuts]
+    derniers = tournee[debuts + longueur - 1]
+    avant = tournee[debuts - 1]
+    apres = tournee[(debuts + longueur) % m]
+    retrait = matrice[avant, premiers] + matrice[derniers, apres] - matrice[avant, apres]
+
+    # Arêtes d'insertion candidates : celles qui touchent un voisin du premier ou du dernier point
+    k = voisins.shape[1]
+    voisins_segment = np.concatenate([voisins[premiers], voisins[derniers]], axis=1)
+    aretes = positions[voisins_segment]
+    aretes = np.concatenate([aretes, aretes - 1], axis=1) % m
+    segments = np.repeat(np.arange(len(debuts)), 4 * k)
+    aretes = aretes.ravel()
+
+    a, b = tournee[aretes], tournee[(aretes + 1) % m]
+    base = matrice[a, b]
+    premiers_c, derniers_c = premiers[segments], derniers[segments]
+    gain_direct = retrait[segments] - (matrice[a, premiers_c] + matrice[derniers_c, b] - base)
+    gain_inverse = retrait[segments] - (matrice[a, derniers_c] + matrice[premiers_c, b] - base)
+
+    # Interdit : insérer le segment à l'intérieur de lui-même ou à sa place actuelle
+    debut_c = debuts[segments]
+    interdit = (aretes >= debut_c - 1) & (aretes <= debut_c + longueur - 1)
+    gain_direct[interdit] = -np.inf
+    gain_inverse[interdit] = -np.inf
+
+    inverse = gain_inverse.max() > gain_direct.max()
+    gains = gain_inverse if inverse else gain_direct
+    meilleur = int(np.argmax(gains))
+    return gains[meilleur], debut_c[meilleur], aretes[meilleur], inverse
+
+
+def _deplacer_segment(tournee, debut, longueur, position, inverse):
+    segment = tournee[debut:debut + longueur]
+    if inverse:
+        segment = segment[::-1]
+    reste = np.concatenate([tournee[:debut], tournee[debut + longueur:]])
+    # position désignait l'arête (tournee[position], tournee[position + 1]) avant le retrait
+    insertion = position + 1 if position < debut else position + 1 - longueur
+    return np.concatenate([reste[:insertion], segment, reste[insertion:]])
+
+
+def ameliorer_parcours(matrice, ordre, tolerance=1e-9):
+    """
+    Recherche locale 2-opt puis Or-opt (segments de 1 à 3 points) jusqu'à ce qu'aucun mouvement ne gagne.
+    Les mouvements évalués sont restreints aux VOISINS plus proches voisins : coût linéaire par passe.
+    """
+    n = len(ordre)
+    if n < 4:
+        return list(ordre)
+    voisins = plus_proches_voisins(matrice)
+    etendue = _avec_noeud_fictif(matrice)
+    tournee = np.array([n] + list(ordre))
+    for _ in range(PASSES_MAX):
+        mouvements = _mouvements_deux_opt(etendue, tournee, voisins, tolerance)
+        if mouvements:
+            for i, j in mouvements:
+                tournee[i:j + 1] = tournee[i:j + 1][::-1]
+            continue
+        gain, debut, position, inverse, longueur = max(
+            (_meilleur_or_opt(etendue, tournee, voisins, longueur) + (longueur,) for longueur in (1, 2, 3)),
+            key=lambda mouvement: mouvement[0])
+        if gain <= tolerance:
+            break
+        tournee = _deplacer_segment(tournee, debut, longueur, position, inverse)
+    # On rouvre la tournée au nœud fictif
+    depart = int(np.where(tournee == n)[0][0])
+    return [int(p) for p in np.roll(tournee, -depart)[1:]]
+
+
+def meilleur_parcours(matrice, nb_departs=DEPARTS):
+    """
+    Parcours ouvert le plus court parmi plusieurs départs du plus proche voisin (répartis sur les points),
+    chacun amélioré par ameliorer_parcours. Au-delà de POINTS_MULTI_DEPARTS points, un seul départ.
+    Jusqu'à POINTS_EXACT points, parcours exact.
+    """
+    n = len(matrice)
+    if n <= POINTS_EXACT:
+        return parcours_exact(matrice)
+    if n > POINTS_MULTI_DEPARTS:
+        nb_departs = 1
+    departs = np.unique(np.linspace(0, n - 1, min(n, nb_departs)).astype(int))
+    candidats = [ameliorer_parcours(matrice, plus_proche_voisin(matrice, int(depart))) for depart in departs]
+    return min(candidats, key=lambda ordre: longueur_parcours(matrice, ordre))
+
+
+def _affecter(ecarts, capacite):
+    """
+    Affectation de chaque point à un centre sous contrainte de capacité : les couples (point, centre)
+    sont pris du plus proche au plus éloigné, tant que le centre a de la place.
+    """
+    n, k = ecarts.shape
+    jours = np.full(n, -1)
+    places = np.full(k, capacite)
+    for couple in np.argsort(ecarts, axis=None, kind="stable"):
+        point, centre = divmod(int(couple), k)
+        if jours[point] < 0 and places[centre] > 0:
+            jours[point] = centre
+            places[centre] -= 1
+    return jours
+
+
+def regrouper_par_jour(coords, nb_jours, iterations=50, graine=0, capacite=None):
+    """
+    k-moyennes (initialisation k-means++) sur les points projetés sur la sphère unité :
+    un groupe de lieux proches par jour. Renvoie l'indice du jour de chaque point.
+    capacite : nombre maximal de lieux par jour (relevé si les jours ne suffisent pas à tout placer).
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    n = len(coords)
+    nb_jours = max(1, min(nb_jours, n))
+    if nb_jours == 1:
+        return np.zeros(n, dtype=int)
+    if capacite is not None:
+        capacite = max(capacite, -(-n // nb_jours))
+    lat, lon = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    xyz = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    generateur = np.random.default_rng(graine)
+    centres = [xyz[generateur.integers(n)]]
+    for _ in range(nb_jours - 1):
+        distances = np.min(((xyz[:, None, :] - np.array(centres)[None, :, :]) ** 2).sum(axis=2), axis=1)
+        if distances.sum() == 0:
+            centres.append(xyz[generateur.integers(n)])
+        else:
+            centres.append(xyz[generateur.choice(n, p=distances / distances.sum())])
+    centres = np.array(centres)
+
+    jours = np.zeros(n, dtype=int)
+    for iteration in range(iterations):
+        ecarts = ((xyz[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+        nouveaux = np.argmin(ecarts, axis=1) if capacite is None else _affecter(ecarts, capacite)
+        if iteration > 0 and np.array_equal(nouveaux, jours):
+            break
+        jours = nouveaux
+        for k in range(nb_jours):
+            if (jours == k).any():
+                centres[k] = xyz[jours == k].mean(axis=0)
+    return jours
+
+
+def optimiser_parcours(coords, nb_jours=1, methode="haversine", capacite=None):
+    """
+    Parcours le plus court (heuristique) passant une fois par chaque point, extrémités libres.
+    nb_jours > 1 : les points sont d'abord regroupés par jour (k-moyennes, au plus capacite lieux
+    par jour), les journées enchaînées de proche en proche, et chaque journée optimisée séparément.
+    Renvoie {"ordre": indices des points, "jours": jour de chaque étape de l'ordre, "distance_km"}.
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    n = len(coords)
+    if n == 0:
+        return {"ordre": [], "jours": [], "distance_km": 0.0}
+    matrice = matrice_distances(coords, methode)
+    jours = regrouper_par_jour(coords, nb_jours, capacite=capacite)
+
+    ordre, jours_ordre, dernier = [], [], None
+    restants = set(np.unique(jours).tolist())
+    while restants:
+        # Journée suivante : celle dont un lieu est le plus proche du dernier lieu visité
+        if dernier is None:
+            jour = min(restants)
+        else:
+            jour = min(restants, key=lambda k: matrice[dernier, jours == k].min())
+        restants.discard(jour)
+        membres = np.where(jours == jour)[0]
+        sous_matrice = matrice[np.ix_(membres, membres)]
+        local = meilleur_parcours(sous_matrice)
+        # Extrémités libres : on parcourt la journée depuis le bout le plus proche de la veille
+        if dernier is not None and matrice[dernier, membres[local[-1]]] < matrice[dernier, membres[local[0]]]:
+            local = local[::-1]
+        ordre.extend(int(membres[i]) for i in local)
+        jours_ordre.extend([jour] * len(local))
+        dernier = ordre[-1]
+    return {"ordre": ordre, "jours": jours_ordre, "distance_km": round(longueur_parcours(matrice, ordre), 2)}
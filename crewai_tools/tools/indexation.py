@@ -0,0 +1,333 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from pypdf import PdfReader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from crewai_tools.tools.database import (
+    BASE_CHROMA_PATH, EMBEDDING_MODEL, CHUNK_SIZE, CHUNK_OVERLAP,
+    COLLECTION, chemin_pdf, chemin_index, filtre_destination, get_collection, invalider_vectorstore,
+)
+from crewai_tools.tools.catalogue import get_catalogue
+from crewai_tools.tools.retrieval import construire_bm25
+
+MANIFEST = "manifest.json"
+PROGRESSION = "progression.json"
+
+# Extraction / découpage : pages traitées par plages dans un pool de processus
+PROCESSUS_EXTRACTION = int(os.getenv("INDEXATION_PROCESSUS", os.cpu_count() or 2))
+PAGES_PAR_PLAGE = 8
+# Embedding : lots de chunks écrits au fur et à mesure, avec une concurrence bornée
+TAILLE_LOT = 64
+CONCURRENCE_EMBEDDING = int(os.getenv("INDEXATION_CONCURRENCE_EMBEDDING", 2))
+# Destinations indexées simultanément par construire_tous_les_index
+DESTINATIONS_PARALLELES = 2
+
+# Un seul build à la fois par destination (tâche de fond et requête utilisateur)
+_verrous = {}
+_verrous_global = threading.Lock()
+
+# État de la tâche de fond, lisible par l'application
+etat_indexation = {"en_cours": False, "destinations": {}}
+
+
+def _verrou(nom_destination):
+    with _verrous_global:
+        return _verrous.setdefault(nom_destination, threading.Lock())
+
+
+def chemin_manifest(nom_destination):
+    return os.path.join(chemin_index(nom_destination), MANIFEST)
+
+
+def lire_manifest(nom_destination):
+    try:
+        with open(chemin_manifest(nom_destination), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def ecrire_manifest(nom_destination, manifest):
+    os.makedirs(chemin_index(nom_destination), exist_ok=True)
+    temporaire = chemin_manifest(nom_destination) + ".tmp"
+    with open(temporaire, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temporaire, chemin_manifest(nom_destination))
+
+
+def chemin_progression(nom_destination):
+    return os.path.join(chemin_index(nom_destination), PROGRESSION)
+
+
+def lire_progression(nom_destination):
+    try:
+        with open(chemin_progression(nom_destination), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def ecrire_progression(nom_destination, progression):
+    """Point de reprise : pages déjà écrites dans l'index pendant la construction en cours."""
+    os.makedirs(chemin_index(nom_destination), exist_ok=True)
+    temporaire = chemin_progression(nom_destination) + ".tmp"
+    with open(temporaire, "w", encoding="utf-8") as f:
+        json.dump(progression, f)
+    os.replace(temporaire, chemin_progression(nom_destination))
+
+
+def empreinte_fichier(chemin):
+    sha = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            sha.update(bloc)
+    return sha.hexdigest()
+
+
+def parametres_indexation():
+    return {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "embedding_model": EMBEDDING_MODEL,
+            "collection": COLLECTION}
+
+
+def destinations_disponibles():
+    """Destinations découvertes dans le dossier knowledge (un guide PDF par destination)."""
+    return get_catalogue(recharger=True).noms()
+
+
+def index_pret(nom_destination):
+    """Un index est servable si la destination a été écrite dans la collection partagée."""
+    manifest = lire_manifest(nom_destination)
+    return manifest is not None and manifest.get("parametres", {}).get("collection") == COLLECTION
+
+
+def supprimer_chunks(vectorstore, nom_destination, **filtre):
+    """Supprime les chunks de la destination correspondant au filtre (ex: page=3)."""
+    anciens_ids = vectorstore.get(where=filtre_destination(nom_destination, **filtre))["ids"]
+    if anciens_ids:
+        vectorstore.delete(ids=anciens_ids)
+
+
+def index_a_jour(nom_destination):
+    manifest = lire_manifest(nom_destination)
+    return (
+        manifest is not None
+        and manifest.get("parametres") == parametres_indexation()
+        and manifest.get("pdf_sha256") == empreinte_fichier(chemin_pdf(nom_destination))
+    )
+
+
+def pool_extraction():
+    """
+    Pool d'extraction. Contexte spawn : l'indexation démarre depuis un thread de fond du processus
+    Streamlit (multi-thread), qu'un fork pourrait copier avec des verrous tenus par d'autres threads.
+    """
+    return ProcessPoolExecutor(max_workers=PROCESSUS_EXTRACTION, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _extraire_plage(pdf_path, debut, fin, pages_connues, chunk_size, chunk_overlap):
+    """
+    Exécuté dans un processus de travail : extrait et découpe les pages [debut, fin[ du PDF.
+    Renvoie [(numéro, empreinte, chunks ou None si la page est inchangée)].
+    """
+    reader = PdfReader(pdf_path)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    resultats = []
+    for numero in range(debut, fin):
+        texte = reader.pages[numero].extract_text() or ""
+        empreinte_page = hashlib.sha256(texte.encode("utf-8")).hexdigest()
+        if pages_connues.get(str(numero)) == empreinte_page:
+            resultats.append((numero, empreinte_page, None))
+        else:
+            resultats.append((numero, empreinte_page, splitter.split_text(texte)))
+    return resultats
+
+
+def _plages_extraites(pool, pdf_path, nb_pages, pages_connues):
+    """Soumet les plages de pages au fil de l'eau (au plus 2 par processus en vol) : mémoire constante."""
+    plages = iter(range(0, nb_pages, PAGES_PAR_PLAGE))
+    en_vol = set()
+    while True:
+        while len(en_vol) < 2 * PROCESSUS_EXTRACTION:
+            debut = next(plages, None)
+            if debut is None:
+                break
+            en_vol.add(pool.submit(
+                _extraire_plage, pdf_path, debut, min(debut + PAGES_PAR_PLAGE, nb_pages),
+                pages_connues, CHUNK_SIZE, CHUNK_OVERLAP,
+            ))
+        if not en_vol:
+            return
+        terminees, en_vol = wait(en_vol, return_when=FIRST_COMPLETED)
+        for future in terminees:
+            yield from future.result()
+
+
+def construire_index(nom_destination, force=False, pool=None):
+    """
+    Construit ou met à jour l'index d'une destination.
+    - Les pages sont extraites et découpées en parallèle (pool de processus), sans charger tout le PDF ;
+    - seules les pages dont le contenu a changé sont ré-découpées et ré-embeddées ;
+    - les chunks sont embeddés et écrits par lots, avec une concurrence bornée ;
+    - un fichier de progression permet de reprendre une construction interrompue.
+    Un changement des paramètres de découpage ou du modèle d'embedding force une reconstruction complète.
+    """
+    pdf_path = chemin_pdf(nom_destination)
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(f"Le guide PDF pour {nom_destination} est introuvable à l'endroit : {pdf_path}")
+
+    with _verrou(nom_destination):
+        if not force and index_a_jour(nom_destination):
+            return {"destination": nom_destination, "statut": "à jour", "pages_modifiees": 0}
+
+        debut = time.time()
+        pdf_sha256 = empreinte_fichier(pdf_path)
+        manifest = lire_manifest(nom_destination)
+        progression = lire_progression(nom_destination)
+        reprise = (
+            not force and progression is not None
+            and progression["pdf_sha256"] == pdf_sha256
+            and progression["parametres"] == parametres_indexation()
+        )
+
+        # L'index servi va changer : il sera revérifié à la prochaine requête
+        invalider_vectorstore(nom_destination)
+        vectorstore = get_collection()
+
+        if reprise:
+            complet = progression["complet"]
+            pages_connues = {**progression["base"], **progression["pages_terminees"]}
+        else:
+            complet = force or manifest is None or manifest.get("parametres") != parametres_indexation()
+            base = {} if complet else manifest.get("pages", {})
+            if complet:
+                # Index absent, antérieur à la collection partagée ou paramètres modifiés : on repart de zéro
+                supprimer_chunks(vectorstore, nom_destination)
+            progression = {"pdf_sha256": pdf_sha256, "parametres": parametres_indexation(),
+                           "complet": complet, "base": base, "pages_terminees": {}}
+            ecrire_progression(nom_destination, progression)
+            pages_connues = dict(base)
+
+        print(f"Indexation de {nom_destination} ({'complète' if complet else 'incrémentale'}"
+              f"{', reprise' if reprise else ''})...")
+        verrou_progression = threading.Lock()
+
+        def ecrire_lot(lot):
+            """Remplace les chunks des pages du lot puis les marque comme terminées."""
+            for numero, _, _ in lot:
+                supprimer_chunks(vectorstore, nom_destination, page=numero)
+            textes, metadonnees, ids = [], [], []
+            for numero, _, chunks in lot:
+                for i, chunk in enumerate(chunks):
+                    textes.append(chunk)
+                    metadonnees.append({"source": pdf_path, "page": numero, "destination": nom_destination})
+                    ids.append(f"{nom_destination}-p{numero}-c{i}")
+            if textes:
+                vectorstore.add_texts(textes, metadatas=metadonnees, ids=ids)
+            with verrou_progression:
+                for numero, empreinte_page, _ in lot:
+                    progression["pages_terminees"][str(numero)] = empreinte_page
+                ecrire_progression(nom_destination, progression)
+            return len(textes)
+
+        pages = {}
+        pages_modifiees = 0
+        nb_chunks = 0
+        propre_pool = pool is None
+        pool = pool or pool_extraction()
+        try:
+            with ThreadPoolExecutor(max_workers=CONCURRENCE_EMBEDDING) as embedding:
+                ecritures = set()
+                lot, taille = [], 0
+                nb_pages = len(PdfReader(pdf_path).pages)
+                for numero, empreinte_page, chunks in _plages_extraites(pool, pdf_path, nb_pages, pages_connues):
+                    pages[str(numero)] = empreinte_page
+                    if chunks is None:
+                        continue
+                    pages_modifiees += 1
+                    lot.append((numero, empreinte_page, chunks))
+                    taille += len(chunks)
+                    if taille >= TAILLE_LOT:
+                        # Au plus CONCURRENCE_EMBEDDING lots en cours d'embedding
+                        if len(ecritures) >= CONCURRENCE_EMBEDDING:
+                            terminees, ecritures = wait(ecritures, return_when=FIRST_COMPLETED)
+                            nb_chunks += sum(f.result() for f in terminees)
+                        ecritures.add(embedding.submit(ecrire_lot, lot))
+                        lot, taille = [], 0
+                if lot:
+                    ecritures.add(embedding.submit(ecrire_lot, lot))
+                nb_chunks += sum(f.result() for f in ecritures)
+        finally:
+            if propre_pool:
+                pool.shutdown()
+
+        # Pages disparues du PDF
+        for numero in set(pages_connues) - set(pages):
+            supprimer_chunks(vectorstore, nom_destination, page=int(numero))
+
+        # Index lexical BM25 construit à côté des vecteurs, sur les mêmes chunks
+        construire_bm25(nom_destination, vectorstore)
+
+        ecrire_manifest(nom_destination, {
+            "destination": nom_destination,
+            "pdf": pdf_path,
+            "pdf_sha256": pdf_sha256,
+            "parametres": parametres_indexation(),
+            "pages": pages,
+            "version": (manifest or {}).get("version", 0) + 1,
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        os.remove(chemin_progression(nom_destination))
+        invalider_vectorstore(nom_destination)
+        duree = round(time.time() - debut, 2)
+        print(f"✅ {nom_destination} : {pages_modifiees} page(s) ré-indexée(s), {nb_chunks} chunk(s) en {duree}s")
+        return {"destination": nom_destination, "statut": "reconstruit" if complet else "mis à jour",
+                "pages_modifiees": pages_modifiees, "chunks": nb_chunks, "duree": duree}
+
+
+def construire_tous_les_index(destinations=None, force=False):
+    """Indexe plusieurs destinations en parallèle, en partageant un même pool d'extraction."""
+    destinations = destinations or destinations_disponibles()
+
+    def construire(nom_destination):
+        try:
+            resultat = construire_index(nom_destination, force=force, pool=pool)
+        except Exception as e:
+            print(f"❌ Indexation de {nom_destination} impossible : {e}")
+            resultat = {"destination": nom_destination, "statut": "erreur", "erreur": str(e)}
+        etat_indexation["destinations"][nom_destination] = resultat["statut"]
+        return resultat
+
+    with pool_extraction() as pool:
+        with ThreadPoolExecutor(max_workers=DESTINATIONS_PARALLELES) as executeur:
+            return list(executeur.map(construire, destinations))
+
+
+def lancer_indexation_arriere_plan(destinations=None):
+    """Met à jour tous les index dans un thread de fond (appelé une fois au démarrage de l'application)."""
+    def tache():
+        etat_indexation["en_cours"] = True
+        try:
+            construire_tous_les_index(destinations)
+        finally:
+            etat_indexation["en_cours"] = False
+
+    thread = threading.Thread(target=tache, name="indexation", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    # python -m crewai_tools.tools.indexation [--force] [Rome New_York ...]
+    arguments = sys.argv[1:]
+    force = "--force" in arguments
+    destinations = [a for a in arguments if not a.startswith("--")]
+    os.makedirs(BASE_CHROMA_PATH, exist_ok=True)
+    for resultat in construire_tous_les_index(destinations, force=force):
+        print(resultat)
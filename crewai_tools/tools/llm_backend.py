@@ -0,0 +1,94 @@
+import os
+
+from dotenv import load_dotenv
+
+from crewai_tools.tools.rate_limiter import limiteur, limiteur_callback, installer_limiteur
+
+load_dotenv()
+
+# Backend de chaque rôle : "groq" (API distante), "ollama" ou "llamacpp" (serveur local).
+# LLM_BACKEND fixe le backend de tous les rôles, LLM_BACKEND_<ROLE> celui d'un rôle
+# (ex: LLM_BACKEND_JUGE=groq pour garder un juge distinct des agents) ; LLM_MODELE_<ROLE> le modèle.
+ROLES = ("synthese", "planification", "boss", "direct", "juge", "extraction")
+BACKEND_PAR_DEFAUT = os.getenv("LLM_BACKEND", "groq")
+
+# Modèles par défaut de chaque backend (le manager hiérarchique a besoin d'un modèle plus gros sur Groq)
+MODELES_PAR_DEFAUT = {
+    "groq": {"boss": "llama-3.3-70b-versatile", "*": "llama-3.1-8b-instant"},
+    "ollama": {"*": os.getenv("OLLAMA_MODELE", "llama3.1:8b")},
+    # llama-server sert un seul modèle (celui chargé au démarrage), quel que soit le nom demandé
+    "llamacpp": {"*": "local"},
+}
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# Port 8081 : le 8080 (défaut de llama-server) est celui du serveur de géocodage local (GEOCODAGE_LOCAL_URL)
+LLAMACPP_URL = os.getenv("LLAMACPP_URL", "http://localhost:8081/v1")
+
+# Requêtes simultanées envoyées à un serveur local : autant que ses slots de décodage
+# (OLLAMA_NUM_PARALLEL côté Ollama, --parallel côté llama-server), qui les traite par lots
+SLOTS_LOCAUX = {
+    "ollama": int(os.getenv("OLLAMA_NUM_PARALLEL", 4)),
+    "llamacpp": int(os.getenv("LLAMACPP_SLOTS", 4)),
+}
+
+
+def config_role(role):
+    """Backend, modèle litellm, URL et clé d'un rôle."""
+    suffixe = role.upper()
+    backend = os.getenv(f"LLM_BACKEND_{suffixe}", BACKEND_PAR_DEFAUT)
+    if backend not in MODELES_PAR_DEFAUT:
+        raise ValueError(f"Backend LLM inconnu pour le rôle {role} : {backend}")
+    defauts = MODELES_PAR_DEFAUT[backend]
+    nom = os.getenv(f"LLM_MODELE_{suffixe}") or defauts.get(role, defauts["*"])
+
+    if backend == "groq":
+        return {"backend": backend, "model": f"groq/{nom}", "api_base": None, "api_key": os.getenv("GROQ_API_KEY")}
+    if backend == "ollama":
+        return {"backend": backend, "model": f"ollama_chat/{nom}", "api_base": OLLAMA_HOST, "api_key": None}
+    # llama-server expose une API compatible OpenAI
+    return {"backend": backend, "model": f"openai/{nom}", "api_base": LLAMACPP_URL,
+            "api_key": os.getenv("LLAMACPP_API_KEY", "sans-cle")}
+
+
+def signature_roles(*roles):
+    """
+    Backend, modèle et URL de chaque rôle (sans la clé) : identifie les LLM qui ont produit un résultat
+    mis en cache. Le nom seul ne suffit pas (tous les modèles llama.cpp s'appellent "openai/local").
+    """
+    signature = {}
+    for role in roles:
+        config = config_role(role)
+        signature[role] = {cle: config[cle] for cle in ("backend", "model", "api_base")}
+    return signature
+
+
+def _preparer(role):
+    config = config_role(role)
+    if config["backend"] in SLOTS_LOCAUX:
+        # Serveur local : pas de quota RPM/TPM, le limiteur borne seulement les requêtes en vol
+        limiteur.declarer_local(config["model"], SLOTS_LOCAUX[config["backend"]])
+    installer_limiteur()
+    return config
+
+
+def parametres_litellm(role):
+    """Arguments model / api_base / api_key d'un appel litellm direct (completion_limitee) pour ce rôle."""
+    config = _preparer(role)
+    return {cle: config[cle] for cle in ("model", "api_base", "api_key") if config[cle] is not None}
+
+
+def creer_llm(role, **kwargs):
+    """LLM crewai du rôle, branché sur le limiteur partagé (kwargs : temperature, max_tokens...)."""
+    # Import local : les appels litellm directs (juge, extraction des lieux) n'ont pas besoin de crewai
+    from crewai import LLM
+
+    config = _preparer(role)
+    return LLM(
+        model=config["model"],
+        api_key=config["api_key"],
+        api_base=config["api_base"],
+        # Toujours via litellm (callbacks du limiteur), y compris pour le préfixe openai/ de llama.cpp
+        is_litellm=True,
+        callbacks=[limiteur_callback],
+        **kwargs,
+    )
@@ -0,0 +1,164 @@
+import re
+import threading
+from collections import Counter, deque
+
+from crewai_tools.tools.geocache import normaliser_requete, sans_accents
+from crewai_tools.tools.gazetteer import generique, get_gazetteer
+
+MAX_LIEUX = 15
+
+# Créneaux du planning produit par le designer : "Matin: [Nom] | Midi: [Nom] | ..."
+REGEX_CRENEAU = re.compile(
+    r"(?:Matin|Midi|Apr[eè]s[- ]midi|Soir(?:ée)?)\s*\**\s*:\s*\**\s*([^|\n]+)", re.IGNORECASE
+)
+# Suite de mots capitalisés, avec les petits mots de liaison des noms de lieux
+REGEX_NOM_PROPRE = re.compile(
+    r"[A-ZÀ-Ý][\w'’-]+(?:\s+(?:(?:de|du|des|la|le|di|da|del|della|dei|degli|of|the|d'|l')\s*)*[A-ZÀ-Ý][\w'’-]+)*"
+)
+# Mots capitalisés en début de créneau qui ne sont pas des lieux
+MOTS_VIDES = {
+    "visite", "dejeuner", "diner", "petit", "promenade", "balade", "pause", "retour", "temps",
+    "decouverte", "repas", "arrivee", "depart", "libre", "shopping", "soiree", "matin", "midi",
+    "apres", "soir", "jour", "option", "restaurant", "cafe", "hotel", "trajet", "transport",
+}
+
+
+def normaliser_texte(texte):
+    """Minuscules, sans accents, mots séparés par une seule espace (même forme que les clés du gazetteer)."""
+    return " " + re.sub(r"[^a-z0-9]+", " ", sans_accents(texte).lower()).strip() + " "
+
+
+class AutomateAhoCorasick:
+    """Recherche simultanée de tous les motifs d'un dictionnaire en un seul passage sur le texte."""
+
+    def __init__(self, motifs):
+        self.transitions = [{}]
+        self.echec = [0]
+        self.sorties = [[]]
+        for motif in motifs:
+            etat = 0
+            for car in motif:
+                if car not in self.transitions[etat]:
+                    self.transitions.append({})
+                    self.echec.append(0)
+                    self.sorties.append([])
+                    self.transitions[etat][car] = len(self.transitions) - 1
+                etat = self.transitions[etat][car]
+            self.sorties[etat].append(motif)
+
+        # Liens d'échec en largeur d'abord
+        file = deque(self.transitions[0].values())
+        while file:
+            etat = file.popleft()
+            for car, suivant in self.transitions[etat].items():
+                file.append(suivant)
+                repli = self.echec[etat]
+                while repli and car not in self.transitions[repli]:
+                    repli = self.echec[repli]
+                self.echec[suivant] = self.transitions[repli].get(car, 0)
+                if self.echec[suivant] == suivant:
+                    self.echec[suivant] = 0
+                self.sorties[suivant] = self.sorties[suivant] + self.sorties[self.echec[suivant]]
+
+    def rechercher(self, texte):
+        """Renvoie les occurrences (début, fin, motif)."""
+        etat = 0
+        occurrences = []
+        for i, car in enumerate(texte):
+            while etat and car not in self.transitions[etat]:
+                etat = self.echec[etat]
+            etat = self.transitions[etat].get(car, 0)
+            for motif in self.sorties[etat]:
+                occurrences.append((i - len(motif) + 1, i + 1, motif))
+        return occurrences
+
+
+_automates = {}
+_automates_verrou = threading.Lock()
+
+
+def _automate(destination):
+    """Automate (mis en cache) sur les noms et alias du gazetteer, bornés par des espaces."""
+    with _automates_verrou:
+        if destination not in _automates:
+            index = get_gazetteer().index.get(destination)
+            cles = index.exact if index else {}
+            _automates[destination] = AutomateAhoCorasick([f" {cle} " for cle in cles])
+        return _automates[destination]
+
+
+def _noms_creneaux(texte):
+    """Noms propres trouvés dans les créneaux Matin/Midi/Après-midi/Soir."""
+    noms = []
+    for creneau in REGEX_CRENEAU.findall(texte):
+        creneau = re.sub(r"[*_\[\]`]", "", creneau)
+        for nom in REGEX_NOM_PROPRE.findall(creneau):
+            mots = nom.split()
+            while mots and sans_accents(mots[0]).lower().strip("'’") in MOTS_VIDES:
+                mots = mots[1:]
+            nom = " ".join(mots)
+            if len(nom) >= 4 and nom not in noms:
+                noms.append(nom)
+    return noms
+
+
+def extraire_noms_lieux(texte_itineraire, ville_destination, max_lieux=MAX_LIEUX):
+    """
+    Noms des lieux cités dans l'itinéraire, sans appel LLM :
+    1. lieux connus de la destination (gazetteer) via Aho-Corasick, dans l'ordre d'apparition ;
+    2. puis noms propres des créneaux "Matin: [Nom]" absents du dictionnaire.
+    """
+    index = get_gazetteer().index.get(ville_destination)
+    noms = []
+    vus = set()
+
+    if index:
+        occurrences = _automate(ville_destination).rechercher(normaliser_texte(texte_itineraire))
+        # Plus longue correspondance à gauche d'abord, sans chevauchement
+        occurrences.sort(key=lambda o: (o[0], -(o[1] - o[0])))
+        fin_precedente = 0
+        for debut, fin, motif in occurrences:
+            if debut + 1 < fin_precedente:
+                continue
+            fin_precedente = fin
+            indice = index.exact[motif.strip()]
+            if indice not in vus:
+                vus.add(indice)
+                noms.append(index.lieux[indice][0])
+
+    for nom in _noms_creneaux(texte_itineraire):
+        point = index.chercher(nom) if index else None
+        if point is None:
+            noms.append(nom)
+        elif point["indice"] not in vus:
+            vus.add(point["indice"])
+            noms.append(point["nom_canonique"])
+
+    return noms[:max_lieux]
+
+
+def noms_cites(texte, destination, min_occurrences=2, max_lieux=None):
+    """
+    Noms propres d'un texte libre (guide PDF) cités au moins min_occurrences fois, du plus cité au moins cité.
+    Sont écartés : les mots capitalisés en début de phrase ou de ligne, les noms dont tous les mots
+    figurent aussi en minuscules dans le texte ("Modèle", "Train"), les noms génériques et la destination.
+    """
+    minuscules = set(re.findall(r"\b[a-zà-ÿ][\w'’-]*", texte))
+    nom_destination = normaliser_requete(destination.replace("_", " "))
+    comptes = Counter()
+    for match in REGEX_NOM_PROPRE.finditer(texte):
+        avant = texte[:match.start()].rstrip(" \t")
+        if not avant or avant[-1] in ".!?:;\n•-–—(\"«":
+            continue
+        mots = match.group(0).split()
+        while mots and sans_accents(mots[0]).lower().strip("'’") in MOTS_VIDES:
+            mots = mots[1:]
+        nom = " ".join(mots)
+        if len(nom) < 4 or all(mot.lower() in minuscules for mot in mots):
+            continue
+        cle = normaliser_requete(nom, destination)
+        if not cle or generique(cle) or cle == nom_destination:
+            continue
+        comptes[nom] += 1
+    noms = [nom for nom, nombre in comptes.most_common() if nombre >= min_occurrences]
+    return noms[:max_lieux] if max_lieux else noms
@@ -0,0 +1,305 @@
+import os
+import re
+import time
+import threading
+import litellm
+from litellm.integrations.custom_logger import CustomLogger
+
+from crewai_tools.tools.tracing import contexte_actif, enregistrer_span
+from crewai_tools.tools.usage_ledger import agent_depuis_messages, etiquettes_actives, get_registre_usage
+
+# --- LIMITES PAR MODÈLE ---
+# Valeurs de l'offre gratuite Groq (requêtes / tokens par minute).
+# Surchargeables dans le .env : LIMITE_RPM_<MODELE> / LIMITE_TPM_<MODELE>
+# (ex: LIMITE_TPM_LLAMA_3_1_8B_INSTANT=12000)
+LIMITES_MODELES = {
+    "llama-3.1-8b-instant": {"rpm": 30, "tpm": 6000},
+    "llama-3.3-70b-versatile": {"rpm": 30, "tpm": 12000},
+}
+LIMITE_PAR_DEFAUT = {"rpm": 30, "tpm": 6000}
+
+# Tokens de sortie supposés quand l'appel ne précise pas max_tokens
+TOKENS_SORTIE_PAR_DEFAUT = 800
+
+
+def nom_modele(model):
+    """'groq/llama-3.1-8b-instant' -> 'llama-3.1-8b-instant' (clé des limites)."""
+    return (model or "inconnu").split("/")[-1]
+
+
+def limites_modele(model):
+    nom = nom_modele(model)
+    limites = dict(LIMITES_MODELES.get(nom, LIMITE_PAR_DEFAUT))
+    suffixe = re.sub(r"[^A-Z0-9]", "_", nom.upper())
+    for cle in ("rpm", "tpm"):
+        valeur = os.getenv(f"LIMITE_{cle.upper()}_{suffixe}")
+        if valeur:
+            limites[cle] = int(valeur)
+    return limites
+
+
+def estimer_tokens(messages, max_tokens=None):
+    """Estimation grossière (4 caractères par token) du coût d'un appel."""
+    texte = " ".join(str(m.get("content", "")) for m in (messages or []) if isinstance(m, dict))
+    return len(texte) // 4 + (max_tokens or TOKENS_SORTIE_PAR_DEFAUT)
+
+
+def extraire_retry_after(erreur):
+    """Durée d'attente (s) demandée par le fournisseur, via l'en-tête Retry-After ou le message Groq."""
+    for source in (getattr(erreur, "response", None), erreur):
+        headers = getattr(source, "headers", None) or getattr(source, "litellm_response_headers", None)
+        if headers:
+            valeur = headers.get("retry-after") or headers.get("Retry-After")
+            if valeur:
+                try:
+                    return float(valeur)
+                except ValueError:
+                    pass
+    # Groq : "Please try again in 7.66s" ou "in 1m2.5s" ou "in 450ms"
+    match = re.search(r"try again in (?:(\d+)m)?([\d.]+)(ms|s)", str(erreur))
+    if match:
+        minutes = int(match.group(1) or 0)
+        valeur = float(match.group(2))
+        return minutes * 60 + (valeur / 1000 if match.group(3) == "ms" else valeur)
+    return None
+
+
+class TokenBucket:
+    """Seau rempli en continu à `capacite` unités par minute."""
+
+    def __init__(self, capacite):
+        self.capacite = capacite
+        self.niveau = float(capacite)
+        self.dernier_remplissage = time.monotonic()
+
+    def remplir(self, maintenant):
+        ecoule = maintenant - self.dernier_remplissage
+        self.niveau = min(self.capacite, self.niveau + ecoule * self.capacite / 60)
+        self.dernier_remplissage = maintenant
+
+    def attente_pour(self, quantite):
+        """Secondes avant de pouvoir prélever `quantite` (0 si disponible)."""
+        quantite = min(quantite, self.capacite)
+        manque = quantite - self.niveau
+        return 0 if manque <= 0 else manque * 60 / self.capacite
+
+
+class LimiteurLLM:
+    """
+    Limiteur partagé par tout le processus : un seau de requêtes et un seau de tokens par modèle.
+    Chaque appel LLM prend un créneau avant l'envoi ; les Retry-After du fournisseur bloquent le modèle.
+    Les modèles servis localement (declarer_local) n'ont pas de quota, seulement un nombre de slots.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.modeles = {}
+        self.locaux = {}  # modèle servi localement (Ollama, llama.cpp) -> nombre de slots du serveur
+
+    def declarer_local(self, model, slots):
+        """
+        Modèle servi localement : pas de quota RPM/TPM, mais au plus `slots` requêtes en vol,
+        autant que de slots de décodage du serveur (qui traite ensemble les requêtes simultanées).
+        """
+        with self.condition:
+            self.locaux[nom_modele(model)] = max(1, slots)
+
+    def _etat(self, model):
+        nom = nom_modele(model)
+        if nom not in self.modeles:
+            limites = limites_modele(nom)
+            self.modeles[nom] = {
+                "requetes": TokenBucket(limites["rpm"]),
+                "tokens": TokenBucket(limites["tpm"]),
+                "bloque_jusqu_a": 0.0,
+                "en_attente": 0,
+                "en_vol": 0,
+                "appels": 0,
+                "attente_totale": 0.0,
+                "attente_max": 0.0,
+                "retry_after": 0,
+            }
+        return self.modeles[nom]
+
+    def _prendre_slot(self, model, etat):
+        """Prend un slot du serveur local s'il en reste un de libre."""
+        if etat["en_vol"] >= self.locaux[nom_modele(model)]:
+            return False
+        etat["en_vol"] += 1
+        return True
+
+    def liberer(self, model):
+        """Rend le slot d'une requête terminée vers un modèle local."""
+        with self.condition:
+            etat = self._etat(model)
+            etat["en_vol"] = max(0, etat["en_vol"] - 1)
+            self.condition.notify_all()
+
+    def est_local(self, model):
+        return nom_modele(model) in self.locaux
+
+    def acquerir(self, model, tokens_estimes):
+        """Bloque jusqu'à ce qu'une requête de `tokens_estimes` tokens puisse partir. Renvoie l'attente (s)."""
+        debut = time.monotonic()
+        with self.condition:
+            etat = self._etat(model)
+            etat["en_attente"] += 1
+            try:
+                while True:
+                    if self.est_local(model):
+                        # Pas de quota : on attend seulement un slot libre (réveillé par liberer)
+                        if self._prendre_slot(model, etat):
+                            break
+                        self.condition.wait()
+                        continue
+                    maintenant = time.monotonic()
+                    etat["requetes"].remplir(maintenant)
+                    etat["tokens"].remplir(maintenant)
+                    attente = max(
+                        etat["bloque_jusqu_a"] - maintenant,
+                        etat["requetes"].attente_pour(1),
+                        etat["tokens"].attente_pour(tokens_estimes),
+                    )
+                    if attente <= 0:
+                        etat["requetes"].niveau -= 1
+                        etat["tokens"].niveau -= min(tokens_estimes, etat["tokens"].capacite)
+                        break
+                    self.condition.wait(timeout=attente)
+            finally:
+                etat["en_attente"] -= 1
+
+            attendu = time.monotonic() - debut
+            etat["appels"] += 1
+            etat["attente_totale"] += attendu
+            etat["attente_max"] = max(etat["attente_max"], attendu)
+            return attendu
+
+    def ajuster(self, model, tokens_reels, tokens_estimes):
+        """Corrige le seau de tokens avec la consommation réelle renvoyée par l'API."""
+        with self.condition:
+            etat = self._etat(model)
+            etat["tokens"].niveau -= tokens_reels - min(tokens_estimes, etat["tokens"].capacite)
+            self.condition.notify_all()
+
+    def appliquer_retry_after(self, model, secondes):
+        """Suspend tous les envois vers ce modèle pendant `secondes` (réponse 429)."""
+        with self.condition:
+            etat = self._etat(model)
+            etat["bloque_jusqu_a"] = max(etat["bloque_jusqu_a"], time.monotonic() + secondes)
+            etat["retry_after"] += 1
+            self.condition.notify_all()
+
+    def stats(self):
+        """Profondeur de file et temps d'attente par modèle."""
+        with self.condition:
+            return {
+                nom: {
+                    "en_attente": etat["en_attente"],
+                    "en_vol": etat["en_vol"],
+                    "appels": etat["appels"],
+                    "attente_totale_s": round(etat["attente_totale"], 2),
+                    "attente_moyenne_s": round(etat["attente_totale"] / max(etat["appels"], 1), 2),
+                    "attente_max_s": round(etat["attente_max"], 2),
+                    "retry_after": etat["retry_after"],
+                }
+                for nom, etat in self.modeles.items()
+            }
+
+
+limiteur = LimiteurLLM()
+
+
+class LimiteurCallback(CustomLogger):
+    """
+    Branche le limiteur sur litellm : crewai (LLM) et nos appels directs passent tous par
+    litellm, qui appelle log_pre_api_call juste avant chaque envoi HTTP (retries compris).
+    Chaque appel est aussi tracé (span "llm") et inscrit au registre d'usage : log_pre_api_call
+    s'exécute dans le thread appelant, on y capture le span parent et les étiquettes (run, mode,
+    étape, agent) pour les rattacher à l'appel quand litellm en signale la fin.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.estimations = {}
+        self.contextes = {}
+        self.slots = {}  # appel -> modèle local dont il occupe un slot
+
+    def log_pre_api_call(self, model, messages, kwargs):
+        max_tokens = (kwargs.get("optional_params") or {}).get("max_tokens")
+        tokens = estimer_tokens(messages, max_tokens)
+        appel = kwargs.get("litellm_call_id")
+        self.estimations[appel] = tokens
+        debut = time.time()
+        # Une nouvelle tentative du même appel garde son slot
+        if appel not in self.slots:
+            limiteur.acquerir(model, tokens)
+            if limiteur.est_local(model):
+                self.slots[appel] = model
+        self.contextes[kwargs.get("litellm_call_id")] = (
+            contexte_actif(), time.time() - debut, etiquettes_actives(), agent_depuis_messages(messages)
+        )
+
+    def _rapporter(self, kwargs, start_time, end_time, usage=None, erreur=None):
+        model_local = self.slots.pop(kwargs.get("litellm_call_id"), None)
+        if model_local is not None:
+            limiteur.liberer(model_local)
+        contexte, attente, tags, agent = self.contextes.pop(
+            kwargs.get("litellm_call_id"), (None, 0.0, etiquettes_actives(), None)
+        )
+        get_registre_usage().enregistrer(
+            tags, kwargs.get("model"), usage, (end_time - start_time).total_seconds(),
+            succes=erreur is None, agent=agent,
+        )
+        if contexte is None or contexte[0] is None:
+            return
+        enregistrer_span(
+            "llm", start_time.timestamp(), end_time.timestamp(), contexte, erreur=erreur,
+            modele=kwargs.get("model"),
+            agent=agent,
+            stream=bool(kwargs.get("stream")),
+            attente_limiteur_s=round(attente, 3),
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            total_tokens=getattr(usage, "total_tokens", None),
+        )
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        tokens = self.estimations.pop(kwargs.get("litellm_call_id"), None)
+        usage = getattr(response_obj, "usage", None)
+        if tokens is not None and usage is not None:
+            limiteur.ajuster(kwargs.get("model"), getattr(usage, "total_tokens", 0) or 0, tokens)
+        self._rapporter(kwargs, start_time, end_time, usage)
+
+    def log_failure_event(self, kwargs, response_obj, start_time, end_time):
+        self.estimations.pop(kwargs.get("litellm_call_id"), None)
+        erreur = kwargs.get("exception")
+        self._rapporter(kwargs, start_time, end_time, erreur=str(erreur))
+        if erreur is not None and "429" in str(erreur):
+            limiteur.appliquer_retry_after(kwargs.get("model"), extraire_retry_after(erreur) or 5)
+
+
+limiteur_callback = LimiteurCallback()
+
+
+def installer_limiteur():
+    """Enregistre le callback du limiteur auprès de litellm (idempotent)."""
+    if limiteur_callback not in litellm.callbacks:
+        litellm.callbacks.append(limiteur_callback)
+
+
+def completion_limitee(model, messages, retries=3, **kwargs):
+    """
+    litellm.completion derrière le limiteur partagé.
+    En cas de 429, on attend la durée demandée par le fournisseur (Retry-After) avant de réessayer.
+    """
+    installer_limiteur()
+    for i in range(retries):
+        try:
+            return litellm.completion(model=model, messages=messages, **kwargs)
+        except Exception as e:
+            if "429" in str(e) and i < retries - 1:
+                attente = extraire_retry_after(e) or (2 ** i) * 5
+                print(f"Rate limit atteint sur {model}. Attente de {attente:.1f}s...")
+                limiteur.appliquer_retry_after(model, attente)
+                continue
+            raise e
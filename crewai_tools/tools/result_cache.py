@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import hashlib
+import inspect
+import sqlite3
+import threading
+
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "result_cache.sqlite")
+
+# Taille maximale du cache : les itinéraires les moins récemment lus sont évincés au-delà
+MAX_OCTETS = int(os.getenv("CACHE_RESULTATS_MAX_OCTETS", 50 * 1024 * 1024))
+MAX_ENTREES = int(os.getenv("CACHE_RESULTATS_MAX_ENTREES", 2000))
+
+# CACHE_RESULTATS=0 : contourne totalement le cache (lecture et écriture)
+CACHE_ACTIF = os.getenv("CACHE_RESULTATS", "1") == "1"
+
+
+def empreinte(texte):
+    return hashlib.sha256((texte or "").encode("utf-8")).hexdigest()
+
+
+def empreinte_gabarit(*sources, reglages=None):
+    """
+    Empreinte du code qui construit les prompts (fonctions ou modules) et des réglages qui les modifient :
+    toute modification des consignes invalide le cache.
+    """
+    contenu = "".join(inspect.getsource(source) for source in sources)
+    if reglages:
+        contenu += json.dumps(reglages, sort_keys=True)
+    return empreinte(contenu)
+
+
+def cle_resultat(params, mode, modeles, gabarit, contexte_rag):
+    """
+    Clé de contenu d'une génération : paramètres du voyage normalisés + mode, LLM, prompts et RAG.
+    modeles : backend, modèle et URL de chaque rôle utilisé par le mode (llm_backend.signature_roles).
+    """
+    contenu = {
+        "ville": params["ville"],
+        "profil": params["profil"],
+        "duree": int(params["duree"]),
+        "budget": params["budget"],
+        "rythme": params["rythme"],
+        "interets": sorted(params["interets"]),
+        "adultes": int(params["adultes"]),
+        "enfants": int(params["enfants"]),
+        "mode": mode,
+        "modeles": modeles,
+        "gabarit": gabarit,
+        "rag": empreinte(contexte_rag),
+    }
+    return empreinte(json.dumps(contenu, sort_keys=True, ensure_ascii=False))
+
+
+def usage_en_dict(usage):
+    """token_usage de crewai (UsageMetrics) ou de litellm (Usage) -> dict sérialisable."""
+    if usage is None:
+        return {}
+    if hasattr(usage, "model_dump"):
+        usage = usage.model_dump()
+    elif not isinstance(usage, dict):
+        usage = vars(usage)
+    return {k: v for k, v in usage.items() if isinstance(v, (int, float))}
+
+
+class CacheResultats:
+    """Cache disque (SQLite) des itinéraires générés, borné en taille avec éviction LRU."""
+
+    def __init__(self, chemin=RESULT_CACHE_PATH, max_octets=MAX_OCTETS, max_entrees=MAX_ENTREES):
+        self.max_octets = max_octets
+        self.max_entrees = max_entrees
+        self.verrou = threading.Lock()
+        self.connexion = sqlite3.connect(chemin, check_same_thread=False)
+        self.connexion.execute(
+            """CREATE TABLE IF NOT EXISTS resultats (
+                cle TEXT PRIMARY KEY,
+                valeur TEXT NOT NULL,
+                taille INTEGER NOT NULL,
+                dernier_acces REAL NOT NULL
+            )"""
+        )
+        self.connexion.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def lire(self, cle):
+        with self.verrou:
+            ligne = self.connexion.execute(
+                "SELECT valeur FROM resultats WHERE cle = ?", (cle,)
+            ).fetchone()
+            if ligne is None:
+                self.misses += 1
+                return None
+            self.connexion.execute(
+                "UPDATE resultats SET dernier_acces = ? WHERE cle = ?", (time.time(), cle)
+            )
+            self.connexion.commit()
+            self.hits += 1
+            return json.loads(ligne[0])
+
+    def ecrire(self, cle, valeur):
+        texte = json.dumps(valeur, ensure_ascii=False)
+        with self.verrou:
+            self.connexion.execute(
+                "INSERT OR REPLACE INTO resultats VALUES (?, ?, ?, ?)",
+                (cle, texte, len(texte.encode("utf-8")), time.time()),
+            )
+            self._evincer()
+            self.connexion.commit()
+
+    def _evincer(self):
+        """Supprime les entrées les moins récemment lues tant que le cache dépasse ses bornes."""
+        nb, total = self.connexion.execute(
+            "SELECT COUNT(*), COALESCE(SUM(taille), 0) FROM resultats"
+        ).fetchone()
+        if nb <= self.max_entrees and total <= self.max_octets:
+            return
+        for cle, taille in self.connexion.execute(
+            "SELECT cle, taille FROM resultats ORDER BY dernier_acces ASC"
+        ).fetchall():
+            if nb <= self.max_entrees and total <= self.max_octets:
+                break
+            self.connexion.execute("DELETE FROM resultats WHERE cle = ?", (cle,))
+            nb -= 1
+            total -= taille
+
+    def vider(self):
+        with self.verrou:
+            self.connexion.execute("DELETE FROM resultats")
+            self.connexion.commit()
+
+    def stats(self):
+        with self.verrou:
+            nb, total = self.connexion.execute(
+                "SELECT COUNT(*), COALESCE(SUM(taille), 0) FROM resultats"
+            ).fetchone()
+        return {"entrees": nb, "octets": total, "hits": self.hits, "misses": self.misses}
+
+
+_cache_resultats = None
+_cache_verrou = threading.Lock()
+
+
+def get_cache_resultats():
+    global _cache_resultats
+    with _cache_verrou:
+        if _cache_resultats is None:
+            _cache_resultats = CacheResultats()
+        return _cache_resultats
@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter, defaultdict
+
+from crewai_tools.tools.database import chemin_index, filtre_destination, get_vectorstore
+from crewai_tools.tools.geocache import sans_accents
+from crewai_tools.tools.tracing import span
+
+BM25_FICHIER = "bm25.json"
+
+# Paramètres BM25 classiques
+K1 = 1.5
+B = 0.75
+
+# Fusion des classements (Reciprocal Rank Fusion)
+K_RRF = 60
+K_CANDIDATS = 8
+
+# Budget de contexte injecté dans les prompts (≈ 2 chunks de 400 caractères)
+BUDGET_TOKENS = int(os.getenv("RAG_BUDGET_TOKENS", 250))
+
+MOTS_VIDES = {
+    "a", "au", "aux", "avec", "ce", "ces", "dans", "de", "des", "du", "elle", "en", "et", "il", "ils",
+    "la", "le", "les", "leur", "mais", "ou", "par", "pas", "pour", "qui", "que", "se", "sur", "son",
+    "sa", "ses", "un", "une", "est", "sont", "the", "of", "and", "to", "in", "d", "l", "s", "y",
+}
+
+
+def tokeniser(texte):
+    return [m for m in re.findall(r"[a-z0-9]+", sans_accents(texte).lower()) if m not in MOTS_VIDES]
+
+
+def estimer_tokens(texte):
+    return len(texte) // 4
+
+
+class IndexBM25:
+    """Index inversé BM25 des chunks d'une destination (construit à l'indexation, chargé en mémoire)."""
+
+    def __init__(self, ids, textes):
+        self.ids = ids
+        self.textes = textes
+        self.longueurs = []
+        self.postings = defaultdict(list)  # terme -> [(indice du chunk, fréquence)]
+        for indice, texte in enumerate(textes):
+            termes = Counter(tokeniser(texte))
+            self.longueurs.append(sum(termes.values()))
+            for terme, frequence in termes.items():
+                self.postings[terme].append((indice, frequence))
+        self.longueur_moyenne = (sum(self.longueurs) / len(self.longueurs)) if self.longueurs else 0.0
+
+    def rechercher(self, requete, k=K_CANDIDATS):
+        """[(indice, score)] des k meilleurs chunks, sans aucun appel au modèle d'embedding."""
+        n = len(self.textes)
+        scores = defaultdict(float)
+        for terme in set(tokeniser(requete)):
+            postings = self.postings.get(terme)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for indice, frequence in postings:
+                norme = K1 * (1 - B + B * self.longueurs[indice] / self.longueur_moyenne)
+                scores[indice] += idf * frequence * (K1 + 1) / (frequence + norme)
+        return sorted(scores.items(), key=lambda x: -x[1])[:k]
+
+    def sauvegarder(self, chemin):
+        temporaire = chemin + ".tmp"
+        with open(temporaire, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "textes": self.textes}, f, ensure_ascii=False)
+        os.replace(temporaire, chemin)
+
+    @classmethod
+    def charger(cls, chemin):
+        with open(chemin, encoding="utf-8") as f:
+            donnees = json.load(f)
+        return cls(donnees["ids"], donnees["textes"])
+
+
+def chemin_bm25(nom_destination):
+    return os.path.join(chemin_index(nom_destination), BM25_FICHIER)
+
+
+def construire_bm25(nom_destination, vectorstore):
+    """Reconstruit l'index lexical à partir des chunks de la destination dans la collection Chroma."""
+    contenu = vectorstore.get(where=filtre_destination(nom_destination), include=["documents"])
+    paires = sorted(zip(contenu["ids"], contenu["documents"]))
+    index = IndexBM25([i for i, _ in paires], [t for _, t in paires])
+    index.sauvegarder(chemin_bm25(nom_destination))
+    invalider_bm25(nom_destination)
+    return index
+
+
+_index_bm25 = {}
+_bm25_verrou = threading.Lock()
+
+
+def invalider_bm25(nom_destination):
+    with _bm25_verrou:
+        _index_bm25.pop(nom_destination, None)
+
+
+def get_index_bm25(nom_destination):
+    with _bm25_verrou:
+        if nom_destination in _index_bm25:
+            return _index_bm25[nom_destination]
+    chemin = chemin_bm25(nom_destination)
+    if os.path.exists(chemin):
+        index = IndexBM25.charger(chemin)
+    else:
+        # Index antérieur à la recherche hybride : on le complète une fois
+        index = construire_bm25(nom_destination, get_vectorstore(nom_destination))
+    with _bm25_verrou:
+        _index_bm25[nom_destination] = index
+    return index
+
+
+def reranker(requete, candidats):
+    """
+    Reranking local léger : bonus de couverture des termes de la requête (noms, prix, horaires),
+    ajouté au score fusionné. candidats = [(texte, score)].
+    """
+    termes = set(tokeniser(requete))
+    if not termes:
+        return candidats
+    score_max = max((s for _, s in candidats), default=1.0) or 1.0
+    rescores = []
+    for texte, score in candidats:
+        couverture = len(termes & set(tokeniser(texte))) / len(termes)
+        rescores.append((texte, score / score_max + couverture))
+    return sorted(rescores, key=lambda x: -x[1])
+
+
+def rechercher(nom_destination, requete, k=K_CANDIDATS, lexical_seul=False, reranking=True):
+    """Classement hybride [(texte, score)] : BM25 + similarité vectorielle fusionnés par RRF."""
+    fusion = defaultdict(float)
+    with span("rag.bm25"):
+        index = get_index_bm25(nom_destination)
+        for rang, (indice, _) in enumerate(index.rechercher(requete, k)):
+            fusion[index.textes[indice]] += 1 / (K_RRF + rang + 1)
+
+    if not lexical_seul:
+        with span("rag.vecteurs"):
+            docs = get_vectorstore(nom_destination).similarity_search(
+                requete, k=k, filter=filtre_destination(nom_destination)
+            )
+        for rang, doc in enumerate(docs):
+            fusion[doc.page_content] += 1 / (K_RRF + rang + 1)
+
+    candidats = sorted(fusion.items(), key=lambda x: -x[1])
+    return reranker(requete, candidats) if reranking else candidats
+
+
+def recuperer_contexte(nom_destination, requete, budget_tokens=BUDGET_TOKENS, **options):
+    """Texte de contexte RAG : les meilleurs chunks tant qu'ils tiennent dans le budget de tokens."""
+    with span("rag.contexte", destination=nom_destination) as span_contexte:
+        retenus = []
+        utilises = 0
+        for texte, _ in rechercher(nom_destination, requete, **options):
+            cout = estimer_tokens(texte)
+            if retenus and utilises + cout > budget_tokens:
+                break
+            retenus.append(texte)
+            utilises += cout
+        span_contexte.ajouter(chunks=len(retenus), tokens=utilises)
+        return "\n\n".join(retenus)
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from crewai_tools.tools.result_cache import empreinte
+
+SCORE_CACHE_PATH = os.getenv("SCORE_CACHE_PATH", "score_cache.sqlite")
+
+# CACHE_NOTES=0 : le juge est rappelé à chaque affichage du tableau de bord
+CACHE_NOTES_ACTIF = os.getenv("CACHE_NOTES", "1") == "1"
+
+# Paramètres du voyage lus par le juge : seuls ceux-ci entrent dans la clé
+CHAMPS_JUGE = ("ville", "duree", "profil", "adultes", "enfants", "rythme", "interets")
+
+
+def cle_note(texte, config, version_prompt, juge):
+    """
+    Clé d'une note : empreinte de l'itinéraire + paramètres normalisés + version du prompt du juge
+    + backend, modèle et URL du juge (llm_backend.signature_roles).
+    """
+    contenu = {
+        "texte": empreinte(texte),
+        "config": {champ: str(config.get(champ, "")) for champ in CHAMPS_JUGE},
+        "version": version_prompt,
+        "juge": juge,
+    }
+    return empreinte(json.dumps(contenu, sort_keys=True, ensure_ascii=False))
+
+
+class CacheNotes:
+    """Notes du LLM Judge persistées sur disque (SQLite) : un itinéraire déjà jugé n'est jamais renvoyé au juge."""
+
+    def __init__(self, chemin=SCORE_CACHE_PATH):
+        self.verrou = threading.Lock()
+        self.connexion = sqlite3.connect(chemin, check_same_thread=False)
+        self.connexion.execute(
+            """CREATE TABLE IF NOT EXISTS notes (
+                cle TEXT PRIMARY KEY,
+                score REAL NOT NULL,
+                justification TEXT NOT NULL,
+                model TEXT NOT NULL,
+                version TEXT NOT NULL,
+                cree_le REAL NOT NULL
+            )"""
+        )
+        self.connexion.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def lire(self, cle):
+        """(score, justification) ou None si l'itinéraire n'a pas encore été jugé."""
+        with self.verrou:
+            ligne = self.connexion.execute(
+                "SELECT score, justification FROM notes WHERE cle = ?", (cle,)
+            ).fetchone()
+            if ligne is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return ligne[0], ligne[1]
+
+    def ecrire(self, cle, score, justification, model, version):
+        with self.verrou:
+            self.connexion.execute(
+                "INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, ?, ?)",
+                (cle, score, justification, model, version, time.time()),
+            )
+            self.connexion.commit()
+
+    def vider(self):
+        with self.verrou:
+            self.connexion.execute("DELETE FROM notes")
+            self.connexion.commit()
+
+    def stats(self):
+        with self.verrou:
+            nb = self.connexion.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+        return {"entrees": nb, "hits": self.hits, "misses": self.misses}
+
+
+_cache_notes = None
+_cache_verrou = threading.Lock()
+
+
+def get_cache_notes():
+    global _cache_notes
+    with _cache_verrou:
+        if _cache_notes is None:
+            _cache_notes = CacheNotes()
+        return _cache_notes
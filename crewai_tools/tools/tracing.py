@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Traces exportées (une par comparatif) au format JSON compatible OTLP
+TRACES_PATH = os.getenv("TRACES_PATH", "traces")
+NOM_SERVICE = "travel-planner"
+
+# Trace et span actifs du contexte courant. Les threads ne les héritent pas :
+# on passe par Trace.executer (ou contextvars.copy_context) pour les workers.
+_trace_courante = contextvars.ContextVar("trace_courante", default=None)
+_span_courant = contextvars.ContextVar("span_courant", default=None)
+
+
+class Span:
+    """Une opération chronométrée (ns depuis l'epoch), rattachée à son parent."""
+
+    def __init__(self, trace_id, nom, parent_id=None, debut=None, **attributs):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.nom = nom
+        self.debut = debut if debut is not None else time.time_ns()
+        self.fin = None
+        self.attributs = dict(attributs)
+        self.erreur = None
+
+    def ajouter(self, **attributs):
+        self.attributs.update(attributs)
+
+    def terminer(self, fin=None):
+        self.fin = fin if fin is not None else time.time_ns()
+
+    @property
+    def duree(self):
+        return ((self.fin or time.time_ns()) - self.debut) / 1e9
+
+
+class _SpanInactif:
+    """Remplaçant sans effet quand aucune trace n'est active (coût quasi nul)."""
+
+    attributs = {}
+
+    def ajouter(self, **attributs):
+        pass
+
+
+_SPAN_INACTIF = _SpanInactif()
+
+
+def _valeur_otlp(valeur):
+    if isinstance(valeur, bool):
+        return {"boolValue": valeur}
+    if isinstance(valeur, int):
+        return {"intValue": str(valeur)}
+    if isinstance(valeur, float):
+        return {"doubleValue": valeur}
+    return {"stringValue": str(valeur)}
+
+
+class Trace:
+    """Ensemble des spans d'une exécution (ex: un comparatif), partagé entre threads."""
+
+    def __init__(self, nom, **attributs):
+        self.trace_id = secrets.token_hex(16)
+        self.verrou = threading.Lock()
+        self.spans = []
+        self.racine = self._creer(nom, None, None, attributs)
+
+    def _creer(self, nom, parent_id, debut, attributs):
+        span = Span(self.trace_id, nom, parent_id, debut, **attributs)
+        with self.verrou:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def activer(self, parent=None):
+        """Rend la trace active dans le contexte courant ; les spans créés s'y rattachent."""
+        jeton_trace = _trace_courante.set(self)
+        jeton_span = _span_courant.set(parent or self.racine)
+        try:
+            yield self
+        finally:
+            _span_courant.reset(jeton_span)
+            _trace_courante.reset(jeton_trace)
+
+    def executer(self, fonction, *args, **kwargs):
+        """Exécute fonction avec la trace active (à passer tel quel à pool.submit)."""
+        with self.activer():
+            return fonction(*args, **kwargs)
+
+    def terminer(self):
+        self.racine.terminer()
+
+    def en_otlp(self):
+        """Export au format JSON OTLP (resourceSpans), lisible par Jaeger / un collecteur OpenTelemetry."""
+        with self.verrou:
+            spans = list(self.spans)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": NOM_SERVICE}}]},
+            "scopeSpans": [{
+                "scope": {"name": "crewai_tools.tools.tracing"},
+                "spans": [{
+                    "traceId": self.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.nom,
+                    "kind": 1,
+                    "startTimeUnixNano": str(span.debut),
+                    "endTimeUnixNano": str(span.fin or span.debut),
+                    "attributes": [{"key": cle, "value": _valeur_otlp(valeur)}
+                                   for cle, valeur in span.attributs.items() if valeur is not None],
+                    "status": {"code": 2, "message": span.erreur} if span.erreur else {"code": 1},
+                } for span in spans],
+            }],
+        }]}
+
+    def sauvegarder(self, dossier=TRACES_PATH):
+        os.makedirs(dossier, exist_ok=True)
+        chemin = os.path.join(dossier, f"{self.trace_id}.json")
+        with open(chemin, "w", encoding="utf-8") as f:
+            json.dump(self.en_otlp(), f, ensure_ascii=False)
+        return chemin
+
+    def lignes(self):
+        """Spans triés par début avec leur profondeur, pour l'affichage en cascade."""
+        with self.verrou:
+            spans = list(self.spans)
+        par_id = {s.span_id: s for s in spans}
+
+        def profondeur(span):
+            niveau = 0
+            while span.parent_id in par_id:
+                span = par_id[span.parent_id]
+                niveau += 1
+            return niveau
+
+        return [(s, profondeur(s)) for s in sorted(spans, key=lambda s: s.debut)]
+
+
+def trace_active():
+    return _trace_courante.get()
+
+
+def contexte_actif():
+    """(trace, span parent) du contexte courant, à mémoriser pour un span enregistré plus tard."""
+    return _trace_courante.get(), _span_courant.get()
+
+
+@contextmanager
+def span(nom, **attributs):
+    """Chronomètre le bloc comme un span enfant du span courant (sans effet hors d'une trace)."""
+    trace = _trace_courante.get()
+    if trace is None:
+        yield _SPAN_INACTIF
+        return
+    parent = _span_courant.get()
+    courant = trace._creer(nom, parent.span_id if parent else None, None, attributs)
+    jeton = _span_courant.set(courant)
+    try:
+        yield courant
+    except Exception as e:
+        courant.erreur = str(e)
+        raise
+    finally:
+        _span_courant.reset(jeton)
+        courant.terminer()
+
+
+def enregistrer_span(nom, debut, fin, contexte=None, erreur=None, **attributs):
+    """
+    Ajoute un span déjà terminé (debut/fin en secondes epoch), ex: appel LLM rapporté par litellm
+    ou tâche crewai signalée par son callback. contexte = contexte_actif() capturé au bon moment.
+    """
+    trace, parent = contexte or contexte_actif()
+    if trace is None:
+        return None
+    courant = trace._creer(nom, parent.span_id if parent else None, int(debut * 1e9), attributs)
+    courant.terminer(int(fin * 1e9))
+    courant.erreur = erreur
+    return courant
+
+
+def suivi_taches(callback=None, dependances=None):
+    """
+    task_callback crewai qui trace chaque tâche : en process séquentiel, une tâche court de la fin
+    de la précédente (ou de la création de la crew) à son propre callback. callback est ensuite appelé.
+    dependances ([(Task, [Task, ...]), ...], graphe de tâches parallèles) : une tâche démarre à la fin
+    de la dernière de ses dépendances.
+    """
+    contexte = contexte_actif()
+    creation = time.time()
+    precedente = [creation]
+    fins = {}
+    amont = {tache.description: [d.description for d in deps] for tache, deps in (dependances or [])}
+    verrou = threading.Lock()
+
+    def task_callback(sortie):
+        fin = time.time()
+        description = getattr(sortie, "description", "") or ""
+        with verrou:
+            if description in amont:
+                debut = max([fins.get(d, creation) for d in amont[description]], default=creation)
+            else:
+                debut = precedente[0]
+            fins[description] = fin
+            precedente[0] = fin
+        enregistrer_span(
+            "tache", debut, fin, contexte,
+            agent=str(getattr(sortie, "agent", "") or ""),
+            tache=(getattr(sortie, "name", None) or description)[:80],
+            caracteres_sortie=len(getattr(sortie, "raw", "") or ""),
+        )
+        if callback:
+            callback(sortie)
+
+    return task_callback
@@ -0,0 +1,144 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Registre de tous les appels LLM (tokens, latence, coût), alimenté par le callback litellm
+# du limiteur (crewai_tools/tools/rate_limiter.py) et persisté par run
+USAGE_PATH = os.getenv("USAGE_PATH", "usage.sqlite")
+
+# Tarifs Groq en $ par million de tokens (entrée, sortie)
+TARIFS = {
+    "llama-3.1-8b-instant": {"entree": 0.05, "sortie": 0.08},
+    "llama-3.3-70b-versatile": {"entree": 0.59, "sortie": 0.79},
+}
+TARIF_PAR_DEFAUT = {"entree": 0.0, "sortie": 0.0}
+# Les tokens de prompt servis depuis le cache du fournisseur sont facturés à moitié prix
+REDUCTION_CACHE = 0.5
+
+# Étiquettes (run, mode, étape...) du contexte courant, posées avec `etiquettes(...)`
+_etiquettes = contextvars.ContextVar("etiquettes_usage", default={})
+
+
+@contextmanager
+def etiquettes(**tags):
+    """Étiquette les appels LLM du bloc (s'ajoute aux étiquettes déjà actives)."""
+    jeton = _etiquettes.set({**_etiquettes.get(), **{k: v for k, v in tags.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _etiquettes.reset(jeton)
+
+
+def etiquettes_actives():
+    return dict(_etiquettes.get())
+
+
+def agent_depuis_messages(messages):
+    """Rôle de l'agent crewai, lu dans son prompt système ("You are <rôle>. <backstory>...")."""
+    for message in messages or []:
+        if isinstance(message, dict) and message.get("role") == "system":
+            match = re.match(r"\s*You are (.+?)\.\s", str(message.get("content", "")))
+            if match:
+                return match.group(1)
+    return None
+
+
+def nom_modele(model):
+    return (model or "inconnu").split("/")[-1]
+
+
+def cout_estime(model, prompt_tokens, completion_tokens, cached_tokens=0):
+    tarif = TARIFS.get(nom_modele(model), TARIF_PAR_DEFAUT)
+    entree = (prompt_tokens - cached_tokens) + cached_tokens * REDUCTION_CACHE
+    return (entree * tarif["entree"] + completion_tokens * tarif["sortie"]) / 1e6
+
+
+def tokens_en_cache(usage):
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+COLONNES = ["horodatage", "run", "mode", "agent", "etape", "modele", "prompt_tokens",
+            "completion_tokens", "cached_tokens", "latence_s", "cout_usd", "succes"]
+
+
+class RegistreUsage:
+    """Une ligne par appel LLM, en SQLite, interrogeable par run et agrégeable par mode / agent / étape."""
+
+    def __init__(self, chemin=USAGE_PATH):
+        self.verrou = threading.Lock()
+        self.connexion = sqlite3.connect(chemin, check_same_thread=False)
+        self.connexion.execute(
+            """CREATE TABLE IF NOT EXISTS appels (
+                horodatage REAL NOT NULL,
+                run TEXT,
+                mode TEXT,
+                agent TEXT,
+                etape TEXT,
+                modele TEXT,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                cached_tokens INTEGER NOT NULL,
+                latence_s REAL NOT NULL,
+                cout_usd REAL NOT NULL,
+                succes INTEGER NOT NULL
+            )"""
+        )
+        self.connexion.execute("CREATE INDEX IF NOT EXISTS appels_run ON appels (run)")
+        self.connexion.commit()
+
+    def enregistrer(self, tags, model, usage, latence, succes=True, agent=None):
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        cached = tokens_en_cache(usage)
+        ligne = (
+            time.time(), tags.get("run"), tags.get("mode"), tags.get("agent") or agent, tags.get("etape"),
+            nom_modele(model), prompt, completion, cached, round(latence, 3),
+            cout_estime(model, prompt, completion, cached), int(succes),
+        )
+        with self.verrou:
+            self.connexion.execute(f"INSERT INTO appels VALUES ({', '.join('?' * len(COLONNES))})", ligne)
+            self.connexion.commit()
+
+    def appels(self, run=None):
+        """Liste de dicts (une par appel), éventuellement limitée à un run."""
+        requete = f"SELECT {', '.join(COLONNES)} FROM appels"
+        parametres = ()
+        if run is not None:
+            requete += " WHERE run = ?"
+            parametres = (run,)
+        with self.verrou:
+            lignes = self.connexion.execute(requete + " ORDER BY horodatage", parametres).fetchall()
+        return [dict(zip(COLONNES, ligne)) for ligne in lignes]
+
+    def synthese(self, run=None, par="mode", etapes=None):
+        """{valeur de `par`: totaux} sur les appels du run (éventuellement limités à certaines étapes)."""
+        totaux = {}
+        for appel in self.appels(run):
+            if etapes is not None and appel["etape"] not in etapes:
+                continue
+            cle = appel[par] or "?"
+            total = totaux.setdefault(cle, {"appels": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                             "cached_tokens": 0, "latence_s": 0.0, "cout_usd": 0.0})
+            total["appels"] += 1
+            for colonne in ("prompt_tokens", "completion_tokens", "cached_tokens", "latence_s", "cout_usd"):
+                total[colonne] += appel[colonne]
+        return totaux
+
+
+_registre = None
+_registre_verrou = threading.Lock()
+
+
+def get_registre_usage():
+    global _registre
+    with _registre_verrou:
+        if _registre is None:
+            _registre = RegistreUsage()
+        return _registre
@@ -1,30 +1,42 @@
 import pandas as pd
 import re
 import os
+import json
 import streamlit as st
 import plotly.express as px
-from geopy.distance import geodesic
-from litellm import completion
+from concurrent.futures import ThreadPoolExecutor
+from crewai_tools.tools.rate_limiter import completion_limitee
+from crewai_tools.tools.llm_backend import parametres_litellm, signature_roles
+from crewai_tools.tools.result_cache import empreinte_gabarit
+from crewai_tools.tools.score_cache import CACHE_NOTES_ACTIF, cle_note, get_cache_notes
+from crewai_tools.tools.usage_ledger import etiquettes, get_registre_usage
+from crewai_tools.tools.geometry import coordonnees, distances_vincenty, optimiser_parcours
+
+# Backend et modèle du juge : rôle "juge" de llm_backend.py (LLM_BACKEND_JUGE, LLM_MODELE_JUGE)
+PARAMETRES_JUGE = parametres_litellm("juge")
+MODELE_JUGE = PARAMETRES_JUGE["model"]
+# Clé des notes mémorisées : le nom du modèle ne distingue pas deux serveurs llama.cpp
+SIGNATURE_JUGE = signature_roles("juge")["juge"]
+# Itinéraires jugés simultanément (le débit reste borné par le limiteur RPM/TPM partagé)
+JUGE_WORKERS = int(os.getenv("JUGE_WORKERS", 4))
 
 def calculer_distance_totale(points):
-    """Calcule la distance cumulée entre les points GPS en kilomètres."""
+    """Calcule la distance cumulée entre les points GPS en kilomètres (ellipsoïde WGS84, vectorisé)."""
     if len(points) < 2:
         return 0
-    
-    dist_totale = 0
-    for i in range(len(points) - 1):
-        coord1 = (points[i]['lat'], points[i]['lon'])
-        coord2 = (points[i+1]['lat'], points[i+1]['lon'])
-        dist_totale += geodesic(coord1, coord2).km
-    return round(dist_totale, 2)
+    coords = coordonnees(points)
+    return round(float(distances_vincenty(coords[:-1], coords[1:]).sum()), 2)
+
+
+def calculer_distance_optimale(points):
+    """Distance du meilleur parcours trouvé pour les mêmes points (2-opt / Or-opt), en kilomètres."""
+    if len(points) < 2:
+        return 0
+    return optimiser_parcours(coordonnees(points), methode="vincenty")["distance_km"]
 
     
-def llm_judge_score(texte_itineraire, config):
-    """
-    Evalue la cohérence de l'itinéraire par rapport aux paramètres saisis.
-    config: dict contenant ville, profil, budget, rythme, adultes, enfants, etc.
-    """
-    prompt = f"""
+def prompt_juge(texte_itineraire, config):
+    return f"""
     Tu es un auditeur qualité pour une agence de voyage. 
     Ton rôle est de vérifier si l'itinéraire généré respecte STRICTEMENT la situation du client.
 
@@ -55,29 +67,116 @@ def llm_judge_score(texte_itineraire, config):
     Note: [Moyenne des 4 critères]/10
     Justification: [Une analyse critique de 2 phrases maximum sur le respect des contraintes]
     """
-    try:
-        response = completion(
-            model="groq/llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": prompt}],
-            api_key=os.getenv("GROQ_API_KEY"),
-            temperature=0
-        )
-        content = response.choices[0].message.content
-        note_match = re.search(r"Note:\s*([\d.]+)", content)
-        justif_match = re.search(r"Justification:\s*(.*)", content)
-        
-        score = float(note_match.group(1)) if note_match else 5.0
+
+
+# Toute modification du prompt du juge change la version et invalide les notes mémorisées
+VERSION_PROMPT_JUGE = empreinte_gabarit(prompt_juge)
+
+
+def lire_note(content):
+    """Note /10 lue dans la réponse du juge, ou None si elle est absente ou hors échelle (réponse illisible)."""
+    note_match = re.search(r"Note\s*:\s*\**\s*(\d+(?:[.,]\d+)?)", content or "")
+    if not note_match:
+        return None
+    score = float(note_match.group(1).replace(",", "."))
+    return score if 0 <= score <= 10 else None
+
+
+def _juger(texte_itineraire, config):
+    """
+    Appel du juge ; lève une exception en cas d'erreur. Score None si la note est illisible :
+    ni l'un ni l'autre n'est mémorisé.
+    """
+    response = completion_limitee(
+        **PARAMETRES_JUGE,
+        messages=[{"role": "user", "content": prompt_juge(texte_itineraire, config)}],
+        temperature=0
+    )
+    content = response.choices[0].message.content
+    score = lire_note(content)
+    justif_match = re.search(r"Justification:\s*(.*)", content or "")
+
+    if score is None:
+        justif = f"Note illisible dans la réponse du juge : {(content or '')[:200]}"
+    else:
         justif = justif_match.group(1) if justif_match else "Pas de justification fournie."
-        print (f"🔍 DEBUG LLM JUDGE : Note = {score}, Justification = {justif}")
-        return score, justif
+    print (f"🔍 DEBUG LLM JUDGE : Note = {score}, Justification = {justif}")
+    return score, justif
+
+
+def llm_judge_score(texte_itineraire, config):
+    """
+    Evalue la cohérence de l'itinéraire par rapport aux paramètres saisis.
+    config: dict contenant ville, profil, budget, rythme, adultes, enfants, etc.
+    Score None en cas d'erreur ou si la réponse du juge ne contient pas de note lisible.
+    """
+    try:
+        return _juger(texte_itineraire, config)
     except Exception as e:
-        return 0.0, f"Erreur d'analyse : {str(e)}"
+        return None, f"Erreur d'analyse : {str(e)}"
+
 
-def calculer_metriques(comparatif_dict, config_voyage):
+def noter_modes(comparatif_dict, config, run_id=None, workers=JUGE_WORKERS, utiliser_cache=CACHE_NOTES_ACTIF):
+    """
+    Notes du juge pour tous les modes {mode_id: (score, justification)}.
+    Les notes déjà connues (même itinéraire, mêmes paramètres, même prompt, même modèle) sont relues
+    dans le cache ; les autres modes sont jugés en parallèle, derrière le limiteur partagé.
+    Score None (mode non noté) en cas d'erreur ou de note illisible : rien n'est mémorisé, le juge sera rappelé.
+    """
+    cache = get_cache_notes()
+    notes, a_juger = {}, {}
+    for mode_id, data in comparatif_dict.items():
+        cle = cle_note(data["texte"], config, VERSION_PROMPT_JUGE, SIGNATURE_JUGE)
+        stockee = cache.lire(cle) if utiliser_cache else None
+        if stockee is None:
+            a_juger[mode_id] = cle
+        else:
+            notes[mode_id] = stockee
+    if not a_juger:
+        return notes
+
+    def juger(mode_id):
+        data = comparatif_dict[mode_id]
+        # Les threads n'héritent pas des contextvars : étiquettes posées dans le worker
+        with etiquettes(run=run_id, mode=data["label"], etape="juge"):
+            try:
+                score, raison = _juger(data["texte"], config)
+            except Exception as e:
+                return None, f"Erreur d'analyse : {str(e)}"
+        if utiliser_cache and score is not None:
+            cache.ecrire(a_juger[mode_id], score, raison, MODELE_JUGE, VERSION_PROMPT_JUGE)
+        return score, raison
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(a_juger)))) as pool:
+        for mode_id, note in zip(a_juger, pool.map(juger, a_juger)):
+            notes[mode_id] = note
+    return notes
+
+def consommation_mode(synthese, data):
+    """Tokens et coût de génération d'un mode : registre d'usage du run, sinon token_usage du résultat (cache)."""
+    if data["label"] in synthese:
+        return synthese[data["label"]]
+    usage = data.get("token_usage") or {}
+    return {
+        "appels": usage.get("successful_requests", 0),
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "cached_tokens": usage.get("cached_prompt_tokens", 0),
+        "cout_usd": None,
+    }
+
+
+def calculer_metriques(comparatif_dict, config_voyage, run_id=None):
     """
     Transforme les données du session_state en DataFrame enrichi.
     """
     metrics_list = []
+    # Consommation de la génération (extraction des lieux comprise), juge exclu
+    synthese = get_registre_usage().synthese(run_id, par="mode", etapes=("generation", "extraction_lieux")) if run_id else {}
+
+    # LLM Judge (qualité sémantique) : tous les modes d'un coup, relus dans le cache à chaque réaffichage
+    with st.spinner("Audit qualité des itinéraires..."):
+        notes = noter_modes(comparatif_dict, config_voyage, run_id)
     
     for mode_id, data in comparatif_dict.items():
         texte = data["texte"]
@@ -95,28 +194,126 @@ def calculer_metriques(comparatif_dict, config_voyage):
                 score_rag = round(len(intersection) / len(mots_sources) * 100, 2)
 
         # 3. NOUVEAU : Distance Totale (Optimisation logistique)
-        distance = calculer_distance_totale(data["points"])
+        points = data["points"] or []
+        distance = calculer_distance_totale(points)
         efficience = round(distance / max(nb_lieux, 1), 2)
+        # Ordre proposé par le LLM comparé au meilleur ordre pour les mêmes lieux (1 = optimal)
+        distance_optimale = calculer_distance_optimale(points)
+        ratio_optimum = round(distance / distance_optimale, 2) if distance_optimale else None
+
+        # 4. LLM Judge (Qualité sémantique)
+        score, raison = notes[mode_id]
 
-        # 4. NOUVEAU : LLM Judge (Qualité sémantique)
-        with st.spinner(f"Audit qualité pour : {data['label']}..."):
-            score, raison = llm_judge_score(data["texte"], config_voyage)
-        print(data['texte'])
+        # 5. Consommation (registre d'usage)
+        conso = consommation_mode(synthese, data)
+        tokens = conso["prompt_tokens"] + conso["completion_tokens"]
         metrics_list.append({
             "Mode": data["label"],
-            "Temps (s)": data["temps"],
+            "Temps génération (s)": data["temps"],
+            "Temps géocodage (s)": data.get("temps_enrichissement"),
             "Lieux identifiés": nb_lieux,
             "Fidélité RAG (%)": score_rag if data["sources"] else "N/A",
             "Distance Totale (km)": distance,
             "Efficience (km/lieu)": efficience,
+            "Distance optimale (km)": distance_optimale,
+            "Ratio à l'optimum": ratio_optimum,
             "Note Qualité (/10)": score,
             "Justification": raison,
-            "Points GPS": len(data["points"])
+            "Points GPS": len(points),
+            "Appels LLM": conso["appels"],
+            "Tokens prompt": conso["prompt_tokens"],
+            "Tokens complétion": conso["completion_tokens"],
+            "Tokens en cache": conso["cached_tokens"],
+            "Coût estimé ($)": round(conso["cout_usd"], 5) if conso["cout_usd"] is not None else None,
+            "Lieux / 1k tokens": round(nb_lieux / tokens * 1000, 2) if tokens else None,
         })
     
     return pd.DataFrame(metrics_list)
 
-def afficher_dashboard_evaluation(st, comparatif_dict, config_voyage):
+def spans_en_dataframe(trace):
+    """Une ligne par span, décalages en secondes depuis le début de la trace (pour la cascade)."""
+    lignes = trace.lignes()
+    if not lignes:
+        return pd.DataFrame()
+    origine = lignes[0][0].debut
+    donnees = []
+    for i, (span, profondeur) in enumerate(lignes):
+        donnees.append({
+            "Span": f"{i:03d} {'· ' * profondeur}{span.nom}",
+            "Type": span.nom.split(".")[0],
+            "Début (s)": round((span.debut - origine) / 1e9, 3),
+            "Durée (s)": round(span.duree, 3),
+            "Détails": ", ".join(f"{k}={v}" for k, v in span.attributs.items() if v is not None),
+            "Erreur": span.erreur or "",
+        })
+    return pd.DataFrame(donnees)
+
+
+def afficher_waterfall(st, trace):
+    """Cascade des spans du dernier comparatif + export JSON (format OTLP)."""
+    st.subheader("⏱️ Où passe le temps ? (trace du dernier comparatif)")
+    df = spans_en_dataframe(trace)
+    if df.empty:
+        st.info("Aucun span enregistré.")
+        return
+
+    fig = px.bar(
+        df, x="Durée (s)", y="Span", base="Début (s)", color="Type", orientation="h",
+        hover_data=["Début (s)", "Durée (s)", "Détails", "Erreur"],
+    )
+    fig.update_yaxes(categoryorder="array", categoryarray=list(df["Span"])[::-1], title=None)
+    fig.update_layout(height=max(300, 22 * len(df)), xaxis_title="Secondes depuis le début")
+    st.plotly_chart(fig, width='stretch')
+
+    # Synthèse par type d'opération (les spans imbriqués se recouvrent : ce n'est pas une somme du total)
+    synthese = df.groupby("Type")["Durée (s)"].agg(["count", "sum", "max"]).rename(
+        columns={"count": "Nombre", "sum": "Durée cumulée (s)", "max": "Plus long (s)"}
+    )
+    st.dataframe(synthese, width='stretch')
+
+    st.download_button(
+        "📥 Exporter la trace (JSON OTLP)",
+        data=json.dumps(trace.en_otlp(), ensure_ascii=False),
+        file_name=f"trace_{trace.trace_id}.json",
+        mime="application/json",
+    )
+
+
+def afficher_consommation(st, df, run_id):
+    """Tokens et coûts par mode, puis détail par étape et par agent depuis le registre d'usage."""
+    st.subheader("💰 Consommation de tokens")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("**Coût estimé de la génération ($)**")
+        fig_cout = px.bar(df, x="Mode", y="Coût estimé ($)", color="Mode", text_auto=".5f")
+        st.plotly_chart(fig_cout, width='stretch')
+    with col2:
+        st.write("**Rendement (lieux par millier de tokens)**")
+        fig_rendement = px.bar(df, x="Mode", y="Lieux / 1k tokens", color_discrete_sequence=['#F39C12'], text_auto=True)
+        st.plotly_chart(fig_rendement, width='stretch')
+
+    appels = pd.DataFrame(get_registre_usage().appels(run_id)) if run_id else pd.DataFrame()
+    if appels.empty:
+        return
+    appels["tokens"] = appels["prompt_tokens"] + appels["completion_tokens"]
+    appels["agent"] = appels["agent"].fillna("LLM direct")
+    appels["etape"] = appels["etape"].fillna("autre")
+
+    col3, col4 = st.columns(2)
+    with col3:
+        st.write("**Tokens par mode et par étape**")
+        par_etape = appels.groupby(["mode", "etape"], as_index=False, dropna=False)["tokens"].sum()
+        st.plotly_chart(px.bar(par_etape, x="mode", y="tokens", color="etape"), width='stretch')
+    with col4:
+        st.write("**Tokens par agent**")
+        par_agent = appels.groupby(["agent", "mode"], as_index=False, dropna=False)["tokens"].sum()
+        st.plotly_chart(px.bar(par_agent, x="agent", y="tokens", color="mode"), width='stretch')
+
+    with st.expander(f"Registre des {len(appels)} appels LLM du run"):
+        st.dataframe(appels.drop(columns=["run"]), width='stretch')
+
+
+def afficher_dashboard_evaluation(st, comparatif_dict, config_voyage, trace=None, run_id=None):
     """
     Rendu visuel complet dans l'onglet Analyse
     """
@@ -128,7 +325,7 @@ def afficher_dashboard_evaluation(st, comparatif_dict, config_voyage):
         return
 
     # Calcul des données
-    df = calculer_metriques(comparatif_dict, config_voyage)
+    df = calculer_metriques(comparatif_dict, config_voyage, run_id)
 
     # Affichage du tableau récapitulatif
     st.subheader("Synthèse des métriques")
@@ -140,7 +337,9 @@ def afficher_dashboard_evaluation(st, comparatif_dict, config_voyage):
     col1, col2 = st.columns(2)
     with col1:
         st.write("**Rapidité d'exécution**")
-        fig_temps = px.bar(df, x="Mode", y="Temps (s)", color="Mode", text_auto=True)
+        # Génération et géocodage sont deux étapes distinctes du pipeline : barres empilées
+        fig_temps = px.bar(df, x="Mode", y=["Temps génération (s)", "Temps géocodage (s)"], text_auto=True,
+                           labels={"value": "Temps (s)", "variable": "Étape"})
         st.plotly_chart(fig_temps, width='stretch')
     
     with col2:
@@ -166,6 +365,12 @@ def afficher_dashboard_evaluation(st, comparatif_dict, config_voyage):
                           color_discrete_sequence=['#9B59B6'], text_auto=True)
         st.plotly_chart(fig_eff, width='stretch')
         st.caption("💡 **Plus le score est bas**, plus l'IA a regroupé les lieux intelligemment pour limiter les déplacements.")
+
+    st.write("**Distance parcourue vs parcours optimal pour les mêmes lieux**")
+    fig_opt = px.bar(df, x="Mode", y=["Distance Totale (km)", "Distance optimale (km)"], barmode="group",
+                     labels={"value": "Distance (km)", "variable": ""}, text_auto=True)
+    st.plotly_chart(fig_opt, width='stretch')
+    st.caption("Le ratio à l'optimum (distance réelle / distance optimale) vaut 1 quand l'ordre des visites est le meilleur possible.")
     # with col4:
     #     df_rag = df[df["Fidélité RAG (%)"] != "N/A"]
     #     if not df_rag.empty:
@@ -178,6 +383,18 @@ def afficher_dashboard_evaluation(st, comparatif_dict, config_voyage):
     
     # Affichage sous forme de "Cards" ou Expandeurs
     for _, row in df.iterrows():
-        with st.expander(f"Détails du score pour : **{row['Mode']}** — {row['Note Qualité (/10)']}/10"):
+        note = row['Note Qualité (/10)']
+        if pd.isna(note):
+            # Erreur ou réponse illisible : mode non noté (exclu des graphiques), le juge sera rappelé
+            with st.expander(f"Détails du score pour : **{row['Mode']}** — non noté"):
+                st.warning(row['Justification'])
+            continue
+        with st.expander(f"Détails du score pour : **{row['Mode']}** — {note}/10"):
             st.write(f"**Analyse critique :** {row['Justification']}")
-            st.progress(row['Note Qualité (/10)'] / 10)
\ No newline at end of file
+            st.progress(note / 10)
+    st.write("---")
+    afficher_consommation(st, df, run_id)
+
+    if trace is not None:
+        st.write("---")
+        afficher_waterfall(st, trace)
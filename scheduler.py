@@ -0,0 +1,252 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from crewai import Crew
+from agents_sequential import create_travel_crew
+from agents_parallel import create_parallel_crew
+from crewai_tools.tools import context_budget, day_planner, geometry
+from crewai_tools.tools.retrieval import recuperer_contexte
+from crewai_tools.tools.geocoder_tool import extraire_points_gps
+from crewai_tools.tools.llm_backend import signature_roles
+from crewai_tools.tools.result_cache import (
+    CACHE_ACTIF, cle_resultat, empreinte_gabarit, get_cache_resultats, usage_en_dict
+)
+from crewai_tools.tools.tracing import span
+from crewai_tools.tools.usage_ledger import etiquettes
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # exécution hors Streamlit
+    add_script_run_ctx = get_script_run_ctx = None
+
+# Nombre de modes exécutés simultanément. Le débit réel est borné par le limiteur
+# partagé (crewai_tools/tools/rate_limiter.py) : chaque appel LLM y prend un créneau.
+MAX_WORKERS = int(os.getenv("COMPARATIF_WORKERS", 4))
+# Géocodages simultanés (étape d'enrichissement, découplée de la génération)
+WORKERS_ENRICHISSEMENT = int(os.getenv("COMPARATIF_WORKERS_ENRICHISSEMENT", 2))
+
+# Options du formulaire (barre latérale de app.py), aussi parcourues par batch_eval.py
+PROFILS = ["Luxe", "Etudiant", "Aventure", "Famille"]
+BUDGETS = ["Économique", "Modéré", "Élevé"]
+RYTHMES = ["Détendu (1-2 lieux/jour)", "Équilibré (3 lieux/jour)", "Intense (Marathon)"]
+INTERETS = ["Gastronomie", "Culture & Histoire", "Shopping", "Nature", "Vie nocturne"]
+DUREE_MAX = 7
+
+# Les crews multi-agents dépendent aussi des modules qui condensent les relais et planifient les journées,
+# et de leurs réglages (PLANIFICATION_JOURNEES, PLAFOND_TOKENS_*, PARCOURS_POINTS_EXACT)
+MODULES_CREWS = (context_budget, day_planner, geometry)
+REGLAGES_CREWS = {
+    "planification": day_planner.PLANIFICATION_ACTIVE,
+    "plafond_tache": context_budget.PLAFOND_TOKENS_TACHE,
+    "plafond_rag": context_budget.PLAFOND_TOKENS_RAG,
+    "points_exact": geometry.POINTS_EXACT,
+}
+
+
+def gabarit_crew(fonction):
+    """Empreinte d'une crew multi-agents : ses prompts, les modules qu'elle appelle et leurs réglages."""
+    return empreinte_gabarit(fonction, *MODULES_CREWS, reglages=REGLAGES_CREWS)
+
+
+# Toute modification des prompts, des modules d'aide ou de leurs réglages change l'empreinte et invalide le cache
+GABARIT_LLM_SEUL = empreinte_gabarit(create_travel_crew)
+GABARIT_SEQUENTIEL = gabarit_crew(create_travel_crew)
+GABARIT_PARALLELE = gabarit_crew(create_parallel_crew)
+
+
+# Rôles LLM (llm_backend.py) de chaque mode, dans la clé du cache : un résultat mis en cache contient
+# aussi les points GPS, extraits par le rôle "extraction"
+ROLES_MODES = {
+    "multi_agents": ("synthese", "planification", "extraction"),
+    "multi_agents_parallele": ("synthese", "planification", "extraction"),
+    "llm_single": ("direct", "extraction"),
+    "hierarchique": ("boss", "extraction"),
+}
+
+
+def configs_comparatif(parallele=False):
+    """Les quatre modes du comparatif (RAG oui/non x agents oui/non)."""
+    return [
+        {"id": "mode_1", "name": "👥​ Multi-Agents + 📚 RAG", "rag": True, "agents": True, "parallele": parallele},
+        {"id": "mode_2", "name": "👤 LLM Single + 📚 RAG", "rag": True, "agents": False},
+        {"id": "mode_3", "name": "👥​ Multi-Agents Only", "rag": False, "agents": True, "parallele": parallele},
+        {"id": "mode_4", "name": "👤 LLM Single Only", "rag": False, "agents": False},
+    ]
+
+
+def recuperer_contexte_rag(ville):
+    # Recherche hybride (BM25 + vecteurs), contexte borné par un budget de tokens
+    with span("rag", ville=ville):
+        return recuperer_contexte(ville, f"activités et bonnes pratiques à {ville}")
+
+
+def executer_mode(conf, params, infos_contextuelles, utiliser_cache=CACHE_ACTIF, callback_flux=None):
+    """Génère l'itinéraire d'un mode puis extrait ses points GPS (les deux étapes à la suite)."""
+    return enrichir_mode(conf, params, generer_mode(conf, params, infos_contextuelles, utiliser_cache, callback_flux),
+                         utiliser_cache)
+
+
+def generer_mode(conf, params, infos_contextuelles, utiliser_cache=CACHE_ACTIF, callback_flux=None):
+    """
+    Génère l'itinéraire d'un mode (ou le relit dans le cache de résultats).
+    Le texte est transmis au fil de l'eau à callback_flux ; le délai avant le premier morceau est mesuré à part.
+    points vaut None tant que enrichir_mode n'est pas passé (sauf résultat complet en cache).
+    """
+    with span("mode", mode=conf["name"]) as span_mode, etiquettes(mode=conf["name"], etape="generation"):
+        resultat = _generer_mode(conf, params, infos_contextuelles, utiliser_cache, callback_flux)
+        span_mode.ajouter(cache=resultat["cache"])
+        return resultat
+
+
+def _generer_mode(conf, params, infos_contextuelles, utiliser_cache, callback_flux):
+    start_time = time.time()
+    premier_token = []
+
+    def flux(morceau):
+        if not premier_token:
+            premier_token.append(time.time())
+        if callback_flux:
+            callback_flux(morceau)
+
+    # Graphe de tâches parallèles (agents_parallel.py) pour les modes multi-agents si demandé
+    parallele = conf["agents"] and conf.get("parallele", False)
+    cache = get_cache_resultats()
+    if conf["agents"]:
+        mode, gabarit = ("multi_agents_parallele", GABARIT_PARALLELE) if parallele else ("multi_agents", GABARIT_SEQUENTIEL)
+    else:
+        mode, gabarit = "llm_single", GABARIT_LLM_SEUL
+    cle = cle_resultat(params, mode, signature_roles(*ROLES_MODES[mode]), gabarit, infos_contextuelles)
+    stocke = cache.lire(cle) if utiliser_cache else None
+
+    if stocke is None:
+        with span("generation", agents=conf["agents"], rag=conf["rag"], parallele=parallele):
+            instance = (create_parallel_crew if parallele else create_travel_crew)(
+                params["ville"], params["profil"], params["duree"], params["budget"], params["rythme"],
+                params["interets"], params["adultes"], params["enfants"], infos_contextuelles, conf["agents"],
+                callback_flux=flux
+            )
+            if isinstance(instance, Crew):
+                resultat_brut = instance.kickoff()
+            else:
+                resultat_brut = instance
+        stocke = {"texte": resultat_brut.raw, "points": None, "token_usage": usage_en_dict(resultat_brut.token_usage)}
+        depuis_cache = False
+    else:
+        depuis_cache = True
+        flux(stocke["texte"])
+
+    return {
+        "label": conf["name"],
+        "texte": stocke["texte"],
+        "points": stocke["points"],
+        "sources": infos_contextuelles,
+        "token_usage": stocke["token_usage"],
+        "cache": depuis_cache,
+        "cle_cache": cle,
+        "temps": round(time.time() - start_time, 2),
+        "temps_premier_token": round(premier_token[0] - start_time, 2) if premier_token else None,
+        "temps_enrichissement": 0.0 if depuis_cache else None,
+    }
+
+
+def enrichir_mode(conf, params, resultat, utiliser_cache=CACHE_ACTIF):
+    """
+    Extrait les points GPS d'un itinéraire généré (durée mesurée à part de la génération),
+    puis enregistre le résultat complet dans le cache de résultats.
+    """
+    if resultat["points"] is not None:
+        return resultat
+    debut = time.time()
+    with span("enrichissement", mode=conf["name"]) as span_enrichissement, etiquettes(mode=conf["name"]):
+        points = extraire_points_gps(resultat["texte"], params["ville"])
+        span_enrichissement.ajouter(points=len(points))
+    resultat = {**resultat, "points": points, "temps_enrichissement": round(time.time() - debut, 2)}
+    if utiliser_cache:
+        get_cache_resultats().ecrire(resultat["cle_cache"], {
+            "texte": resultat["texte"], "points": points, "token_usage": resultat["token_usage"],
+        })
+    return resultat
+
+
+def lancer_comparatif(configs, params, utiliser_cache=CACHE_ACTIF, max_workers=MAX_WORKERS, trace=None, run_id=None,
+                      workers_enrichissement=WORKERS_ENRICHISSEMENT):
+    """
+    Exécute les modes en pipeline et rend des événements (type, conf, contenu) au fil de l'eau :
+    - ("partiel", conf, morceau de texte) pendant la génération ;
+    - ("fini", conf, resultat) dès que le texte d'un mode est prêt (points = None si encore à géocoder) ;
+    - ("points", conf, resultat) quand ses points GPS sont prêts, ou ("erreur", conf, exception).
+    Le géocodage d'un mode tourne dans son propre pool : le worker de génération passe aussitôt au mode suivant.
+    Le débit est borné par le limiteur RPM/TPM partagé plutôt que par des pauses fixes.
+    trace (tracing.Trace, optionnelle) reçoit les spans RAG, modes, tâches, appels LLM et géocodage.
+    run_id étiquette les appels LLM dans le registre d'usage (tokens, coût par mode / agent / étape).
+    """
+    # Le contexte RAG est identique pour tous les modes RAG : une seule recherche
+    infos_rag, erreur_rag = "", None
+    if any(conf["rag"] for conf in configs):
+        try:
+            if trace is not None:
+                infos_rag = trace.executer(recuperer_contexte_rag, params["ville"])
+            else:
+                infos_rag = recuperer_contexte_rag(params["ville"])
+        except Exception as e:
+            erreur_rag = e
+
+    # Les workers publient dans une file ; seul le thread du script Streamlit lit et affiche
+    evenements = queue.Queue()
+
+    def soumettre(pool, fonction, *args):
+        if trace is not None:
+            # Les threads n'héritent pas des contextvars : chaque worker réactive la trace
+            pool.submit(trace.executer, fonction, *args)
+        else:
+            pool.submit(fonction, *args)
+
+    def enrichissement(conf, resultat):
+        try:
+            with etiquettes(run=run_id):
+                resultat = enrichir_mode(conf, params, resultat, utiliser_cache)
+        except Exception as e:
+            # Le texte reste exploitable : le mode est livré sans carte
+            print(f"⚠️ Géocodage impossible pour {conf['name']} : {e}")
+            resultat = {**resultat, "points": []}
+        evenements.put(("points", conf, resultat))
+
+    def generation(conf):
+        try:
+            if conf["rag"] and erreur_rag:
+                raise erreur_rag
+            with etiquettes(run=run_id):
+                resultat = generer_mode(
+                    conf, params, infos_rag if conf["rag"] else "", utiliser_cache,
+                    callback_flux=lambda morceau: evenements.put(("partiel", conf, morceau))
+                )
+        except Exception as e:
+            evenements.put(("erreur", conf, e))
+            return
+        evenements.put(("fini", conf, resultat))
+        if resultat["points"] is None:
+            soumettre(pool_enrichissement, enrichissement, conf, resultat)
+        else:
+            evenements.put(("points", conf, resultat))
+
+    # Les workers héritent du contexte Streamlit pour pouvoir afficher les st.toast des agents
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+
+    def initialiser_worker():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+
+    with ThreadPoolExecutor(max_workers=workers_enrichissement, initializer=initialiser_worker) as pool_enrichissement, \
+            ThreadPoolExecutor(max_workers=max_workers, initializer=initialiser_worker) as pool:
+        for conf in configs:
+            soumettre(pool, generation, conf)
+        # Chaque mode se termine par ses points ou par une erreur
+        restants = len(configs)
+        while restants:
+            evenement = evenements.get()
+            if evenement[0] in ("points", "erreur"):
+                restants -= 1
+            yield evenement
@@ -2,6 +2,10 @@ import folium
 from streamlit_folium import st_folium
 import streamlit as st
 
+def afficher_flux_mode(zone, texte, termine=False):
+    """Affiche le texte partiel d'un mode en cours de génération dans un st.empty()"""
+    zone.markdown(texte if termine else texte + " ▌")
+
 def afficher_resultat_mode(mode_id, data):
     """Affiche le contenu avec un sélecteur pour alterner entre texte et carte"""
     
@@ -16,37 +20,50 @@ def afficher_resultat_mode(mode_id, data):
     st.write("---")
 
     if vue == "📄 Itinéraire détaillé":
-        st.subheader(f"Détails du séjour ({data['temps']}s)")
+        if data.get("temps_premier_token") is not None:
+            st.subheader(f"Détails du séjour ({data['temps']}s, premier token à {data['temps_premier_token']}s)")
+        else:
+            st.subheader(f"Détails du séjour ({data['temps']}s)")
         st.markdown(data["texte"])
 
     else:
         st.subheader("Visualisation géographique")
-        if data["points"]:
-            m = folium.Map(
-                location=[data["points"][0]['lat'], data["points"][0]['lon']], 
-                zoom_start=12
-            )
-            
-            coords = [[p['lat'], p['lon']] for p in data["points"]]
-            
-            for i, p in enumerate(data["points"], start=1):
-                folium.Marker(
-                    [p['lat'], p['lon']], 
-                    popup=f"Étape {i}: {p['name']}", 
-                    tooltip=p['name'],
-                    icon=folium.DivIcon(
-                        icon_size=(30,30),
-                        icon_anchor=(15,15),
-                        html=f"""<div style="font-size: 12pt; color: white; background-color: #E74C3C; 
-                                border-radius: 50%; width: 30px; height: 30px; display: flex; 
-                                justify-content: center; align-items: center; border: 2px solid white; 
-                                font-weight: bold; box-shadow: 2px 2px 5px rgba(0,0,0,0.3);">{i}</div>"""
-                    )
-                ).add_to(m)
-            
-            folium.PolyLine(coords, color="blue", weight=3, opacity=0.7).add_to(m)
-            
-            # Affichage de la carte
-            st_folium(m, key=f"map_{mode_id}", use_container_width=True, height=600)
+        if data["points"] is None:
+            st.info("📍 Géolocalisation des lieux en cours...")
         else:
-            st.info("Aucun lieu n'a pu être géolocalisé pour ce mode.")
\ No newline at end of file
+            if data.get("temps_enrichissement"):
+                st.caption(f"Lieux géolocalisés en {data['temps_enrichissement']}s")
+            afficher_carte(data["points"], f"map_{mode_id}")
+
+
+def afficher_carte(points, cle):
+    """Carte folium des étapes numérotées, reliées dans l'ordre de l'itinéraire."""
+    if points:
+        m = folium.Map(
+            location=[points[0]['lat'], points[0]['lon']], 
+            zoom_start=12
+        )
+        
+        coords = [[p['lat'], p['lon']] for p in points]
+        
+        for i, p in enumerate(points, start=1):
+            folium.Marker(
+                [p['lat'], p['lon']], 
+                popup=f"Étape {i}: {p['name']}", 
+                tooltip=p['name'],
+                icon=folium.DivIcon(
+                    icon_size=(30,30),
+                    icon_anchor=(15,15),
+                    html=f"""<div style="font-size: 12pt; color: white; background-color: #E74C3C; 
+                            border-radius: 50%; width: 30px; height: 30px; display: flex; 
+                            justify-content: center; align-items: center; border: 2px solid white; 
+                            font-weight: bold; box-shadow: 2px 2px 5px rgba(0,0,0,0.3);">{i}</div>"""
+                )
+            ).add_to(m)
+        
+        folium.PolyLine(coords, color="blue", weight=3, opacity=0.7).add_to(m)
+        
+        # Affichage de la carte
+        st_folium(m, key=cle, use_container_width=True, height=600)
+    else:
+        st.info("Aucun lieu n'a pu être géolocalisé pour ce mode.")